@@ -34,22 +34,24 @@ import hashlib
 import importlib
 import logging
 import os.path
+import pickle
 import re
 import shutil
 import stat
 import subprocess
 import sys
+import tempfile
+import time
 import traceback
 import urllib.parse
-import urllib.request
 from collections import defaultdict
+from collections.abc import Mapping
 from multiprocessing import cpu_count
 from pathlib import Path
 from urllib.parse import urlparse
 
-import progressbar  # Run pip3 install progressbar2
-import requests  # Run pip3 install requests
-import yaml
+# progressbar (pip3 install progressbar2), requests (pip3 install requests) and yaml
+# are imported where they are used, so that --help, list and info start quickly.
 
 
 class Colors:  # ansi colors
@@ -109,120 +111,1360 @@ class MyLogFormatter(logging.Formatter):
 		return result
 
 
-class CrossCompileScript:
+class PackageLoadError(Exception):
+	__module__ = 'exceptions'
 
-	def __init__(self):
-		sys.dont_write_bytecode = True  # Avoid __pycache__ folder, never liked that solution
-		hdlr = logging.StreamHandler(sys.stdout)
-		fmt = MyLogFormatter("[%(asctime)s][%(levelname)s]%(type)s %(message)s", "%H:%M:%S")
-		hdlr.setFormatter(fmt)
-		self.logger = logging.getLogger(__name__)
-		self.logger.addHandler(hdlr)
-		self.logger.setLevel(logging.INFO)
-		self.config = self.loadConfig()
-		fmt = MyLogFormatter(self.config["script"]["log_format"], self.config["script"]["log_date_format"])
-		hdlr.setFormatter(fmt)
-		self.packages = self.loadPackages(self.config["script"]["packages_folder"])
-		self.lastError = None
-		self.init()
+	def __init__(self, message):
+		self.message = message
 
-	def errorExit(self, msg):
-		self.logger.error(msg)
-		sys.exit(1)
 
-	def loadPackages(self, packages_folder):
-		def isPathDisabled(path):
-			for part in path.parts:
-				if part.lower().startswith("_disabled"):
-					return True
-			return False
+class OneOf:  # one of these exact values
+	def __init__(self, *values):
+		self.values = values
 
-		depsFolder = Path(os.path.join(packages_folder, "dependencies"))
-		prodFolder = Path(os.path.join(packages_folder, "products"))
-		varsPath = Path(os.path.join(packages_folder, "variables.py"))
 
-		if not os.path.isdir(packages_folder):
-			self.errorExit("Packages folder '%s' does not exist." % (packages_folder))
-		if not os.path.isdir(depsFolder):  # TODO simplify code
-			self.errorExit("Packages folder '%s' does not exist." % (depsFolder))
-		if not os.path.isfile(varsPath):
-			self.errorExit("Variables file '%s' does not exist." % (varsPath))
+class ListOf:  # a list (or tuple) whose items all match spec
+	def __init__(self, spec):
+		self.spec = spec
 
-		tmpPkglist = {'deps': [], 'prods': [], 'vars': []}
-		packages = {'deps': {}, 'prods': {}, 'vars': {}}
 
-		for path, subdirs, files in os.walk(depsFolder):
-			for name in files:
-				p = Path(os.path.join(path, name))
-				if p.suffix == ".py":
-					if not isPathDisabled(p):
-						tmpPkglist["deps"].append(p)
+class TupleOf:  # a tuple (or list) matching specs item by item, the last ones can be left out down to minLength
+	def __init__(self, *specs, minLength=None):
+		self.specs = specs
+		self.minLength = len(specs) if minLength is None else minLength
+
 
-		for path, subdirs, files in os.walk(prodFolder):
-			for name in files:
+class DictOf:  # a dict with any keys matching keySpec and values matching valueSpec
+	def __init__(self, keySpec, valueSpec):
+		self.keySpec = keySpec
+		self.valueSpec = valueSpec
+
+
+class AnyOf:  # matches if one of the specs does
+	def __init__(self, *specs):
+		self.specs = specs
+
+
+class Record:  # a dict with known keys; rules are called with the dict and return a problem or None
+	def __init__(self, fields, required=(), rules=()):
+		self.fields = fields
+		self.required = required
+		self.rules = rules
+
+
+def describeSpec(spec):
+	if spec is None:
+		return "None"
+	if isinstance(spec, type):
+		return spec.__name__
+	if isinstance(spec, tuple):
+		return " or ".join(describeSpec(s) for s in spec)
+	if isinstance(spec, OneOf):
+		return "one of " + ", ".join(repr(v) for v in spec.values)
+	if isinstance(spec, ListOf):
+		return "list of " + describeSpec(spec.spec)
+	if isinstance(spec, TupleOf):
+		return "(" + ", ".join(describeSpec(s) for s in spec.specs) + ")"
+	if isinstance(spec, AnyOf):
+		return " or ".join(describeSpec(s) for s in spec.specs)
+	return "dict"
+
+
+def describeValue(value):
+	if isinstance(value, (str, int, float)) or value is None:
+		return "%s %r" % (type(value).__name__, value)
+	return type(value).__name__
+
+
+def compileSchema(spec):  # turns a schema into check(value, where, problems), so validating a package is just calling nested closures
+	if spec is None:
+		def check(value, where, problems):
+			if value is not None:
+				problems.append("%s should be None, not %s" % (where, describeValue(value)))
+		return check
+
+	if isinstance(spec, type) or isinstance(spec, tuple):
+		types = spec if isinstance(spec, tuple) else (spec,)
+		allowBool = bool in types
+		description = describeSpec(spec)
+
+		def check(value, where, problems):
+			if not isinstance(value, types) or (isinstance(value, bool) and not allowBool):
+				problems.append("%s should be %s, not %s" % (where, description, describeValue(value)))
+		return check
+
+	if isinstance(spec, OneOf):
+		values = spec.values
+		description = describeSpec(spec)
+
+		def check(value, where, problems):
+			if value not in values:
+				problems.append("%s should be %s, not %s" % (where, description, describeValue(value)))
+		return check
+
+	if isinstance(spec, ListOf):
+		checkItem = compileSchema(spec.spec)
+
+		def check(value, where, problems):
+			if not isinstance(value, (list, tuple)):
+				problems.append("%s should be a list, not %s" % (where, describeValue(value)))
+				return
+			for i, item in enumerate(value):
+				checkItem(item, "%s[%d]" % (where, i), problems)
+		return check
+
+	if isinstance(spec, TupleOf):
+		checkItems = [compileSchema(s) for s in spec.specs]
+		minLength = spec.minLength
+		description = describeSpec(spec)
+
+		def check(value, where, problems):
+			if not isinstance(value, (list, tuple)) or not minLength <= len(value) <= len(checkItems):
+				problems.append("%s should be %s, not %s" % (where, description, describeValue(value)))
+				return
+			for i, item in enumerate(value):
+				checkItems[i](item, "%s[%d]" % (where, i), problems)
+		return check
+
+	if isinstance(spec, DictOf):
+		checkKey = compileSchema(spec.keySpec)
+		checkValue = compileSchema(spec.valueSpec)
+
+		def check(value, where, problems):
+			if not isinstance(value, dict):
+				problems.append("%s should be a dict, not %s" % (where, describeValue(value)))
+				return
+			for k, v in value.items():
+				checkKey(k, "%s key %r" % (where, k), problems)
+				checkValue(v, "%s[%r]" % (where, k), problems)
+		return check
+
+	if isinstance(spec, AnyOf):
+		checks = [compileSchema(s) for s in spec.specs]
+		description = describeSpec(spec)
+
+		def check(value, where, problems):
+			for c in checks:
+				found = []
+				c(value, where, found)
+				if not found:
+					return
+			problems.append("%s should be %s, not %s" % (where, description, describeValue(value)))
+		return check
+
+	if isinstance(spec, Record):
+		fields = {k: compileSchema(s) for k, s in spec.fields.items()}
+		known = list(spec.fields.keys())
+		required = spec.required
+		rules = spec.rules
+
+		def check(value, where, problems):
+			prefix = where + "." if where else ""
+			if not isinstance(value, dict):
+				problems.append("%s should be a dict, not %s" % (where or "it", describeValue(value)))
+				return
+			for k, v in value.items():
+				if k in fields:
+					fields[k](v, prefix + str(k), problems)
+				else:
+					import difflib
+					close = difflib.get_close_matches(str(k), known, 1)
+					problems.append("unknown key '%s%s'%s" % (prefix, k, ", did you mean '%s'?" % (close[0]) if close else ""))
+			for k in required:
+				if k not in value:
+					problems.append("'%s%s' is missing" % (prefix, k))
+			for rule in rules:
+				problem = rule(value)
+				if problem is not None:
+					problems.append(prefix + problem)
+		return check
+
+	raise ValueError("Unknown schema: %r" % (spec,))
+
+
+COMMANDS = ListOf(AnyOf(str, TupleOf(str, bool)))  # run_* entries are a command, or (command, ignore failure)
+STRINGS = ListOf(str)
+HASH = Record({'type': OneOf("sha256", "sha512", "md5", "blake2b"), 'sum': str}, required=('type', 'sum'))
+REGEX_RULE = DictOf(OneOf(0, 1, "in_file", "out_file"), AnyOf(str, STRINGS))  # 0: pattern, 1: replacement (lines matching 0 are removed without it)
+PACKAGE_RULES = (
+	lambda p: None if p.get("is_dep_inheriter") or "repo_type" in p else "'repo_type' is missing",
+	lambda p: "repo_type '%s' needs 'folder_name'" % (p["repo_type"]) if p.get("repo_type") in ("none", "svn") and not p.get("folder_name") else None,
+	lambda p: "repo_type '%s' needs 'url' or 'download_locations'" % (p["repo_type"]) if p.get("repo_type") in ("git", "svn", "mercurial", "archive") and "url" not in p and not p.get("download_locations") else None,
+	lambda p: "cpu_count should be at least 1, not %d" % (p["cpu_count"]) if isinstance(p.get("cpu_count"), int) and not isinstance(p["cpu_count"], bool) and p["cpu_count"] < 1 else None,
+)
+PACKAGE_SCHEMA = Record({  # every key buildThing and friends look at; bump PackageIndex.FORMAT_VERSION when this changes, its cache holds the problems
+	'repo_type': OneOf("git", "svn", "mercurial", "archive", "none"),
+	'url': str,
+	'download_locations': ListOf(Record({'url': str, 'hashes': ListOf(HASH)}, required=('url',))),
+	'branch': (str, type(None)),
+	'recursive_git': bool,
+	'depth_git': int,
+	'filter_git': (str, type(None)),
+	'sparse_checkout_git': AnyOf(None, STRINGS),
+	'jobs_git': int,
+	'desired_pr_id': (str, int, type(None)),
+	'do_not_git_update': bool,
+	'folder_name': str,
+	'rename_folder': (str, type(None)),
+	'source_subfolder': (str, type(None)),
+	'make_subdir': (str, type(None)),
+	'depends_on': STRINGS,
+	'skip_deps': bool,
+	'is_dep_inheriter': bool,
+	'warnings': STRINGS,
+	'download_header': AnyOf(None, STRINGS),
+	'copy_over': AnyOf(None, STRINGS),
+	'patches': AnyOf(None, ListOf(TupleOf(str, str, str, minLength=2))),
+	'patches_post_configure': ListOf(TupleOf(str, str, str, minLength=2)),
+	'run_pre_patch': AnyOf(None, COMMANDS),
+	'run_post_patch': AnyOf(None, COMMANDS),
+	'run_post_regexreplace': AnyOf(None, COMMANDS),
+	'run_post_configure': AnyOf(None, COMMANDS),
+	'run_post_build': AnyOf(None, COMMANDS),
+	'run_post_install': AnyOf(None, COMMANDS),
+	'regex_replace': DictOf(OneOf("post_patch", "post_configure", "post_build", "post_install"), ListOf(REGEX_RULE)),
+	'conf_system': OneOf("autoconf", "cmake", "meson", "waf"),
+	'build_system': OneOf("make", "ninja", "waf", "rake"),
+	'configure_options': str,
+	'configure_path': str,
+	'do_not_bootstrap': bool,
+	'clean_post_configure': bool,
+	'needs_configure': bool,
+	'needs_make': bool,
+	'needs_make_install': bool,
+	'build_options': str,
+	'install_options': str,
+	'install_target': str,
+	'ignore_build_fail_and_run': COMMANDS,
+	'cpu_count': int,
+	'cflag_addition': (str, type(None)),
+	'custom_cflag': (str, type(None)),
+	'strip_cflags': STRINGS,
+	'custom_path': (str, type(None)),
+	'flipped_path': bool,
+	'env_exports': AnyOf(None, DictOf(str, str)),
+	'packages': DictOf(str, STRINGS),  # distribution packages it needs, informational
+	'update_check': Record({
+		'type': OneOf("git", "sourceforge", "httpindex", "ftpindex", "httpregex", "githubreleases"),
+		'url': str,
+		'regex': str,
+		'name_or_tag': OneOf("name", "tag_name"),
+	}, required=('type',)),
+	'_info': Record({'version': (str, type(None)), 'fancy_name': str}, required=('fancy_name',)),
+	'_disabled': bool,
+	'debug_downloadonly': bool,
+	'debug_confighelp_and_exit': bool,
+	'debug_exitafter': bool,
+}, rules=PACKAGE_RULES)
+VARIABLES_SCHEMA = DictOf(str, str)
+
+checkPackageSchema = compileSchema(PACKAGE_SCHEMA)
+checkVariablesSchema = compileSchema(VARIABLES_SCHEMA)
+
+
+def validatePackageData(o):  # the problems of a parsed package file, an empty list if there are none
+	problems = []
+	checkPackageSchema(o, "", problems)
+	return problems
+
+
+def validateVariables(o):
+	problems = []
+	checkVariablesSchema(o, "variables", problems)
+	return problems
+
+
+def lintPackageSource(source, path, isVariables=False):  # (problems, depends_on) of one package file's source
+	try:
+		o = PackageIndex.parseSource(source, path, isVariables)
+	except PackageLoadError as e:
+		return [e.message.strip().splitlines()[-1]], []
+	if isVariables:
+		return validateVariables(o), []
+	dependsOn = o.get("depends_on")
+	return validatePackageData(o), list(dependsOn) if isinstance(dependsOn, (list, tuple)) else []
+
+
+def lintPackageFiles(items):  # [(pType, name, problems, depends_on)] for [(pType, name, path)], run in the lint command's process pool
+	results = []
+	for pType, name, path in items:
+		try:
+			with open(path, "r", encoding="utf-8") as f:
+				source = f.read()
+		except (OSError, UnicodeDecodeError) as e:
+			results.append((pType, name, [str(e)], []))
+			continue
+		results.append((pType, name) + lintPackageSource(source, Path(path), pType == "vars"))
+	return results
+
+
+class PackageIndex:  # Parsed package files and their schema problems, cached on disk and keyed on each file's path, size and mtime.
+	FORMAT_VERSION = 2
+	CACHE_FILE_NAME = ".package_index.cache"
+
+	def __init__(self, packagesFolder, cacheFile=None):
+		self.packagesFolder = Path(packagesFolder)
+		self.cacheFile = Path(cacheFile) if cacheFile is not None else self.packagesFolder.joinpath(PackageIndex.CACHE_FILE_NAME)
+		self.files = {'deps': {}, 'prods': {}}  # package name -> (path, os.stat_result)
+		self.varsFile = None
+		self.cached = None
+		self.entries = {}
+		self.parsedCount = 0
+		self.dirty = False
+
+	@staticmethod
+	def isPathDisabled(path):
+		for part in path.parts:
+			if part.lower().startswith("_disabled"):
+				return True
+		return False
+
+	def listPackageFiles(self, folder):
+		files = {}
+		for path, subdirs, names in os.walk(folder):
+			for name in names:
 				p = Path(os.path.join(path, name))
 				if p.suffix == ".py":
-					if not isPathDisabled(p):
-						tmpPkglist["prods"].append(p)
+					if not PackageIndex.isPathDisabled(p.relative_to(self.packagesFolder)):
+						files[p.stem.lower()] = (p, p.stat())
+		return files
 
-		if len(tmpPkglist["deps"]) < 1:  # TODO simplify code
-			self.errorExit("There's no packages in the folder '%s'." % (depsFolder))
+	@staticmethod
+	def parseSource(source, path, isVariables=False):  # path is only used in errors
+		try:
+			o = ast.literal_eval(source)  # was gonna use .json instead of eval on py files, but I like having multiline strings and comments.. so.
+		except SyntaxError:
+			if isVariables:
+				raise PackageLoadError("Loading variables.py failed:\n\n" + traceback.format_exc())
+			raise PackageLoadError("Loading '%s.py' failed:\n\n%s" % (path.stem.lower(), traceback.format_exc()))
+		if not isinstance(o, dict):
+			if isVariables:
+				raise PackageLoadError("Variables file is misformatted")
+			raise PackageLoadError("Package file '%s' is misformatted" % (path.name))
+		return o
+
+	def parseFile(self, path, isVariables=False):
+		with open(path, "r", encoding="utf-8") as f:
+			o = PackageIndex.parseSource(f.read(), path, isVariables)
+		self.parsedCount += 1
+		return o
+
+	def readCache(self):
+		try:
+			with open(self.cacheFile, "rb") as f:
+				cache = pickle.load(f)
+		except (OSError, EOFError, ValueError, AttributeError, pickle.UnpicklingError):
+			return {}
+		if not isinstance(cache, dict) or cache.get("version") != PackageIndex.FORMAT_VERSION:
+			return {}
+		return cache["entries"]
+
+	def save(self):  # entries that weren't looked up this run are carried over, as long as their file still exists.
+		if self.cached is None:
+			return
+		known = {str(self.varsFile[0].relative_to(self.packagesFolder))}
+		for pType in self.files:
+			known.update(str(p.relative_to(self.packagesFolder)) for p, st in self.files[pType].values())
+		entries = {k: v for k, v in self.cached.items() if k in known}
+		entries.update(self.entries)
+		if not self.dirty and len(entries) == len(self.cached):
+			return
+		tmpFile = self.cacheFile.with_name(self.cacheFile.name + ".tmp")
+		try:
+			with open(tmpFile, "wb") as f:
+				pickle.dump({"version": PackageIndex.FORMAT_VERSION, "entries": entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+			os.replace(tmpFile, self.cacheFile)
+		except OSError:
+			return  # read-only checkouts just don't get a cache.
+		self.cached = entries
+		self.dirty = False
+
+	def scan(self):  # only stats the package files, nothing gets parsed here.
+		depsFolder = self.packagesFolder.joinpath("dependencies")
+		prodFolder = self.packagesFolder.joinpath("products")
+		varsPath = self.packagesFolder.joinpath("variables.py")
+
+		if not self.packagesFolder.is_dir():
+			raise PackageLoadError("Packages folder '%s' does not exist." % (self.packagesFolder))
+		if not depsFolder.is_dir():
+			raise PackageLoadError("Packages folder '%s' does not exist." % (depsFolder))
+		if not varsPath.is_file():
+			raise PackageLoadError("Variables file '%s' does not exist." % (varsPath))
+
+		self.files["deps"] = self.listPackageFiles(depsFolder)
+		self.files["prods"] = self.listPackageFiles(prodFolder)
+		self.varsFile = (varsPath, varsPath.stat())
+
+		if len(self.files["deps"]) < 1:
+			raise PackageLoadError("There's no packages in the folder '%s'." % (depsFolder))
+		if len(self.files["prods"]) < 1:
+			raise PackageLoadError("There's no packages in the folder '%s'." % (prodFolder))
+
+		self.cached = self.readCache()
+		self.entries = {}
+		self.parsedCount = 0
+		return self
+
+	def getEntry(self, path, st, isVariables=False):
+		key = str(path.relative_to(self.packagesFolder))  # relative, so the CLI and tools/ share one cache.
+		entry = self.entries.get(key)
+		if entry is None:
+			entry = self.cached.get(key)
+			if entry is None or entry[0] != st.st_size or entry[1] != st.st_mtime_ns:
+				o = self.parseFile(path, isVariables)
+				entry = (st.st_size, st.st_mtime_ns, o, validateVariables(o) if isVariables else validatePackageData(o))
+				self.dirty = True
+			self.entries[key] = entry
+		return entry
+
+	def get(self, pType, name):
+		path, st = self.files[pType][name]
+		return self.getEntry(path, st)[2]
+
+	def getVariables(self):
+		return self.getEntry(self.varsFile[0], self.varsFile[1], True)[2]
+
+	def problems(self, pType, name):  # schema problems of a package, only validated again when its file changed
+		path, st = self.files[pType][name]
+		return self.getEntry(path, st)[3]
+
+	def variablesProblems(self):
+		return self.getEntry(self.varsFile[0], self.varsFile[1], True)[3]
+
+	def load(self):  # returns {'deps': {}, 'prods': {}, 'vars': {}}, only files that changed since the last run get parsed again.
+		self.scan()
+		packages = {'deps': {}, 'prods': {}, 'vars': self.getVariables()}
+		for pType in ("deps", "prods"):
+			for name in self.files[pType]:
+				packages[pType][name] = self.get(pType, name)
+		self.save()
+		return packages
 
-		if len(tmpPkglist["prods"]) < 1:
-			self.errorExit("There's no packages in the folder '%s'." % (prodFolder))
 
-		with open(varsPath, "r", encoding="utf-8") as f:
-			try:
-				o = ast.literal_eval(f.read())  # was gonna use .json instead of eval on py files, but I like having multiline strings and comments.. so.
-				if not isinstance(o, dict):
-					self.errorExit("Variables file is misformatted")
-				packages["vars"] = o
-			except SyntaxError:
-				self.errorExit("Loading variables.py failed:\n\n" + traceback.format_exc())
-
-		for d in tmpPkglist["deps"]:
-			with open(d, "r", encoding="utf-8") as f:
-				p = Path(d)
-				packageName = p.stem.lower()
-				try:
-					o = ast.literal_eval(f.read())
-					if not isinstance(o, dict):
-						self.errorExit("Package file '%s' is misformatted" % (p.name))
+class PackageBundle:  # every package file in one file (see tools/merge.py), with an index up front so each package is read on its own through mmap.
+	MAGIC = b"# python_cross_compile_script package bundle\n"
+	FORMAT_VERSION = 1
 
-					if "_info" not in o and not self.boolKey(o, "is_dep_inheriter"):
-						self.logger.warning("Package '%s.py' is missing '_info' tag." % (packageName))
+	def __init__(self, bundleFile):
+		self.bundleFile = Path(bundleFile)
+		self.files = {'deps': {}, 'prods': {}}  # package name -> (path in the packages folder, offset, length)
+		self.varsFile = None
+		self.mapped = None
+		self.payloadStart = 0
+		self.parsedCount = 0
 
-					if self.boolKey(o, "_disabled"):
-						self.logger.debug("Package '%s.py' has option '_disabled' set, not loading." % (packageName))
-					else:
-						packages["deps"][packageName] = o
+	def scan(self):  # only reads the index
+		import json
+		import mmap
+		try:
+			with open(self.bundleFile, "rb") as f:
+				self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		except (OSError, ValueError) as e:
+			raise PackageLoadError("Package bundle '%s' can't be read: %s" % (self.bundleFile, e))
+		if self.mapped.readline() != PackageBundle.MAGIC:
+			raise PackageLoadError("'%s' is not a package bundle." % (self.bundleFile))
+		try:
+			header = json.loads(self.mapped.readline().decode("utf-8"))
+		except ValueError:
+			raise PackageLoadError("The index of package bundle '%s' is broken." % (self.bundleFile))
+		if header.get("version") != PackageBundle.FORMAT_VERSION:
+			raise PackageLoadError("Package bundle '%s' has version %s, this script reads version %d." % (self.bundleFile, header.get("version"), PackageBundle.FORMAT_VERSION))
+		self.payloadStart = self.mapped.tell()
+		for pType in ("deps", "prods"):
+			self.files[pType] = {name: tuple(entry) for name, entry in header[pType].items()}
+			if len(self.files[pType]) < 1:
+				raise PackageLoadError("There's no %s in the package bundle '%s'." % ("dependencies" if pType == "deps" else "products", self.bundleFile))
+		self.varsFile = tuple(header["vars"])
+		self.parsedCount = 0
+		return self
+
+	def read(self, entry):  # the source of one file in the bundle
+		start = self.payloadStart + entry[1]
+		return self.mapped[start:start + entry[2]].decode("utf-8")
+
+	def parseEntry(self, entry, isVariables=False):
+		o = PackageIndex.parseSource(self.read(entry), Path(entry[0]), isVariables)
+		self.parsedCount += 1
+		return o
+
+	def get(self, pType, name):
+		return self.parseEntry(self.files[pType][name])
+
+	def getVariables(self):
+		return self.parseEntry(self.varsFile, True)
+
+	def problems(self, pType, name):
+		return validatePackageData(self.get(pType, name))
+
+	def variablesProblems(self):
+		return validateVariables(self.getVariables())
+
+	def save(self):  # nothing is cached for bundles, parsing a single package is cheap
+		pass
+
+	def load(self):  # returns {'deps': {}, 'prods': {}, 'vars': {}}, like PackageIndex.load
+		self.scan()
+		packages = {'deps': {}, 'prods': {}, 'vars': self.getVariables()}
+		for pType in ("deps", "prods"):
+			for name in self.files[pType]:
+				packages[pType][name] = self.get(pType, name)
+		return packages
+
+	@staticmethod
+	def write(packagesFolder, bundleFile):  # packs the package files (without _disabled folders) of packagesFolder into bundleFile, returns how many
+		import json
+		index = PackageIndex(packagesFolder).scan()
+		payload = []
+		size = 0
+		header = {'version': PackageBundle.FORMAT_VERSION, 'deps': {}, 'prods': {}, 'vars': None}
+
+		def add(path):
+			nonlocal size
+			relPath = path.relative_to(index.packagesFolder).as_posix()
+			with open(path, "rb") as f:
+				data = f.read()
+			marker = ("########START:[%s]\n" % (relPath)).encode("utf-8")  # keeps the bundle readable, the index is what's used
+			payload.extend([marker, data, b"\n"])
+			entry = [relPath, size + len(marker), len(data)]
+			size += len(marker) + len(data) + 1
+			return entry
+
+		header["vars"] = add(index.varsFile[0])
+		for pType in ("deps", "prods"):
+			for name in sorted(index.files[pType]):
+				header[pType][name] = add(index.files[pType][name][0])
+
+		bundleFile = Path(bundleFile)
+		fd, tmpName = tempfile.mkstemp(prefix=bundleFile.name + ".", dir=str(bundleFile.resolve().parent))
+		with os.fdopen(fd, "wb") as f:
+			f.write(PackageBundle.MAGIC)
+			f.write(json.dumps(header, separators=(",", ":")).encode("utf-8") + b"\n")
+			for chunk in payload:
+				f.write(chunk)
+		os.chmod(tmpName, 0o644)  # it is meant to be shipped, mkstemp makes it private
+		os.replace(tmpName, bundleFile)
+		return len(header["deps"]) + len(header["prods"])
+
+
+def openPackages(path):  # the package index of a packages folder, or of a bundle file made by tools/merge.py
+	if Path(path).is_file():
+		return PackageBundle(path)
+	return PackageIndex(path)
+
+
+class LazyPackages(Mapping):  # one package type of a PackageRepository, packages are parsed on first access.
+	def __init__(self, repository, pType):
+		self.repository = repository
+		self.pType = pType
+		self.loaded = {}
+
+	def __getitem__(self, name):
+		if name not in self.loaded:
+			if name not in self.repository.index.files[self.pType]:
+				raise KeyError(name)
+			self.loaded[name] = self.repository.materialize(self.pType, name)
+		if self.loaded[name] is None:  # _disabled
+			raise KeyError(name)
+		return self.loaded[name]
+
+	def __contains__(self, name):
+		try:
+			self[name]
+		except KeyError:
+			return False
+		return True
+
+	def __iter__(self):
+		for name in list(self.repository.index.files[self.pType]):
+			if name in self:
+				yield name
+
+	def __len__(self):
+		return sum(1 for name in self)
+
+
+class PackageRepository:  # looks packages up by name, only what is actually used gets parsed and validated.
+	def __init__(self, index, validate=None):
+		self.index = index
+		self.validate = validate  # called with (packageName, packageData) once per loaded package, returns False to skip it.
+		self.packages = {'deps': LazyPackages(self, "deps"), 'prods': LazyPackages(self, "prods")}
+		self.variables = None
+		self.dependencyGraph = None
+
+	def __getitem__(self, pType):  # keeps the old self.packages["deps"][name] style working
+		if pType == "vars":
+			if self.variables is None:
+				self.variables = self.index.getVariables()
+			return self.variables
+		return self.packages[pType]
+
+	def __contains__(self, pType):
+		return pType in ("deps", "prods", "vars")
+
+	def materialize(self, pType, name):
+		o = self.index.get(pType, name)
+		if self.validate is not None and not self.validate(name, o):
+			return None
+		return o
+
+	def countIndexed(self):
+		return len(self.index.files["deps"]) + len(self.index.files["prods"])
 
-				except SyntaxError:
-					self.errorExit("Loading '%s.py' failed:\n\n%s" % (packageName, traceback.format_exc()))
+	def countLoaded(self):
+		return len(self.packages["deps"].loaded) + len(self.packages["prods"].loaded)
 
-		for d in tmpPkglist["prods"]:
-			with open(d, "r", encoding="utf-8") as f:
-				p = Path(d)
-				packageName = p.stem.lower()
+	def graph(self):
+		if self.dependencyGraph is None:
+			self.dependencyGraph = DependencyGraph(self)
+			self.index.save()
+		return self.dependencyGraph
+
+	def closure(self, names, pType="prods"):  # returns the names of every dependency needed to build those packages, in build order.
+		ordered = []
+		visited = set()
+
+		def visit(name, t, requiredBy):
+			if t == "deps" and name in visited:
+				return
+			if name not in self.packages[t]:
+				if requiredBy is None:
+					raise MissingDependency("The package '{0}' does not exist.".format(name))
+				raise MissingDependency("The dependency '{0}' of '{1}' does not exist in dependency config.".format(name, requiredBy))
+			if t == "deps":
+				visited.add(name)
+			for d in self.packages[t][name].get("depends_on") or ():
+				visit(d, "deps", name)
+			if t == "deps":
+				ordered.append(name)
+
+		for n in names:
+			visit(n, pType, None)
+		self.index.save()
+		return ordered
+
+
+class DependencyGraph:  # forward/reverse adjacency of all packages, built once and queried by the info command.
+	def __init__(self, packages):
+		self.types = {}  # package name -> "deps" or "prods"
+		self.forward = {}
+		self.reverse = {}
+		self.missing = {}  # package name -> depends_on entries that don't exist
+		for pType in ("deps", "prods"):
+			for name, pkg in packages[pType].items():
+				self.types[name] = pType
+				self.forward[name] = tuple(pkg.get("depends_on") or ())
+				self.reverse[name] = []
+		for name, children in self.forward.items():
+			for c in children:
+				if c in self.reverse:
+					self.reverse[c].append(name)
+				else:
+					self.missing.setdefault(name, []).append(c)
+		self.cycles = self.findCycles()
+		self.order = self.topologicalOrder()
+		self.descendants = {}
+		self.ancestors = {}
+
+	def findCycles(self):  # Tarjan's strongly connected components, every component bigger than one (or a self-reference) is a cycle.
+		index = {}
+		lowLink = {}
+		stack = []
+		onStack = set()
+		cycles = []
+		counter = [0]
+
+		def strongConnect(v):
+			index[v] = lowLink[v] = counter[0]
+			counter[0] += 1
+			stack.append(v)
+			onStack.add(v)
+			for w in self.forward[v]:
+				if w not in self.forward:
+					continue
+				if w not in index:
+					strongConnect(w)
+					lowLink[v] = min(lowLink[v], lowLink[w])
+				elif w in onStack:
+					lowLink[v] = min(lowLink[v], index[w])
+			if lowLink[v] == index[v]:
+				component = []
+				while True:
+					w = stack.pop()
+					onStack.discard(w)
+					component.append(w)
+					if w == v:
+						break
+				if len(component) > 1 or v in self.forward[v]:
+					cycles.append(sorted(component))
+
+		limit = sys.getrecursionlimit()
+		sys.setrecursionlimit(max(limit, len(self.forward) * 2 + 100))
+		try:
+			for v in self.forward:
+				if v not in index:
+					strongConnect(v)
+		finally:
+			sys.setrecursionlimit(limit)
+		return cycles
+
+	def topologicalOrder(self):  # dependencies first, packages stuck in a cycle are left out.
+		pending = {name: len([c for c in children if c in self.forward]) for name, children in self.forward.items()}
+		ready = sorted(name for name, count in pending.items() if count == 0)
+		order = []
+		while ready:
+			name = ready.pop(0)
+			order.append(name)
+			for parent in sorted(self.reverse[name]):
+				pending[parent] -= 1
+				if pending[parent] == 0:
+					ready.append(parent)
+		return order
+
+	def closureOf(self, name, adjacency, memo):
+		if name in memo:
+			return memo[name]
+		result = set()
+		memo[name] = result  # cycles simply stop here
+		for c in adjacency[name]:
+			if c in adjacency:
+				result.add(c)
+				result |= self.closureOf(c, adjacency, memo)
+		return result
+
+	def transitiveDependencies(self, name):
+		if not self.descendants:
+			for n in self.order:  # dependencies are always computed before the packages using them
+				self.closureOf(n, self.forward, self.descendants)
+		return self.closureOf(name, self.forward, self.descendants)
+
+	def transitiveRequirers(self, name):
+		if not self.ancestors:
+			for n in reversed(self.order):
+				self.closureOf(n, self.reverse, self.ancestors)
+		return self.closureOf(name, self.reverse, self.ancestors)
+
+	def sortByOrder(self, names):
+		position = {n: i for i, n in enumerate(self.order)}
+		return sorted(names, key=lambda n: (position.get(n, len(position)), n))
+
+	def dependencyTree(self, name):  # nested {dependency: subtree or None}, shared subtrees are only built once.
+		memo = {}
+
+		def tree(x, path):
+			if x in memo:
+				return memo[x]
+			subtree = {}
+			for c in self.forward.get(x, ()):
+				if c in path:
+					subtree[c] = "<cycle>"
+				elif self.forward.get(c):
+					subtree[c] = tree(c, path | {c})
+				else:
+					subtree[c] = None
+			memo[x] = subtree
+			return subtree
+		return tree(name, {name})
+
+	def why(self, fromName, toName):  # shortest depends_on chain from one package to another, or None.
+		previous = {fromName: None}
+		queue = [fromName]
+		while queue:
+			current = queue.pop(0)
+			if current == toName:
+				path = []
+				while current is not None:
+					path.append(current)
+					current = previous[current]
+				return list(reversed(path))
+			for c in self.forward.get(current, ()):
+				if c not in previous:
+					previous[c] = current
+					queue.append(c)
+		return None
+
+
+class BuildStateStore:  # small json file in the work dir that remembers things between runs, split into named sections.
+	def __init__(self, path):
+		self.path = Path(path)
+		self.sections = None
+
+	def load(self):
+		if self.sections is None:
+			import json
+			self.sections = {}
+			if self.path.is_file():
 				try:
-					o = ast.literal_eval(f.read())
-					if not isinstance(o, dict):
-						self.errorExit("Package file '%s' is misformatted" % (p.name))
+					with open(self.path, "r", encoding="utf-8") as f:
+						self.sections = json.load(f)
+				except (OSError, ValueError):
+					self.sections = {}  # a broken state file only costs us the shortcuts it enables
+		return self.sections
+
+	def get(self, section, key, default=None):
+		return self.load().get(section, {}).get(key, default)
+
+	def set(self, section, key, value):
+		self.load().setdefault(section, {})[key] = value
+		self.save()
+
+	def save(self):
+		import json
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		fd, tmpName = tempfile.mkstemp(prefix=self.path.name + ".", dir=str(self.path.parent))
+		with os.fdopen(fd, "w", encoding="utf-8") as f:
+			json.dump(self.sections, f, indent=4, sort_keys=True)
+		os.replace(tmpName, self.path)
+
+
+class PatchCache:  # downloaded patches, stored under the sha256 of their content; which url gave which file is kept in the build state.
+	def __init__(self, cacheDir, buildState):
+		self.cacheDir = Path(cacheDir)
+		self.buildState = buildState
+
+	def lookup(self, url):
+		digest = self.buildState.get("patch_urls", url)
+		if digest is not None and self.cacheDir.joinpath(digest + ".patch").is_file():
+			return self.cacheDir.joinpath(digest + ".patch")
+		return None
+
+	def store(self, url, data):
+		digest = hashlib.sha256(data).hexdigest()
+		path = self.cacheDir.joinpath(digest + ".patch")
+		if not path.is_file():
+			self.cacheDir.mkdir(parents=True, exist_ok=True)
+			fd, tmpName = tempfile.mkstemp(prefix=digest + ".", dir=str(self.cacheDir))
+			with os.fdopen(fd, "wb") as f:
+				f.write(data)
+			os.replace(tmpName, path)
+		self.buildState.set("patch_urls", url, digest)
+		return path
+
+
+class SystemToolchain:  # a mingw-w64 cross toolchain installed outside the workdir (e.g by the distribution), probed for whether it can replace the built one
+	COMPILER_DRIVERS = ["gcc", "g++", "c++", "cpp"]  # wrapped, so they also search the workdir's target prefix
+	REQUIRED_TOOLS = ["g++", "cpp", "ar", "as", "ld", "nm", "objcopy", "objdump", "ranlib", "strip", "windres", "dlltool"]
+	OPTIONAL_TOOLS = ["c++", "ld.bfd", "readelf", "size", "strings", "addr2line", "c++filt", "gcc-ar", "gcc-nm", "gcc-ranlib", "windmc", "widl"]
+
+	def __init__(self, triple, searchPath, minGccVersion):
+		self.triple = triple
+		self.tools = {}  # e.g 'ar': '/usr/bin/x86_64-w64-mingw32-ar'
+		self.gccVersion = None  # (major, minor)
+		self.threadModel = None
+		self.sysroot = ""  # gcc -print-sysroot, empty when gcc was configured without one
+		self.targetDir = None  # the folder with the target's include and lib, e.g /usr/x86_64-w64-mingw32
+		self.checks = []  # (description, "OK"/"WARN"/"FAIL", detail)
+		self.probe(searchPath, minGccVersion)
+
+	@property
+	def usable(self):
+		return all(state != "FAIL" for description, state, detail in self.checks)
+
+	def findTool(self, name, searchPath):  # prefers Debian's -posix variants of the compilers, the plain name may point at the win32 thread model
+		for candidate in [F"{self.triple}-{name}-posix", F"{self.triple}-{name}"]:
+			path = shutil.which(candidate, path=searchPath)
+			if path is not None:
+				return path
+		return None
+
+	def gccOutput(self, *args):
+		return subprocess.run([self.tools["gcc"]] + list(args), stdout=subprocess.PIPE, stderr=subprocess.STDOUT).stdout.decode("utf-8", "replace").strip()
+
+	def probe(self, searchPath, minGccVersion):
+		gcc = self.findTool("gcc", searchPath)
+		if gcc is None:
+			self.checks.append(("C compiler", "FAIL", F"{self.triple}-gcc not found"))
+			return
+		self.tools["gcc"] = gcc
+		self.checks.append(("C compiler", "OK", gcc))
+
+		output = self.gccOutput("-v")
+		target = re.search(r"^Target: (\S+)$", output, re.MULTILINE)
+		target = target.group(1) if target else "unknown"
+		self.checks.append(("target", "OK" if target == self.triple else "FAIL", target))
+
+		version = re.search(r"^gcc version (\d+)(?:\.(\d+))?", output, re.MULTILINE)
+		if version:
+			self.gccVersion = (int(version.group(1)), int(version.group(2) or 0))
+			self.checks.append(("gcc version", "OK" if self.gccVersion >= minGccVersion else "FAIL", "%d.%d (at least %d.%d is required)" % (self.gccVersion + minGccVersion)))
+		else:
+			self.checks.append(("gcc version", "FAIL", "unknown"))
+
+		threadModel = re.search(r"^Thread model: (\S+)$", output, re.MULTILINE)
+		self.threadModel = threadModel.group(1) if threadModel else "unknown"
+		self.checks.append(("thread model", "OK" if self.threadModel == "posix" else "FAIL", self.threadModel + ("" if self.threadModel == "posix" else " (posix is required, packages use winpthreads)")))
+
+		self.sysroot = self.gccOutput("-print-sysroot")
+		kernel32 = self.gccOutput("-print-file-name=libkernel32.a")
+		if os.path.isabs(kernel32):
+			self.targetDir = os.path.dirname(os.path.dirname(os.path.realpath(kernel32)))
+			hasHeaders = os.path.isfile(os.path.join(self.targetDir, "include", "windows.h"))
+			self.checks.append(("sysroot", "OK" if hasHeaders else "FAIL", self.targetDir + ("" if hasHeaders else " has no include/windows.h") + (F" (gcc sysroot: {self.sysroot})" if self.sysroot else "")))
+		else:
+			self.checks.append(("sysroot", "FAIL", "libkernel32.a not found, mingw-w64-crt is missing"))
 
-					if "_info" not in o and not self.boolKey(o, "is_dep_inheriter"):
-						self.logger.warning("Package '%s.py' is missing '_info' tag." % (packageName))
+		winpthreads = self.gccOutput("-print-file-name=libpthread.a")
+		self.checks.append(("winpthreads", "OK" if os.path.isabs(winpthreads) else "FAIL", winpthreads if os.path.isabs(winpthreads) else "libpthread.a not found"))
 
-					if self.boolKey(o, "_disabled"):
-						self.logger.debug("Package '%s.py' has option '_disabled' set, not loading." % (packageName))
-					else:
-						packages["prods"][packageName] = o
+		missing = []
+		for tool in self.REQUIRED_TOOLS + self.OPTIONAL_TOOLS:
+			path = self.findTool(tool, searchPath)
+			if path is not None:
+				self.tools[tool] = path
+			elif tool in self.REQUIRED_TOOLS:
+				missing.append(tool)
+		self.checks.append(("tools", "FAIL" if missing else "OK", ("missing: " + ", ".join(missing)) if missing else ", ".join(sorted(self.tools.keys()))))
+
+		gendef = shutil.which(F"{self.triple}-gendef", path=searchPath) or shutil.which("gendef", path=searchPath)
+		if gendef is not None:
+			self.tools["gendef"] = gendef
+		self.checks.append(("gendef", "OK" if gendef else "WARN", gendef or "not found, packages that use it will fail"))
+
+	def report(self):
+		lines = ["System toolchain for %s is %s:" % (self.triple, "usable" if self.usable else "not usable")]
+		for description, state, detail in self.checks:
+			lines.append("  [%-4s] %s: %s" % (state, description, detail))
+		return lines
+
+
+class FrozenSlots:  # __slots__ object whose fields are set once by the constructor, for compiled recipes
+	__slots__ = ()
+
+	def __init__(self, **fields):
+		for cls in type(self).__mro__:
+			for name in cls.__dict__.get("__slots__", ()):
+				object.__setattr__(self, name, fields.pop(name))
+		if fields:
+			raise TypeError("%s has no fields %s" % (type(self).__name__, ", ".join(fields)))
+
+	def __setattr__(self, name, value):
+		raise AttributeError("%s is immutable" % (type(self).__name__))
+
+	def __delattr__(self, name):
+		raise AttributeError("%s is immutable" % (type(self).__name__))
+
+	def __repr__(self):
+		fields = [(name, getattr(self, name)) for cls in reversed(type(self).__mro__) for name in cls.__dict__.get("__slots__", ())]
+		return "%s(%s)" % (type(self).__name__, ", ".join("%s=%r" % f for f in fields))
+
+
+class Recipe(FrozenSlots):  # a package compiled once by CrossCompileScript.compileRecipe, the steps are run in order by runRecipe
+	__slots__ = ("packageName", "type", "warnings", "steps", "exitAfter")
+
+
+class RecipeState:  # what the steps of one recipe share while it runs
+	__slots__ = ("forceRebuild", "oldPath", "packageDir", "backDir")
+
+	def __init__(self, forceRebuild):
+		self.forceRebuild = forceRebuild
+		self.oldPath = ""
+		self.packageDir = None  # the fetched source folder, where !SWITCHDIRBACK of patch commands goes
+		self.backDir = None  # where !SWITCHDIRBACK goes in the current phase
+
+
+class RecipeStep(FrozenSlots):  # every step class defines run(script, state), which does its work in the current directory; runRecipe counts its time towards phase
+	__slots__ = ("phase",)
+
+
+class FetchStep(RecipeStep):  # clones or unpacks the package next to the others and enters its folder
+	__slots__ = ("packageName", "product", "repoType", "url", "folderName", "renameFolder", "branch", "recursive", "doNotUpdate", "desiredPR", "depth", "gitOptions", "packageData", "headers", "downloadOnly")
+
+	def run(self, script, state):
+		script.cchdir(script.fullProductDir if self.product else script.bitnessPath)  # descend into x86_64_products or x86_64
+		workDir = None
+		if self.repoType == "git":
+			workDir = script.gitClone(self.url, self.folderName, self.renameFolder, self.branch, self.recursive, self.doNotUpdate, self.desiredPR, self.depth, **dict(self.gitOptions))
+		elif self.repoType == "svn":
+			workDir = script.svnClone(self.url, self.folderName, self.renameFolder)
+		elif self.repoType == "mercurial":
+			workDir = script.mercurialClone(self.url, self.folderName, self.renameFolder, self.branch, state.forceRebuild)
+		elif self.repoType == "archive":
+			workDir = script.downloadUnpackFile(self.packageData, self.packageName, self.folderName, None)
+		elif self.repoType == "none":
+			workDir = self.folderName
+			os.makedirs(workDir, exist_ok=True)
+
+		if workDir is None:
+			script.errorExit("Unexpected error when fetching '{0}', please report this.".format(self.packageName))
+
+		if self.renameFolder is not None:  # this should be moved inside the download functions, TODO.. but lazy
+			if not os.path.isdir(self.renameFolder):
+				shutil.move(workDir, self.renameFolder)
+			workDir = self.renameFolder
+
+		for h in self.headers:
+			script.downloadHeader(h)
+
+		script.cchdir(workDir)  # descend into x86_64/[DEPENDENCY_OR_PRODUCT_FOLDER]
+		if self.downloadOnly:
+			script.cchdir("..")
+			exit()
+
+		state.oldPath = script.getKeyOrBlankString(os.environ, "PATH")
+		state.packageDir = state.backDir = os.getcwd()
+
+
+class UnlessMarkerStep(RecipeStep):  # runs steps unless a file starting with prefix exists, checked once before the first one
+	__slots__ = ("prefix", "steps")
+
+	def run(self, script, state):
+		if script.anyFileStartsWith(self.prefix):
+			return
+		for step in self.steps:
+			step.run(script, state)
+
+
+class CommandStep(RecipeStep):  # one run_* command
+	__slots__ = ("command", "ignoreFail", "label", "quiet")
+
+	def run(self, script, state):
+		cmd = script.replaceVariables(self.command)
+		(script.logger.debug if self.quiet else script.logger.info)("Running {0}-command: '{1}'".format(self.label, cmd))
+		script.runProcess(cmd, self.ignoreFail)
+
+
+class SwitchDirStep(RecipeStep):  # !SWITCHDIR|path, or !SWITCHDIRBACK when path is None
+	__slots__ = ("path",)
+
+	def run(self, script, state):
+		script.cchdir(state.backDir if self.path is None else script.replaceVariables(self.path))
+
+
+class RegexStep(RecipeStep):  # the regex_replace rules of one phase
+	__slots__ = ("packageName", "rules")
+
+	def run(self, script, state):
+		script.handleRegexReplaces(self.rules, self.packageName)
+
+
+class ForceRebuildStep(RecipeStep):  # with --force: resets a git checkout, or removes the marker files of the current folder
+	__slots__ = ("cleanGit",)
+
+	def run(self, script, state):
+		if not state.forceRebuild:
+			return
+		if not self.cleanGit:
+			script.removeAlreadyFiles()
+			script.removeConfigPatchDoneFiles()
+		elif os.path.isdir(".git"):
+			script.runProcess('git clean -ffdx')  # https://gist.github.com/nicktoumpelis/11214362
+			script.runProcess('git submodule foreach --recursive git clean -ffdx')
+			script.runProcess('git reset --hard')
+			script.runProcess('git submodule foreach --recursive git reset --hard')
+			script.runProcess('git submodule update --init --recursive')
+
+
+class EnterDirStep(RecipeStep):  # source_subfolder and make_subdir, path None goes back to the package folder
+	__slots__ = ("path",)
+
+	def run(self, script, state):
+		if self.path is None:
+			script.cchdir(state.packageDir)
+			return
+		if not os.path.isdir(self.path):
+			os.makedirs(self.path, exist_ok=True)
+		script.cchdir(self.path)
+
+
+class ConfigHelpStep(RecipeStep):  # debug_confighelp_and_exit
+	__slots__ = ()
+
+	def run(self, script, state):
+		script.bootstrapConfigure()
+		script.runProcess("./configure --help")
+		exit()
+
+
+class FlagsStep(RecipeStep):  # cflag_addition, custom_cflag and strip_cflags
+	__slots__ = ("addition", "custom", "strip")
+
+	def run(self, script, state):
+		if self.addition is not None:
+			os.environ["CFLAGS"] = os.environ["CFLAGS"] + " " + self.addition
+			os.environ["CXXFLAGS"] = os.environ["CXXFLAGS"] + " " + self.addition
+			script.logger.info(F'Added to C(XX)FLAGS, they\'re are now: "{os.environ["CXXFLAGS"]}", "{os.environ["CFLAGS"]}"')
+		if self.custom is not None:
+			os.environ["CFLAGS"] = self.custom
+			os.environ["CXXFLAGS"] = self.custom
+			script.logger.info(F'Set custom C(XX)FLAGS, they\'re are now: "{os.environ["CXXFLAGS"]}", "{os.environ["CFLAGS"]}"')
+		for _pattern in self.strip:
+			os.environ["CFLAGS"] = script.reStrip(_pattern, os.environ["CFLAGS"])
+			os.environ["CXXFLAGS"] = script.reStrip(_pattern, os.environ["CXXFLAGS"])
+			script.logger.info(F'Stripped C(XX)FLAGS, they\'re are now: "{os.environ["CXXFLAGS"]}", "{os.environ["CFLAGS"]}"')
+
+
+class EnvPushStep(RecipeStep):  # custom_path, flipped_path and env_exports, undone by EnvPopStep
+	__slots__ = ("customPath", "flipped", "exports")
+
+	def run(self, script, state):
+		if self.customPath is not None:
+			path = script.replaceVariables(self.customPath)
+			script.logger.debug("Setting PATH to '{0}'".format(path))
+			os.environ["PATH"] = path
+		if self.flipped:
+			bef = os.environ["PATH"]
+			os.environ["PATH"] = "{0}:{1}:{2}".format(script.mingwBinpath, os.path.join(script.targetPrefix, 'bin'), script.originalPATH)  # todo properly test this..
+			script.logger.debug("Flipping path to: '{0}' from '{1}'".format(bef, os.environ["PATH"]))
+		for key, val in self.exports:
+			val = script.replaceVariables(val)
+			script.logger.debug("Environment variable '{0}' has been set from {1} to '{2}'".format(key, os.environ.get(key, ''), val))
+			os.environ[key] = val
+
+
+class EnvPopStep(RecipeStep):
+	__slots__ = ("exports", "flipped", "restorePath")
+
+	def run(self, script, state):
+		for key in self.exports:
+			script.logger.debug("Environment variable '{0}' has been UNSET!".format(key))
+			del os.environ[key]
+		if self.flipped:
+			_path = os.environ["PATH"]
+			os.environ["PATH"] = "{0}:{1}".format(script.mingwBinpath, script.originalPATH)
+			script.logger.debug("Resetting flipped path to: '{0}' from '{1}'".format(_path, os.environ["PATH"]))
+		if self.restorePath:
+			script.logger.debug("Re-setting PATH to '{0}'".format(state.oldPath))
+			os.environ["PATH"] = state.oldPath
+
+
+class CopyOverStep(RecipeStep):  # copy_over, into the package folder
+	__slots__ = ("files",)
+
+	def run(self, script, state):
+		for f in self.files:
+			f_formatted = Path(script.replaceVariables(f))
+			if not f_formatted.is_file():
+				script.errorExit("Copy-over file '%s' (Unformatted: '%s') does not exist." % (f_formatted, f))
+			dst = os.path.join(state.packageDir, f_formatted.name)
+			script.logger.info("Copying file over from '%s' to '%s'" % (f_formatted, dst))
+			shutil.copyfile(f_formatted, dst)
+
+
+class PatchStep(RecipeStep):  # one patches or patches_post_configure entry
+	__slots__ = ("url", "level", "postConf", "folder")
+
+	def run(self, script, state):
+		script.applyPatch(self.url, self.level, self.postConf, self.folder)
+
+
+class ConfigureStep(RecipeStep):  # ./configure (or configure_path) of autoconf and waf packages, skipped while its marker file exists
+	__slots__ = ("packageName", "system", "touchName", "options", "bootstrap", "command", "cleanCommand", "cpuCountStr", "steps", "patches")
+
+	def run(self, script, state):
+		if os.path.isfile(self.touchName):
+			return
+		script.removeAlreadyFiles()
+		script.removeConfigPatchDoneFiles()
+
+		if self.bootstrap:
+			if self.system == "waf":
+				if not os.path.isfile("waf") and os.path.isfile("bootstrap.py"):
+					script.runProcess('./bootstrap.py')
+			else:
+				script.bootstrapConfigure()
+
+		configOpts = ''
+		if self.options is not None:
+			try:
+				configOpts = script.replaceVariables(self.options)
+			except KeyError as e:
+				script.errorExit(F'Failed to parse configure line: "{self.options}", the variable {e} is unvalid.')
+		script.logger.info("Configuring '{0}' with: {1}".format(self.packageName, configOpts), extra={'type': self.system})
+
+		script.runProcess(F'{self.command} {configOpts}')
+
+		for step in self.steps:  # regex_replace post_configure and run_post_configure
+			step.run(script, state)
+		if self.cleanCommand is not None:
+			script.runProcess('{0} {1}'.format(self.cleanCommand, self.cpuCountStr), True)
+		for step in self.patches:
+			step.run(script, state)
+
+		script.touch(self.touchName)
+
+
+class GeneratorStep(RecipeStep):  # cmake or meson, skipped while its marker file exists
+	__slots__ = ("packageName", "system", "touchName", "options", "steps")
+
+	def run(self, script, state):
+		if os.path.isfile(self.touchName):
+			return
+		script.removeAlreadyFiles()
 
-				except SyntaxError:
-					self.errorExit("Loading '%s.py' failed:\n\n%s" % (packageName, traceback.format_exc()))
+		makeOpts = ''
+		if self.options is not None:
+			makeOpts = script.replaceVariables(self.options)
+		script.logger.info("{0} '{1}' with: {2}".format("C-Making" if self.system == "cmake" else "Meson'ing", self.packageName, makeOpts))
 
-		self.logger.info("Loaded %d packages", len(packages["prods"]) + len(packages["deps"]))
+		script.runProcess('{0} {1}'.format(self.system, makeOpts))
+		if self.system == "cmake":
+			script.runProcess("make clean", True)
+
+		for step in self.steps:  # regex_replace post_configure
+			step.run(script, state)
+
+		script.touch(self.touchName)
+
+
+class BuildStep(RecipeStep):  # make, ninja, rake or waf build, skipped while its marker file exists
+	__slots__ = ("packageName", "system", "touchName", "command", "cleanFirst", "cpuCountStr", "options", "onFail", "steps")
+
+	def run(self, script, state):
+		if os.path.isfile(self.touchName):
+			return
+		state.backDir = os.getcwd()
+
+		if self.cleanFirst and os.path.isfile("configure"):
+			script.runProcess(F'make clean {self.cpuCountStr}', True)
+
+		makeOpts = ''
+		if self.options is not None:
+			makeOpts = script.replaceVariables(self.options)
+
+		if script.debugMode:
+			print("### Environment variables:  ###")
+			for tk in os.environ:
+				print("\t" + tk + " : " + os.environ[tk])
+			print("##############################")
+
+		script.logger.info(F"Building '{self.packageName}' with: {makeOpts} in {os.getcwd()}", extra={'type': self.system})
+
+		if self.onFail:
+			try:
+				script.runProcess(F'{self.command} {self.cpuCountStr} {makeOpts}')
+			except Exception:  # todo, except specific exception
+				script.logger.info("Ignoring failed make process...")
+				for step in self.onFail:
+					step.run(script, state)
+		else:
+			script.runProcess(F'{self.command} {self.cpuCountStr} {makeOpts}')
+
+		for step in self.steps:  # regex_replace post_build and run_post_build
+			step.run(script, state)
+
+		script.touch(self.touchName)
+
+
+class InstallStep(RecipeStep):  # the install target, skipped while its marker file exists
+	__slots__ = ("packageName", "system", "touchName", "command", "target", "options", "cpuCountStr", "steps")
+
+	def run(self, script, state):
+		if os.path.isfile(self.touchName):
+			return
+		state.backDir = os.getcwd()
+
+		makeInstallOpts = ''
+		if self.options is not None:
+			makeInstallOpts = script.replaceVariables(self.options)
+
+		script.logger.info("Installing '{0}' with: {1}".format(self.packageName, makeInstallOpts), extra={'type': self.system})
+
+		script.runProcess(F'{self.command} {self.target} {makeInstallOpts} {self.cpuCountStr}')
+
+		for step in self.steps:  # regex_replace post_install and run_post_install
+			step.run(script, state)
+
+		script.touch(self.touchName)
+
+
+def compileCommands(phase, commands, label, quiet=False):  # run_* entries as steps, with their !SWITCHDIR lines parsed once
+	steps = []
+	for cmd in commands or ():
+		ignoreFail = False
+		if isinstance(cmd, (list, tuple)):  # (command, ignore failure)
+			cmd, ignoreFail = cmd[0], cmd[1]
+		if cmd.startswith("!SWITCHDIRBACK"):
+			steps.append(SwitchDirStep(phase=phase, path=None))
+		elif cmd.startswith("!SWITCHDIR"):
+			steps.append(SwitchDirStep(phase=phase, path="|".join(cmd.split("|")[1:])))
+		else:
+			steps.append(CommandStep(phase=phase, command=cmd, ignoreFail=ignoreFail, label=label, quiet=quiet))
+	return steps
+
+
+class CrossCompileScript:
+	TOOLCHAIN_MANIFEST = ".toolchain_manifest.json"  # written into exported toolchains
+	gitCloneDefaults = {  # used for git packages that don't set these keys themselves
+		'filter_git': 'blob:none',  # partial clone filter, only applied to full-history clones (depth_git 0)
+		'sparse_checkout_git': None,  # list of directories to check out (cone mode), None checks out everything
+		'jobs_git': 8,  # submodules fetched in parallel
+	}
+	toolchainDefaults = {  # optional keys of the 'toolchain' config category, so older configs keep working
+		'mingw_persistent_build': False,  # keep the toolchain's src and bld folders, a changed config then only rebuilds the affected parts
+		'mingw_provider': 'build',  # build: this script's own toolchain, system: an installed one (see SystemToolchain), auto: system if it is usable, else build
+		'mingw_system_path': None,  # where to look for the system toolchain, PATH if None
+	}
+	SYSTEM_TOOLCHAIN_DIR = "system_toolchain"  # in the workdir, has the layout of a built toolchain but links to the system's tools
+	systemToolchainMinGcc = (10, 0)
+
+	def __init__(self):
+		sys.dont_write_bytecode = True  # Avoid __pycache__ folder, never liked that solution
+		hdlr = logging.StreamHandler(sys.stdout)
+		fmt = MyLogFormatter("[%(asctime)s][%(levelname)s]%(type)s %(message)s", "%H:%M:%S")
+		hdlr.setFormatter(fmt)
+		self.logger = logging.getLogger(__name__)
+		self.logger.addHandler(hdlr)
+		self.logger.setLevel(logging.INFO)
+		self.logHandler = hdlr
+		self.config = None
+		self.settingsLoaded = False
+		self.loadedPackages = None
+		self.lastError = None
+		self.fetchedGitMirrors = set()
+		self.systemToolchains = {}  # target triple: probed SystemToolchain
+		self.toolchainInfo = None  # the SystemToolchain used for the current bitness, None when it is built by this script
+		self.gitRemoteHeads = {}  # (url, ref): sha from git ls-remote, None if the remote couldn't be asked
+		self.resolvedPatches = {}  # patch entry as written in the package: local or cached file to apply
+		self.patchesValidated = set()  # bitnesses whose source trees had their patches checked
+		self.recipes = {}  # (type, package name): compiled Recipe
+		self.buildTimings = {}  # package name: {phase: seconds} of what was built in this run
+
+	def loadSettings(self):  # config file and init(), deferred until after argument parsing so --help doesn't pay for it
+		if self.settingsLoaded:
+			return
+		self.settingsLoaded = True
+		self.config = self.loadConfig()
+		fmt = MyLogFormatter(self.config["script"]["log_format"], self.config["script"]["log_date_format"])
+		self.logHandler.setFormatter(fmt)
+		self.init()
+
+	@property
+	def packages(self):
+		if self.loadedPackages is None:
+			self.loadSettings()
+			self.loadedPackages = self.loadPackages(self.config["script"]["packages_folder"])
+		return self.loadedPackages
+
+	def errorExit(self, msg):
+		self.logger.error(msg)
+		sys.exit(1)
+
+	def loadPackages(self, packages_folder):
+		def validatePackage(packageName, o):
+			if "_info" not in o and not self.boolKey(o, "is_dep_inheriter"):
+				self.logger.warning("Package '%s.py' is missing '_info' tag." % (packageName))
+
+			if self.boolKey(o, "_disabled"):
+				self.logger.debug("Package '%s.py' has option '_disabled' set, not loading." % (packageName))
+				return False
+			return True
+
+		try:
+			packages = PackageRepository(openPackages(packages_folder).scan(), validatePackage)
+		except PackageLoadError as e:
+			self.errorExit(e.message)
+
+		self.logger.debug("Indexed %d packages" % (packages.countIndexed()))
 		return packages
 
+	def loadPackageClosure(self, names, pType):  # parses just the requested packages and everything they depend on, so missing ones fail early.
+		try:
+			deps = self.packages.closure(names, pType)
+			self.preflightPackages(names, pType, deps)
+		except (MissingDependency, PackageLoadError) as e:
+			self.errorExit(e.message)
+		self.logger.debug("Loaded %d of %d packages (%d dependencies needed)" % (self.packages.countLoaded(), self.packages.countIndexed(), len(deps)))
+		return deps
+
 	def confDiff(self, default, users):  # very basic config comparison
 		for category in default:
 			if category not in users:
@@ -266,6 +1508,8 @@ class CrossCompileScript:
 
 		conf = None
 
+		import yaml
+
 		with open(config_file, 'r') as cs:
 			try:
 				conf = yaml.safe_load(cs)
@@ -284,6 +1528,8 @@ class CrossCompileScript:
 			return None
 
 	def writeDefaultConfig(self, config_file):
+		import yaml
+
 		with open(config_file, "w", encoding="utf-8") as f:
 			f.write(yaml.dump(self.config))
 		self.logger.info("Wrote default configuration file to: '%s'" % (config_file))
@@ -299,6 +1545,9 @@ class CrossCompileScript:
 		self.quietMode = self.config["script"]["quiet"]
 		self.debugMode = self.config["script"]["debug"]
 		self.userAgent = self.config["script"]["user_agent"]
+		self.gitMirrorDir = self.fullWorkDir.joinpath("git_mirrors")  # full-history bare mirrors, shared by every checkout of the same url
+		self.buildState = BuildStateStore(self.fullWorkDir.joinpath("build_state.json"))
+		self.patchCache = PatchCache(self.fullWorkDir.joinpath("patch_cache"), self.buildState)
 		if self.debugMode:
 			self.initDebugMode()
 		if self.quietMode:
@@ -312,9 +1561,12 @@ class CrossCompileScript:
 		self.logger.setLevel(logging.DEBUG)
 		self.logger.debug('Debugging is on')
 
-	def listifyPackages(self, pdlist, type):
+	def listifyPackages(self, pType, type):
+		main = self
+
 		class customArgsAction(argparse.Action):
 			def __call__(self, parser, args, values, option_string=None):
+				pdlist = main.packages[pType]
 				format = "CLI"
 				if args.markdown:
 					format = "MD"
@@ -433,9 +1685,10 @@ class CrossCompileScript:
 				parser.exit()
 		return customArgsAction
 
-	def assembleConfigHelps(self, pdlist, type, main):
+	def assembleConfigHelps(self, pType, type, main):
 		class customArgsAction(argparse.Action):
 			def __call__(self, parser, args, values, option_string=None):
+				pdlist = main.packages[pType]
 				main.quietMode = True
 				main.init_quietMode()
 				main.prepareBuilding(64)
@@ -488,14 +1741,14 @@ class CrossCompileScript:
 		list_p.add_argument('-md', '--markdown', help='Print list in markdown format', action='store_true')
 		list_p.add_argument('-cv', '--csv', help='Print list as CSV-like string', action='store_true')
 		list_p_group1 = list_p.add_mutually_exclusive_group(required=True)
-		list_p_group1.add_argument('-p', '--products', nargs=0, help='List all products', action=self.listifyPackages(self.packages["prods"], "P"))
-		list_p_group1.add_argument('-d', '--dependencies', nargs=0, help='List all dependencies', action=self.listifyPackages(self.packages["deps"], "D"))
+		list_p_group1.add_argument('-p', '--products', nargs=0, help='List all products', action=self.listifyPackages("prods", "P"))
+		list_p_group1.add_argument('-d', '--dependencies', nargs=0, help='List all dependencies', action=self.listifyPackages("deps", "D"))
 
 		chelps_p = subparsers.add_parser('chelps', help='Type: \'' + parser.prog + ' chelps --help\' for more help')
 		list_p.set_defaults(which='chelps_p')
 		chelps_p_group1 = chelps_p.add_mutually_exclusive_group(required=True)
-		chelps_p_group1.add_argument('-p', '--products', nargs=0, help='Write all product config helps to confighelps.txt', action=self.assembleConfigHelps(self.packages["prods"], "P", self))
-		chelps_p_group1.add_argument('-d', '--dependencies', nargs=0, help='Write all dependency config helps to confighelps.txt', action=self.assembleConfigHelps(self.packages["deps"], "D", self))
+		chelps_p_group1.add_argument('-p', '--products', nargs=0, help='Write all product config helps to confighelps.txt', action=self.assembleConfigHelps("prods", "P", self))
+		chelps_p_group1.add_argument('-d', '--dependencies', nargs=0, help='Write all dependency config helps to confighelps.txt', action=self.assembleConfigHelps("deps", "D", self))
 
 		info_p = subparsers.add_parser('info', help='Type: \'' + parser.prog + ' info --help\' for more help')
 		info_p.set_defaults(which='info_p')
@@ -503,6 +1756,21 @@ class CrossCompileScript:
 		info_p_group1 = info_p.add_mutually_exclusive_group(required=True)
 		info_p_group1.add_argument('-r', '--required-by', help='List all packages this dependency is required by', default=None)
 		info_p_group1.add_argument('-d', '--depends-on', help='List all packages this package depends on (recursively)', default=None)
+		info_p_group1.add_argument('-w', '--why', nargs=2, metavar=('PACKAGE', 'DEPENDENCY'), help='Show the chain of packages through which PACKAGE depends on DEPENDENCY', default=None)
+		info_p_group1.add_argument('-c', '--check', help='Check the dependency graph for cycles and missing dependencies and print the build order', action='store_true')
+		info_p.add_argument('-t', '--transitive', help='Make --required-by/--depends-on list every package in the chain, not just direct ones', action='store_true')
+		info_p.add_argument('-j', '--json', help='Print the result as JSON', action='store_true')
+
+		lint_p = subparsers.add_parser('lint', help='Type: \'' + parser.prog + ' lint --help\' for more help')
+		lint_p.set_defaults(which='lint_p')
+		lint_p.add_argument('-j', '--jobs', type=int, default=min(cpu_count(), 8), help='Processes checking the package files (default: %(default)s)')
+		lint_p.add_argument('--json', help='Print the result as JSON', action='store_true')
+
+		toolchain_p = subparsers.add_parser('toolchain', help='Type: \'' + parser.prog + ' toolchain --help\' for more help')
+		toolchain_p.set_defaults(which='toolchain_p')
+		toolchain_p.add_argument('action', choices=['export', 'import', 'fingerprint'], help='export: pack the built toolchain, import: unpack one into the workdir, fingerprint: print the fingerprint of the configured toolchain')
+		toolchain_p.add_argument('archive', nargs='?', default=None, help='Archive to write or read (default: <fingerprint>.tar.xz here for export, the toolchain cache for import)')
+		toolchain_p.add_argument('-i', '--ignore-fingerprint', help='Import even if the archive was built with a different configuration', action='store_true')
 
 		group2 = parser.add_mutually_exclusive_group(required=False)
 		group2.add_argument('-p', '--build-product', dest='PRODUCT', help='Build the specificed product package(s)')
@@ -514,6 +1782,7 @@ class CrossCompileScript:
 		parser.add_argument('-s', '--skip-depends', help='Skip dependencies when building', action='store_true')
 
 		if len(sys.argv) == 1:
+			self.loadSettings()
 			self.defaultEntrace()
 		else:
 			def errorOut(p, t, m=None):
@@ -524,12 +1793,27 @@ class CrossCompileScript:
 					print(m)
 				exit(1)
 			args = parser.parse_args()
+			if getattr(args, "json", False):  # stdout only carries the JSON document, logging goes to stderr
+				self.logHandler.setStream(sys.stderr)
+			self.loadSettings()
 
 			if args.which == "info_p":
 				if args.required_by:
-					self.listRequiredBy(args.required_by)
+					self.listRequiredBy(args.required_by, args.transitive, args.json)
 				if args.depends_on:
-					self.listDependsOn(args.depends_on)
+					self.listDependsOn(args.depends_on, args.transitive, args.json)
+				if args.why:
+					self.listWhy(args.why[0], args.why[1], args.json)
+				if args.check:
+					self.checkDependencyGraph(args.json)
+				return
+
+			if args.which == "toolchain_p":
+				self.toolchainCommand(args.action, args.archive, args.ignore_fingerprint)
+				return
+
+			if args.which == "lint_p":
+				self.lintPackages(args.jobs, args.json)
 				return
 
 			forceRebuild = False
@@ -573,65 +1857,64 @@ class CrossCompileScript:
 			if args.skip_depends:
 				skipDeps = True
 
+			pType = "prods" if buildType == "PRODUCT" else "deps"
+			deps = self.loadPackageClosure(finalPkgList, pType)
+			self.prefetchGitRemoteHeads([(d, self.packages["deps"][d]) for d in deps] + [(p, self.packages[pType][p]) for p in finalPkgList])
+			toPatch = ([] if skipDeps else [(d, "DEPENDENCY", self.packages["deps"][d]) for d in deps]) + [(p, buildType, self.packages[pType][p]) for p in finalPkgList]
+			self.fetchPatches(toPatch)
+
 			for thing in finalPkgList:
 				for b in self.targetBitness:
 					main.prepareBuilding(b)
 					main.buildMingw(b)
 					main.initBuildFolders()
+					main.validatePatches(b, toPatch)
 					if buildType == "PRODUCT":
 						self.buildThing(thing, self.packages["prods"][thing], buildType, forceRebuild, skipDeps)
 					else:
 						self.buildThing(thing, self.packages["deps"][thing], buildType, forceRebuild, skipDeps)
 					main.finishBuilding()
 
-	def listDependsOn(self, pkgName):
-		if pkgName not in self.packages["prods"] and pkgName not in self.packages["deps"]:
+	def printJson(self, obj):
+		import json
+		print(json.dumps(obj, indent=4))
+
+	def requireGraphPackage(self, graph, pkgName):
+		if pkgName not in graph.types:
 			self.logger.error("'%s' is not an existing package." % (pkgName))
 			sys.exit(1)
 
-		deps = {}
-
-		def getDeps(x):
-			oobj = {}
-			if "depends_on" in self.packages["deps"][x]:
-				for x in self.packages["deps"][x]["depends_on"]:
-					oobj[x] = None
-					if "depends_on" in self.packages["deps"][x]:
-						oobj[x] = {}
-						for _newPkgName in self.packages["deps"][x]["depends_on"]:
-							oobj[x][_newPkgName] = getDeps(_newPkgName)
-			return oobj
-
-		import pprint
-		pprint.pprint(getDeps(pkgName))
-
-	def listRequiredBy(self, o):
-		# ptype = None
-		# if o in self.packages["prods"]:
-		# 	ptype = "prods"
-		# elif o in self.packages["deps"]:
-		# 	ptype = "deps"
-		# else:
-		if o not in self.packages["prods"] and o not in self.packages["deps"]:
-			self.logger.error("'%s' is not an existing package." % (o))
-			sys.exit(1)
+	def listDependsOn(self, pkgName, transitive=False, asJson=False):
+		graph = self.packages.graph()
+		self.requireGraphPackage(graph, pkgName)
 
-		prodsRequiringIt = []
-		depsRequiringIt = []
-
-		for p in self.packages["deps"]:
-			pkg = self.packages["deps"][p]
-			if "depends_on" in pkg:
-				if o in pkg["depends_on"]:
-					depsRequiringIt.append(p)
-		for p in self.packages["prods"]:
-			pkg = self.packages["prods"][p]
-			if "depends_on" in pkg:
-				if o in pkg["depends_on"]:
-					prodsRequiringIt.append(p)
-
-		if len(prodsRequiringIt) > 0 or len(depsRequiringIt) > 0:
-			self.logger.info("Packages requiring '%s':" % (o))
+		if transitive:
+			deps = graph.sortByOrder(graph.transitiveDependencies(pkgName))
+			if asJson:
+				self.printJson({'package': pkgName, 'transitive': True, 'depends_on': deps})
+			else:
+				self.logger.info("'%s' depends on %d packages (in build order):" % (pkgName, len(deps)))
+				print(",".join(deps))
+		else:
+			tree = graph.dependencyTree(pkgName)
+			if asJson:
+				self.printJson({'package': pkgName, 'transitive': False, 'depends_on': tree})
+			else:
+				import pprint
+				pprint.pprint(tree)
+
+	def listRequiredBy(self, o, transitive=False, asJson=False):
+		graph = self.packages.graph()
+		self.requireGraphPackage(graph, o)
+
+		requirers = graph.transitiveRequirers(o) if transitive else graph.reverse[o]
+		depsRequiringIt = sorted(p for p in requirers if graph.types[p] == "deps")
+		prodsRequiringIt = sorted(p for p in requirers if graph.types[p] == "prods")
+
+		if asJson:
+			self.printJson({'package': o, 'transitive': transitive, 'dependencies': depsRequiringIt, 'products': prodsRequiringIt})
+		elif len(prodsRequiringIt) > 0 or len(depsRequiringIt) > 0:
+			self.logger.info("Packages requiring '%s'%s:" % (o, " (directly or indirectly)" if transitive else ""))
 			if len(depsRequiringIt) > 0:
 				self.logger.info("\tDependencies: %s" % (",".join(depsRequiringIt)))
 			if len(prodsRequiringIt) > 0:
@@ -641,11 +1924,87 @@ class CrossCompileScript:
 
 		sys.exit(0)
 
+	def listWhy(self, pkgName, depName, asJson=False):
+		graph = self.packages.graph()
+		self.requireGraphPackage(graph, pkgName)
+		self.requireGraphPackage(graph, depName)
+
+		path = graph.why(pkgName, depName)
+		if asJson:
+			self.printJson({'package': pkgName, 'dependency': depName, 'path': path})
+		elif path is None:
+			self.logger.warning("'%s' does not depend on '%s'." % (pkgName, depName))
+		else:
+			self.logger.info(" -> ".join(path))
+
+	def checkDependencyGraph(self, asJson=False):
+		graph = self.packages.graph()
+		if asJson:
+			self.printJson({'cycles': graph.cycles, 'missing': graph.missing, 'order': graph.order})
+		else:
+			for cycle in graph.cycles:
+				self.logger.error("Dependency cycle between: %s" % (",".join(cycle)))
+			for pkgName, deps in sorted(graph.missing.items()):
+				self.logger.error("'%s' depends on packages that don't exist: %s" % (pkgName, ",".join(deps)))
+			self.logger.info("Build order of %d packages:" % (len(graph.order)))
+			print(",".join(graph.order))
+		if graph.cycles or graph.missing:
+			sys.exit(1)
+
+	def lintPackages(self, jobs, asJson=False):  # checks every package file and variables.py against the schema, reading the files themselves instead of the package cache
+		start = time.monotonic()
+		try:
+			index = openPackages(self.config["script"]["packages_folder"]).scan()
+		except PackageLoadError as e:
+			self.errorExit(e.message)
+
+		if isinstance(index, PackageBundle):  # already mapped, not worth a process pool
+			items = [("vars", "variables", index.varsFile)] + [(pType, name, entry) for pType in ("deps", "prods") for name, entry in index.files[pType].items()]
+			results = [(pType, name) + lintPackageSource(index.read(entry), Path(entry[0]), pType == "vars") for pType, name, entry in items]
+		else:
+			from concurrent.futures import ProcessPoolExecutor
+			items = [("vars", "variables", str(index.varsFile[0]))] + [(pType, name, str(path)) for pType in ("deps", "prods") for name, (path, st) in index.files[pType].items()]
+			jobs = max(1, min(jobs, len(items)))
+			with ProcessPoolExecutor(max_workers=jobs) as executor:
+				results = [r for chunk in executor.map(lintPackageFiles, [items[i::jobs] for i in range(jobs)]) for r in chunk]
+
+		problems = {}
+		for pType, name, found, dependsOn in sorted(results, key=lambda r: (r[0] != "vars", r[1])):
+			found = found + ["depends on '%s', which does not exist" % (d) for d in dependsOn if d not in index.files["deps"]]
+			if found:
+				problems[name if pType == "vars" else "%s/%s" % (pType, name)] = found
+		seconds = time.monotonic() - start
+
+		if asJson:
+			self.printJson({'files': len(results), 'seconds': round(seconds, 3), 'problems': problems})
+		else:
+			for name, found in problems.items():
+				for problem in found:
+					self.logger.error("%s: %s" % (name, problem))
+			self.logger.info("Checked %d files in %.2fs, %d of them have problems." % (len(results), seconds, len(problems)))
+		if problems:
+			sys.exit(1)
+
+	def preflightPackages(self, names, pType, deps):  # fails before anything gets built if one of the packages about to be built breaks the schema; problems are cached with the parsed packages
+		problems = [("variables", p) for p in self.packages.index.variablesProblems()]
+		toCheck = dict.fromkeys([("deps", d) for d in deps] + [(pType, n) for n in names])
+		for t, name in toCheck:
+			problems += [(name, p) for p in self.packages.index.problems(t, name)]
+		if problems:
+			for name, problem in problems:
+				self.logger.error("%s: %s" % (name, problem))
+			self.errorExit("The packages to build have %d problems, '%s lint' checks all of them." % (len(problems), os.path.basename(__file__)))
+
 	def defaultEntrace(self):
+		deps = self.loadPackageClosure(self.product_order, "prods")
+		self.prefetchGitRemoteHeads([(d, self.packages["deps"][d]) for d in deps] + [(p, self.packages["prods"][p]) for p in self.product_order])
+		toPatch = [(d, "DEPENDENCY", self.packages["deps"][d]) for d in deps] + [(p, "PRODUCT", self.packages["prods"][p]) for p in self.product_order]
+		self.fetchPatches(toPatch)
 		for b in self.targetBitness:
 			self.prepareBuilding(b)
 			self.buildMingw(b)
 			self.initBuildFolders()
+			self.validatePatches(b, toPatch)
 			for p in self.product_order:
 				self.buildThing(p, self.packages["prods"][p], "PRODUCT")
 			self.finishBuilding()
@@ -684,17 +2043,20 @@ class CrossCompileScript:
 		self.bitnessStrWin = "win64" if bitness == 64 else "win32"  # e.g win64
 		self.targetHostStr = F"{self.bitnessStr}-w64-mingw32"  # e.g x86_64-w64-mingw32
 
-		self.targetPrefix = self.fullWorkDir.joinpath(self.mingwDir, self.bitnessStr + "-w64-mingw32", self.targetHostStr)  # workdir/xcompilers/mingw-w64-x86_64/x86_64-w64-mingw32
+		self.toolchainInfo = self.selectToolchain(self.targetHostStr)
+		toolchainRoot = self.fullWorkDir.joinpath(self.mingwDir if self.toolchainInfo is None else self.SYSTEM_TOOLCHAIN_DIR)
+
+		self.targetPrefix = toolchainRoot.joinpath(self.bitnessStr + "-w64-mingw32", self.targetHostStr)  # workdir/xcompilers/mingw-w64-x86_64/x86_64-w64-mingw32
 
 		self.inTreePrefix = self.fullWorkDir.joinpath(self.bitnessStr)  # workdir/x86_64
 
 		self.offtreePrefix = self.fullWorkDir.joinpath(self.bitnessStr + "_offtree")  # workdir/x86_64_offtree
 
-		self.targetSubPrefix = self.fullWorkDir.joinpath(self.mingwDir, self.bitnessStr + "-w64-mingw32")  # e.g workdir/xcompilers/mingw-w64-x86_64
+		self.targetSubPrefix = toolchainRoot.joinpath(self.bitnessStr + "-w64-mingw32")  # e.g workdir/xcompilers/mingw-w64-x86_64
 
-		self.mingwBinpath = self.fullWorkDir.joinpath(self.mingwDir, self.bitnessStr + "-w64-mingw32", "bin")  # e.g workdir/xcompilers/mingw-w64-x86_64/bin
+		self.mingwBinpath = toolchainRoot.joinpath(self.bitnessStr + "-w64-mingw32", "bin")  # e.g workdir/xcompilers/mingw-w64-x86_64/bin
 
-		self.mingwBinpath2 = self.fullWorkDir.joinpath(self.mingwDir, self.bitnessStr + "-w64-mingw32", self.bitnessStr + "-w64-mingw32", "bin")  # e.g workdir/xcompilers/x86_64-w64-mingw32/x86_64-w64-mingw32/bin
+		self.mingwBinpath2 = toolchainRoot.joinpath(self.bitnessStr + "-w64-mingw32", self.bitnessStr + "-w64-mingw32", "bin")  # e.g workdir/xcompilers/x86_64-w64-mingw32/x86_64-w64-mingw32/bin
 
 		self.fullCrossPrefixStr = F"{self.mingwBinpath}/{self.bitnessStr}-w64-mingw32-"  # e.g workdir/xcompilers/mingw-w64-x86_64/bin/x86_64-w64-mingw32-
 
@@ -821,57 +2183,256 @@ class CrossCompileScript:
 
 		return ":".join(str(x) for x in possiblePaths)
 
+	def getToolchainOption(self, key):
+		return self.config["toolchain"].get(key, self.toolchainDefaults[key])
+
+	def selectToolchain(self, triple):  # the SystemToolchain to use for triple, None if this script's own toolchain is used
+		provider = self.getToolchainOption("mingw_provider")
+		if provider == "build":
+			return None
+		if provider not in ("system", "auto"):
+			self.errorExit("Unknown mingw_provider '%s', it has to be build, system or auto." % (provider))
+
+		if triple not in self.systemToolchains:
+			searchPath = self.getToolchainOption("mingw_system_path") or self.originalPATH
+			self.systemToolchains[triple] = SystemToolchain(triple, searchPath, self.systemToolchainMinGcc)
+			for line in self.systemToolchains[triple].report():
+				self.logger.info(line)
+			if not self.systemToolchains[triple].usable:
+				if provider == "system":
+					self.errorExit("The system toolchain for %s can not be used, see the report above, or set mingw_provider to build or auto." % (triple))
+				self.logger.warning("Falling back to building the toolchain for %s." % (triple))
+		toolchain = self.systemToolchains[triple]
+		return toolchain if toolchain.usable else None
+
+	def setupSystemToolchain(self, toolchain):  # fills the system toolchain folder: wrapped compilers and links to the other tools, dependencies get installed next to them
+		binDir = Path(self.mingwBinpath)
+		binDir.mkdir(parents=True, exist_ok=True)
+		self.targetPrefix.mkdir(parents=True, exist_ok=True)
+		for tool, path in toolchain.tools.items():
+			for name in ([tool, self.shortCrossPrefixStr + tool] if tool == "gendef" else [self.shortCrossPrefixStr + tool]):
+				dest = binDir.joinpath(name)
+				if tool in toolchain.COMPILER_DRIVERS:  # the system compiler doesn't know the workdir's prefix, which in a built toolchain is its sysroot
+					content = '#!/bin/sh\nexec "{0}" -isystem "{1}/include" "$@" -L"{1}/lib"\n'.format(path, self.targetPrefix)
+					if dest.is_symlink():
+						dest.unlink()
+					if not dest.is_file() or dest.read_text() != content:
+						dest.write_text(content)
+						dest.chmod(0o755)
+				elif not dest.is_symlink() or os.readlink(dest) != path:
+					if dest.is_symlink() or dest.exists():
+						dest.unlink()
+					dest.symlink_to(path)
+
 	def buildMingw(self, bitness):
 		gcc_bin = os.path.join(self.mingwBinpath, self.bitnessStr + "-w64-mingw32-gcc")
+		persistentBuild = self.getToolchainOption("mingw_persistent_build") and self.toolchainInfo is None
+
+		if self.toolchainInfo is not None:
+			self.logger.info("Using the system toolchain for %s (gcc %d.%d) through '%s'" % ((self.targetHostStr,) + self.toolchainInfo.gccVersion + (self.mingwBinpath,)))
+			self.setupSystemToolchain(self.toolchainInfo)
 
 		if os.path.isfile(gcc_bin):
 			gccOutput = subprocess.check_output(gcc_bin + " -v", shell=True, stderr=subprocess.STDOUT).decode("utf-8")
 			workingGcc = re.compile("^Target: .*-w64-mingw32$", re.MULTILINE).findall(gccOutput)
 			if len(workingGcc) > 0:
+				if persistentBuild:
+					self.updatePersistentMingw()
 				self.logger.info("MinGW-w64 install is working!")
 				return
 			else:
 				raise Exception("GCC is not working properly, target is not mingw32.")
 				exit(1)
 
-		elif not os.path.isdir(self.mingwDir):
-			self.logger.info("Building MinGW-w64 in folder '{0}'".format(self.mingwDir))
+		elif not os.path.isdir(self.mingwDir) or persistentBuild:  # a persistent build resumes where it stopped
+			toolchainBuilder = self.createToolchainBuilder()
+			fingerprint = toolchainBuilder.getFingerprint()
+			cachedArchive = self.toolchainCacheDir.joinpath(fingerprint + ".tar.xz")
+			if cachedArchive.is_file() and not os.path.isdir(self.mingwDir):
+				self.logger.info("Restoring MinGW-w64 toolchain %s from '%s'" % (fingerprint[:12], cachedArchive))
+				self.importToolchain(cachedArchive, fingerprint)
+				return self.buildMingw(bitness)
 
-			# os.makedirs(self.mingwDir, exist_ok=True)
+			self.logger.info("Building MinGW-w64 in folder '{0}'".format(self.mingwDir))
 
 			os.unsetenv("CFLAGS")
 
-			# self.cchdir(self.mingwDir)
-
-			module_path = self.config["script"]["mingw_toolchain_path"].replace("/", ".").rstrip(".py")
-
-			if not os.path.isfile(os.path.join("..", self.config["script"]["mingw_toolchain_path"])):
-				self.errorExit("Specified MinGW build script path does not exist: '%s'" % (module_path))
-
-			def toolchainBuildStatus(logMessage):
-				self.logger.info(logMessage)
-
-			mod = importlib.import_module(module_path)
-
-			# from mingw_toolchain_script.mingw_toolchain_script import MinGW64ToolChainBuilder
-
-			toolchainBuilder = mod.MinGW64ToolChainBuilder()
-
-			toolchainBuilder.workDir = self.mingwDir
-			if self.config["toolchain"]["mingw_commit"] is not None:
-				toolchainBuilder.setMinGWcheckout(self.config["toolchain"]["mingw_commit"])
-			if self.config["toolchain"]["mingw_custom_cflags"] is not None:
-				toolchainBuilder.setCustomCflags(self.config["toolchain"]["mingw_custom_cflags"])
-			toolchainBuilder.setDebugBuild(self.config["toolchain"]["mingw_debug_build"])
-			toolchainBuilder.onStatusUpdate += toolchainBuildStatus
 			toolchainBuilder.build()
 
-			# self.cchdir("..")
+			self.logger.info("Storing MinGW-w64 toolchain %s in '%s'" % (fingerprint[:12], cachedArchive))
+			if not self.exportToolchain(cachedArchive, fingerprint):
+				self.logger.warning("Failed to store the toolchain in the cache, the next new workdir will have to build it again.")
 		else:
 			self.logger.error("It looks like the previous MinGW build failed, please delete the folder '%s' and re-run this script" % self.mingwDir)
 			sys.exit(1)
 	#:
 
+	def updatePersistentMingw(self):  # rebuilds the parts of a working toolchain whose configuration changed, using the kept build folders
+		import json
+		manifestFile = self.fullWorkDir.joinpath(self.mingwDir, self.TOOLCHAIN_MANIFEST)
+		toolchainBuilder = self.createToolchainBuilder()
+		fingerprint = toolchainBuilder.getFingerprint()
+		if not manifestFile.is_file():  # built before manifests existed, nothing to compare against so it is taken as is
+			with open(manifestFile, "w", encoding="utf-8") as f:
+				json.dump({'fingerprint': fingerprint, 'prefix': str(self.fullWorkDir.joinpath(self.mingwDir)), 'created': int(time.time())}, f, indent=4)
+			return
+		with open(manifestFile, "r", encoding="utf-8") as f:
+			if json.load(f)["fingerprint"] == fingerprint:
+				return
+
+		self.logger.info("MinGW-w64 configuration changed, rebuilding the affected parts of '{0}'".format(self.mingwDir))
+		os.unsetenv("CFLAGS")
+		toolchainBuilder.build()
+
+		cachedArchive = self.toolchainCacheDir.joinpath(fingerprint + ".tar.xz")
+		self.logger.info("Storing MinGW-w64 toolchain %s in '%s'" % (fingerprint[:12], cachedArchive))
+		if not self.exportToolchain(cachedArchive, fingerprint):
+			self.logger.warning("Failed to store the toolchain in the cache, the next new workdir will have to build it again.")
+
+	def createToolchainBuilder(self):  # a MinGW64ToolChainBuilder set up from the config, working in the current folder (the workdir)
+		module_path = self.config["script"]["mingw_toolchain_path"].replace("/", ".").rstrip(".py")
+
+		if not os.path.isfile(self.projectRoot.joinpath(self.config["script"]["mingw_toolchain_path"])):
+			self.errorExit("Specified MinGW build script path does not exist: '%s'" % (module_path))
+
+		def toolchainBuildStatus(logMessage):
+			self.logger.info(logMessage)
+
+		mod = importlib.import_module(module_path)
+
+		toolchainBuilder = mod.MinGW64ToolChainBuilder()
+
+		toolchainBuilder.workDir = self.mingwDir
+		toolchainBuilder.gitMirrorDir = str(self.gitMirrorDir)
+		targets = [("x86_64" if b == 64 else "i686") + "-w64-mingw32" for b in self.targetBitness]
+		toolchainBuilder.setTargets([t for t in targets if self.selectToolchain(t) is None] or targets)  # all bitnesses at once, they share the host libraries
+		if self.config["toolchain"]["mingw_commit"] is not None:
+			toolchainBuilder.setMinGWcheckout(self.config["toolchain"]["mingw_commit"])
+		if self.config["toolchain"]["mingw_custom_cflags"] is not None:
+			toolchainBuilder.setCustomCflags(self.config["toolchain"]["mingw_custom_cflags"])
+		toolchainBuilder.setDebugBuild(self.config["toolchain"]["mingw_debug_build"])
+		toolchainBuilder.setPersistentBuild(self.getToolchainOption("mingw_persistent_build"))
+		toolchainBuilder.onStatusUpdate += toolchainBuildStatus
+		return toolchainBuilder
+
+	@property
+	def toolchainCacheDir(self):  # shared by every checkout of this script on the machine
+		return Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser().joinpath("python_cross_compile_script", "toolchains")
+
+	@property
+	def archiveCacheDir(self):  # archives stored under their sha256, e.g by tools/check_versions.py --apply
+		return Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser().joinpath("python_cross_compile_script", "archives")
+
+	def exportToolchain(self, archive, fingerprint):  # packs the toolchain folder into a .tar.xz, with a manifest that lets importToolchain relocate it; False if tar failed
+		import json
+		toolchainDir = self.fullWorkDir.joinpath(self.mingwDir)
+		manifest = {'fingerprint': fingerprint, 'prefix': str(toolchainDir), 'created': int(time.time())}
+		with open(toolchainDir.joinpath(self.TOOLCHAIN_MANIFEST), "w", encoding="utf-8") as f:
+			json.dump(manifest, f, indent=4)
+
+		archive = Path(archive)
+		archive.parent.mkdir(parents=True, exist_ok=True)
+		tmpArchive = archive.with_name(archive.name + ".tmp")
+		excluded = ["src", "bld"]  # build trees kept by persistent builds
+		if shutil.which("xz") and shutil.which("tar"):
+			excludeArgs = "".join(' --exclude="./{0}"'.format(e) for e in excluded)
+			if self.runProcess('tar -I "xz -T0" -cf "{0}"{1} -C "{2}" .'.format(tmpArchive, excludeArgs, toolchainDir), exitOnError=False) is None:
+				tmpArchive.unlink()
+				return False
+		else:
+			import tarfile
+			with tarfile.open(tmpArchive, "w:xz") as tar:
+				tar.add(str(toolchainDir), arcname=".", filter=lambda info: None if info.name in ["./" + e for e in excluded] else info)  # skipped folders are not recursed into
+		os.replace(tmpArchive, archive)
+		return True
+
+	def importToolchain(self, archive, fingerprint=None):  # unpacks an exported toolchain into the toolchain folder, checking its fingerprint if one is given
+		import json
+		toolchainDir = self.fullWorkDir.joinpath(self.mingwDir)
+		if toolchainDir.exists():
+			self.errorExit("The toolchain folder '%s' already exists, delete it first." % (toolchainDir))
+		tmpDir = toolchainDir.with_name(toolchainDir.name + ".tmp")
+		if tmpDir.exists():
+			shutil.rmtree(tmpDir)
+		tmpDir.mkdir(parents=True)
+
+		from mingw_toolchain_script.archive_extract import ExtractError, extractTar
+		try:
+			extractTar(str(archive), str(tmpDir))
+		except ExtractError as e:
+			shutil.rmtree(tmpDir)
+			self.errorExit(e.message)
+
+		manifestFile = tmpDir.joinpath(self.TOOLCHAIN_MANIFEST)
+		if not manifestFile.is_file():
+			shutil.rmtree(tmpDir)
+			self.errorExit("'%s' is not an exported toolchain, it has no %s." % (archive, self.TOOLCHAIN_MANIFEST))
+		with open(manifestFile, "r", encoding="utf-8") as f:
+			manifest = json.load(f)
+		if fingerprint is not None and manifest["fingerprint"] != fingerprint:
+			shutil.rmtree(tmpDir)
+			self.errorExit("Toolchain '%s' was built with a different configuration (%s, this config is %s)." % (archive, manifest["fingerprint"][:12], fingerprint[:12]))
+
+		relocated = self.relocateToolchain(tmpDir, manifest["prefix"], str(toolchainDir))
+		self.logger.debug("Relocated %d toolchain files from '%s'" % (relocated, manifest["prefix"]))
+		os.rename(tmpDir, toolchainDir)
+		manifest["prefix"] = str(toolchainDir)
+		with open(toolchainDir.joinpath(self.TOOLCHAIN_MANIFEST), "w", encoding="utf-8") as f:
+			json.dump(manifest, f, indent=4)
+
+	def relocateToolchain(self, folder, oldPrefix, newPrefix):  # rewrites the absolute prefix in text files (.la, .pc, specs..) and symlinks, returns how many were changed
+		if oldPrefix == newPrefix:
+			return 0
+		old = oldPrefix.encode("utf-8")
+		new = newPrefix.encode("utf-8")
+		changed = 0
+		for root, dirs, files in os.walk(folder):
+			for name in files + dirs:
+				path = os.path.join(root, name)
+				if os.path.islink(path):
+					target = os.readlink(path)
+					if target.startswith(oldPrefix):
+						os.unlink(path)
+						os.symlink(newPrefix + target[len(oldPrefix):], path)
+						changed += 1
+					continue
+				if name in dirs or os.path.getsize(path) > 4 * 1024 * 1024:
+					continue
+				with open(path, "rb") as f:
+					data = f.read()
+				if old not in data or b"\0" in data[:8192]:  # binaries find their files relative to themselves
+					continue
+				with open(path, "wb") as f:
+					f.write(data.replace(old, new))
+				changed += 1
+		return changed
+
+	def toolchainCommand(self, action, archive=None, ignoreFingerprint=False):
+		if archive is not None:
+			archive = Path(archive).resolve()
+		self.fullWorkDir.mkdir(exist_ok=True)
+		self.cchdir(self.fullWorkDir)
+		fingerprint = self.createToolchainBuilder().getFingerprint()
+
+		if action == "fingerprint":
+			print(fingerprint)
+		elif action == "export":
+			if not self.fullWorkDir.joinpath(self.mingwDir).is_dir():
+				self.errorExit("There is no toolchain in '%s' to export." % (self.fullWorkDir.joinpath(self.mingwDir)))
+			if archive is None:
+				archive = self.projectRoot.joinpath(fingerprint + ".tar.xz")
+			self.logger.info("Exporting MinGW-w64 toolchain %s to '%s'" % (fingerprint[:12], archive))
+			if not self.exportToolchain(archive, fingerprint):
+				self.errorExit("Failed to export the toolchain to '%s'." % (archive))
+		elif action == "import":
+			if archive is None:
+				archive = self.toolchainCacheDir.joinpath(fingerprint + ".tar.xz")
+			if not archive.is_file():
+				self.errorExit("Toolchain archive '%s' does not exist." % (archive))
+			self.logger.info("Importing MinGW-w64 toolchain from '%s'" % (archive))
+			self.importToolchain(archive, None if ignoreFingerprint else fingerprint)
+		self.cchdir(self.projectRoot)
+
 	def downloadHeader(self, url):
 		destination = self.targetPrefix.joinpath("include")
 		fileName = os.path.basename(urlparse(url).path)
@@ -907,6 +2468,7 @@ class CrossCompileScript:
 			userAgent = 'wget/1.18'  # sourceforce <3 wget
 
 		if url.lower().startswith("ftp://"):
+			import urllib.request
 			self.logger.info("Requesting : {0}".format(url))
 			if outputFileName is not None:
 				fileName = outputFileName
@@ -927,6 +2489,9 @@ class CrossCompileScript:
 				exit(1)
 			return fullOutputPath
 
+		import progressbar
+		import requests
+
 		req = requests.get(url, stream=True, headers={"User-Agent": userAgent})
 
 		if req.status_code != 200:
@@ -1017,71 +2582,79 @@ class CrossCompileScript:
 				return fullOutputPath
 	#:
 
+	def writeToolchainFile(self, path, content, description):  # (re)written whenever the bitness or toolchain it describes changes
+		if os.path.isfile(path):
+			with open(path, 'r') as f:
+				if f.read() == content:
+					return
+		self.logger.info("Creating %s at: '%s'" % (description, path))
+		with open(path, 'w') as f:
+			f.write(content)
+
 	def createCmakeToolchainFile(self):
-		if not os.path.isfile(self.cmakeToolchainFile):
-			self.logger.info("Creating CMake Toolchain file at: '%s'" % (self.cmakeToolchainFile))
-			tcFile = [
-				F'set(CMAKE_SYSTEM_NAME Windows)',
-				F'set(CMAKE_SYSTEM_PROCESSOR {self.bitnessStr})',
-				F'set(CMAKE_SYSROOT {self.targetSubPrefix})',
-				#F'set(CMAKE_STAGING_PREFIX /home/devel/stage)',
-				F'set(CMAKE_RANLIB {self.shortCrossPrefixStr}ranlib)',
-				F'set(CMAKE_C_COMPILER {self.shortCrossPrefixStr}gcc)',
-				F'set(CMAKE_CXX_COMPILER {self.shortCrossPrefixStr}g++)',
-				F'set(CMAKE_RC_COMPILER {self.shortCrossPrefixStr}windres)',
-				F'set(CMAKE_ASM_COMPILER {self.mingwBinpath}/{self.shortCrossPrefixStr}as)',
-				F'set(CMAKE_FIND_ROOT_PATH {self.targetPrefix})',
-				F'set(CMAKE_FIND_ROOT_PATH_MODE_PROGRAM NEVER)',
-				F'set(CMAKE_FIND_ROOT_PATH_MODE_LIBRARY ONLY)',
-				F'set(CMAKE_FIND_ROOT_PATH_MODE_INCLUDE ONLY)',
-				F'set(CMAKE_FIND_ROOT_PATH_MODE_PACKAGE ONLY)',
-
-				# for shaderc
-				F'set(MINGW_COMPILER_PREFIX {self.shortCrossPrefixStr})',
-				F'set(MINGW_SYSROOT {self.targetSubPrefix})'
-			]
-			with open(self.cmakeToolchainFile, 'w') as f:
-				f.write("\n".join(tcFile))
+		sysroot = self.targetSubPrefix
+		findRootPath = self.targetPrefix
+		if self.toolchainInfo is not None:  # our folder as --sysroot would hide the system toolchain's own headers and libraries
+			sysroot = self.toolchainInfo.sysroot
+			findRootPath = F"{self.targetPrefix};{self.toolchainInfo.targetDir}"
+		tcFile = [
+			F'set(CMAKE_SYSTEM_NAME Windows)',
+			F'set(CMAKE_SYSTEM_PROCESSOR {self.bitnessStr})',
+			F'set(CMAKE_SYSROOT {sysroot})' if sysroot else '# no CMAKE_SYSROOT, the system toolchain was configured without one',
+			#F'set(CMAKE_STAGING_PREFIX /home/devel/stage)',
+			F'set(CMAKE_RANLIB {self.shortCrossPrefixStr}ranlib)',
+			F'set(CMAKE_C_COMPILER {self.shortCrossPrefixStr}gcc)',
+			F'set(CMAKE_CXX_COMPILER {self.shortCrossPrefixStr}g++)',
+			F'set(CMAKE_RC_COMPILER {self.shortCrossPrefixStr}windres)',
+			F'set(CMAKE_ASM_COMPILER {self.mingwBinpath}/{self.shortCrossPrefixStr}as)',
+			F'set(CMAKE_FIND_ROOT_PATH {findRootPath})',
+			F'set(CMAKE_FIND_ROOT_PATH_MODE_PROGRAM NEVER)',
+			F'set(CMAKE_FIND_ROOT_PATH_MODE_LIBRARY ONLY)',
+			F'set(CMAKE_FIND_ROOT_PATH_MODE_INCLUDE ONLY)',
+			F'set(CMAKE_FIND_ROOT_PATH_MODE_PACKAGE ONLY)',
+
+			# for shaderc
+			F'set(MINGW_COMPILER_PREFIX {self.shortCrossPrefixStr})',
+			F'set(MINGW_SYSROOT {self.targetSubPrefix})'
+		]
+		self.writeToolchainFile(self.cmakeToolchainFile, "\n".join(tcFile), "CMake Toolchain file")
 
 	def createMesonEnvFile(self):
-		if not os.path.isfile(self.mesonEnvFile):
-			self.logger.info("Creating Meson Environment file at: '%s'" % (self.mesonEnvFile))
-			meFile = (
-				"[binaries]\n",
-				F"c = '{self.shortCrossPrefixStr}gcc'",
-				F"cpp = '{self.shortCrossPrefixStr}g++'",
-				F"ld = 'bfd'", # See: https://github.com/mesonbuild/meson/issues/6431#issuecomment-572544268, no clue either why we can't just define full "ld" path, but whatever.
-				# F"ld = '{self.shortCrossPrefixStr}ld'",
-				F"ar = '{self.shortCrossPrefixStr}ar'",
-				F"strip = '{self.shortCrossPrefixStr}strip'",
-				F"windres = '{self.shortCrossPrefixStr}windres'",
-				F"ranlib = '{self.shortCrossPrefixStr}ranlib'",
-				"pkgconfig = 'pkg-config'",
-				F"dlltool = '{self.shortCrossPrefixStr}dlltool'",
-				F"gendef = '{self.mingwBinpath}/gendef'",
-				"cmake = 'cmake'",
-				"#needs_exe_wrapper = false",
-				"#exe_wrapper = 'wine' # A command used to run generated executables.",
-				"",
-				"[host_machine]",
-				"system = 'windows'",
-				F"cpu_family = '{self.bitnessStr}'",
-				F"cpu = '{self.bitnessStr}'",
-				"endian = 'little'",
-				"",
-				"[target_machine]",
-				"system = 'windows'",
-				F"cpu_family = '{self.bitnessStr}'",
-				F"cpu = '{self.bitnessStr}'",
-				"endian = 'little'",
-				"",
-				"[properties]",
-				"c_link_args = ['-static', '-static-libgcc']",
-				"# sys_root = Directory that contains 'bin', 'lib', etc for the toolchain and system libraries",
-				F"sys_root = '{self.targetSubPrefix}'"
-			)
-			with open(self.mesonEnvFile, 'w') as f:
-				f.write("\n".join(meFile))
+		meFile = (
+			"[binaries]\n",
+			F"c = '{self.shortCrossPrefixStr}gcc'",
+			F"cpp = '{self.shortCrossPrefixStr}g++'",
+			F"ld = 'bfd'", # See: https://github.com/mesonbuild/meson/issues/6431#issuecomment-572544268, no clue either why we can't just define full "ld" path, but whatever.
+			# F"ld = '{self.shortCrossPrefixStr}ld'",
+			F"ar = '{self.shortCrossPrefixStr}ar'",
+			F"strip = '{self.shortCrossPrefixStr}strip'",
+			F"windres = '{self.shortCrossPrefixStr}windres'",
+			F"ranlib = '{self.shortCrossPrefixStr}ranlib'",
+			"pkgconfig = 'pkg-config'",
+			F"dlltool = '{self.shortCrossPrefixStr}dlltool'",
+			F"gendef = '{self.mingwBinpath}/gendef'",
+			"cmake = 'cmake'",
+			"#needs_exe_wrapper = false",
+			"#exe_wrapper = 'wine' # A command used to run generated executables.",
+			"",
+			"[host_machine]",
+			"system = 'windows'",
+			F"cpu_family = '{self.bitnessStr}'",
+			F"cpu = '{self.bitnessStr}'",
+			"endian = 'little'",
+			"",
+			"[target_machine]",
+			"system = 'windows'",
+			F"cpu_family = '{self.bitnessStr}'",
+			F"cpu = '{self.bitnessStr}'",
+			"endian = 'little'",
+			"",
+			"[properties]",
+			"c_link_args = ['-static', '-static-libgcc']",
+			"# sys_root = Directory that contains 'bin', 'lib', etc for the toolchain and system libraries",
+			F"sys_root = '{self.targetSubPrefix}'"
+		)
+		self.writeToolchainFile(self.mesonEnvFile, "\n".join(meFile), "Meson Environment file")
 
 	# def downloadFileOld(self, link, targetName=None):
 	# 	_MAX_REDIRECTS = 5
@@ -1436,7 +3009,11 @@ class CrossCompileScript:
 		return realFolderName
 	#:
 
-	def gitClone(self, url, virtFolderName=None, renameTo=None, desiredBranch=None, recursive=False, doNotUpdate=False, desiredPR=None, depth=-1):
+	def getGitCloneOptions(self, packageData):  # filter_git, sparse_checkout_git and jobs_git of a package, falling back to gitCloneDefaults
+		options = {k: packageData[k] if k in packageData else v for k, v in self.gitCloneDefaults.items()}
+		return {'cloneFilter': options['filter_git'], 'sparsePaths': options['sparse_checkout_git'], 'jobs': options['jobs_git']}
+
+	def gitClone(self, url, virtFolderName=None, renameTo=None, desiredBranch=None, recursive=False, doNotUpdate=False, desiredPR=None, depth=-1, cloneFilter=None, sparsePaths=None, jobs=None):
 		if virtFolderName is None:
 			virtFolderName = self.sanitizeFilename(os.path.basename(url))
 			if not virtFolderName.endswith(".git"):
@@ -1453,10 +3030,6 @@ class CrossCompileScript:
 		if desiredBranch is not None:
 			branchString = " {0}".format(desiredBranch)
 
-		properBranchString = "master"
-		if desiredBranch is not None:
-			properBranchString = desiredBranch
-
 		if os.path.isdir(realFolderName):
 			if desiredPR is not None:
 				self.logger.warning("####################")
@@ -1469,65 +3042,82 @@ class CrossCompileScript:
 			else:
 				self.cchdir(realFolderName)
 
-				self.runProcess('git remote update')
-
-				UPSTREAM = '@{u}'  # or branchName i guess
-				if desiredBranch is not None:
-					UPSTREAM = properBranchString
-				LOCAL = subprocess.check_output('git rev-parse @', shell=True).decode("utf-8")
-				REMOTE = subprocess.check_output('git rev-parse "{0}"'.format(UPSTREAM), shell=True).decode("utf-8")
-				BASE = subprocess.check_output('git merge-base @ "{0}"'.format(UPSTREAM), shell=True).decode("utf-8")
-
-				self.runProcess('git checkout -f')
-				self.runProcess('git checkout {0}'.format(properBranchString))
-
-				if LOCAL == REMOTE:
-					self.logger.debug("####################")
-					self.logger.debug("Up to date")
-					self.logger.debug("LOCAL:  " + LOCAL)
-					self.logger.debug("REMOTE: " + REMOTE)
-					self.logger.debug("BASE:   " + BASE)
-					self.logger.debug("####################")
-				elif LOCAL == BASE:
-					self.logger.debug("####################")
-					self.logger.debug("Need to pull")
-					self.logger.debug("LOCAL:  " + LOCAL)
-					self.logger.debug("REMOTE: " + REMOTE)
-					self.logger.debug("BASE:   " + BASE)
-					self.logger.debug("####################")
-					if desiredBranch is not None:
-						# bsSplit = properBranchString.split("/")
-						# if len(bsSplit) == 2:
-						# 	self.run_process('git pull origin {1}'.format(bsSplit[0],bsSplit[1]))
-						# else:
-						if 'Already up to date' in self.runProcess('git pull origin {0}'.format(properBranchString), silent=True):
-							return os.getcwd()
+				remoteRef = "HEAD" if desiredBranch is None else desiredBranch
+				localSha = self.readGitHead(".")
+				pinned = desiredBranch is not None and self.isGitCommitHash(desiredBranch)
+				if pinned:
+					remoteSha = desiredBranch  # pinned to a commit, nothing to ask the remote
+					upToDate = localSha is not None and localSha.startswith(desiredBranch)
+				else:
+					remoteSha = self.getGitRemoteHead(url, remoteRef)
+					upToDate = localSha is not None and localSha == remoteSha
+					if remoteSha is None:  # unreachable, the checkout stays as it is rather than being fetched and cleaned
+						self.logger.warning(F"Could not ask '{url}' for '{remoteRef}', not updating '{realFolderName}'")
+						upToDate = True
+
+				self.logger.debug("####################")
+				self.logger.debug("Up to date" if upToDate else "Need to fetch")
+				self.logger.debug("LOCAL:  " + str(localSha))
+				self.logger.debug("REMOTE: " + str(remoteSha))
+				self.logger.debug("####################")
+
+				if sparsePaths != self.buildState.get("git", os.getcwd(), {}).get("sparse", sparsePaths):
+					if sparsePaths:
+						self.runProcess('git sparse-checkout set --cone {0}'.format(" ".join(F'"{p}"' for p in sparsePaths)))
+					else:
+						self.runProcess('git sparse-checkout disable')
+
+				if not upToDate:
+					if os.path.isfile(os.path.join(".git", "objects", "info", "alternates")):  # fetch into the mirror first, so the checkout's own fetch finds the objects there
+						with open(os.path.join(".git", "objects", "info", "alternates"), "r") as f:
+							alternates = f.read()
+						for mirrorFilter in (cloneFilter, None):
+							if str(self.getGitMirrorPath(url, mirrorFilter)) in alternates:
+								self.updateGitMirror(url, mirrorFilter)
+								break
+
+					fetchArgs = ""
+					if depth and depth >= 1:
+						fetchArgs = F" --depth {depth}"
+					elif depth is None or depth < 0:
+						fetchArgs = " --depth 1"
+					elif os.path.isfile(os.path.join(".git", "shallow")):
+						fetchArgs = " --unshallow"
+
+					if pinned:
+						self.checkoutGitCommit(url, desiredBranch, fetchArgs)
 					else:
-						self.runProcess('git pull'.format(properBranchString))
+						self.logger.info(F"Git fetching '{remoteRef}' of '{url}'")
+						self.runProcess(F'git fetch{fetchArgs} origin "{remoteRef}"')
+						if desiredBranch is None:
+							self.runProcess('git reset --hard FETCH_HEAD')
+						else:
+							self.runProcess('git checkout -f --detach FETCH_HEAD')
 					self.runProcess('git clean -ffdx')  # https://gist.github.com/nicktoumpelis/11214362
-					self.runProcess('git submodule foreach --recursive git clean -ffdx')
-					self.runProcess('git reset --hard')
-					self.runProcess('git submodule foreach --recursive git reset --hard')
-					self.runProcess('git submodule update --init --recursive')
-				elif REMOTE == BASE:
-					self.logger.debug("####################")
-					self.logger.debug("need to push")
-					self.logger.debug("LOCAL:  " + LOCAL)
-					self.logger.debug("REMOTE: " + REMOTE)
-					self.logger.debug("BASE:   " + BASE)
-					self.logger.debug("####################")
-				else:
-					self.logger.debug("####################")
-					self.logger.debug("diverged?")
-					self.logger.debug("LOCAL:  " + LOCAL)
-					self.logger.debug("REMOTE: " + REMOTE)
-					self.logger.debug("BASE    " + BASE)
-					self.logger.debug("####################")
+					if os.path.isfile(".gitmodules"):
+						self.runProcess('git submodule foreach --recursive git clean -ffdx')
+						self.runProcess('git submodule foreach --recursive git reset --hard')
+						self.runProcess('git submodule update --init --recursive{0}'.format(F" --jobs {jobs}" if jobs else ""))
+					localSha = self.readGitHead(".")
+
+				self.buildState.set("git", os.getcwd(), {'url': url, 'ref': remoteRef, 'local': localSha, 'remote': remoteSha, 'sparse': sparsePaths, 'checked': int(time.time())})
 				self.cchdir("..")
 		else:
 			addArgs = []
-			if recursive:
+			if recursive and not sparsePaths:  # sparse clones check out (and init submodules) only after the paths are set
 				addArgs.append("--recursive")
+				if jobs:
+					addArgs.append(F"--jobs {jobs}")
+
+			if depth == 0:  # full clones borrow their objects from a shared mirror, shallow clones can't reference one.
+				if cloneFilter:
+					addArgs.append(F"--filter={cloneFilter}")
+				mirrorPath = self.updateGitMirror(url, cloneFilter)
+				if mirrorPath is not None:
+					addArgs.append(F'--reference-if-able "{mirrorPath}"')
+
+			if sparsePaths:
+				addArgs.append("--no-checkout")
 
 			if depth and depth >= 1:
 				addArgs.append(F"--depth {depth}")
@@ -1537,7 +3127,15 @@ class CrossCompileScript:
 
 			self.logger.info(F"Git {'Shallow C' if depth >= 1 else 'C'}loning '{url}' to '{os.getcwd() + '/' + realFolderName}'")
 			self.runProcess('git clone {0} --progress "{1}" "{2}"'.format(" ".join(addArgs), url, realFolderName + ".tmp"))
-			if desiredBranch is not None:
+			if sparsePaths:
+				self.cchdir(realFolderName + ".tmp")
+				self.logger.info("GIT Sparse checkout of: {0}".format(", ".join(sparsePaths)))
+				self.runProcess('git sparse-checkout set --cone {0}'.format(" ".join(F'"{p}"' for p in sparsePaths)))
+				self.runProcess('git checkout{0}'.format(branchString))
+				if recursive:
+					self.runProcess('git submodule update --init --recursive{0}'.format(F" --jobs {jobs}" if jobs else ""))
+				self.cchdir("..")
+			elif desiredBranch is not None:
 				self.cchdir(realFolderName + ".tmp")
 				self.logger.debug("GIT Checking out:{0}".format(" master" if desiredBranch is None else branchString))
 				self.runProcess('git checkout{0}'.format(" master" if desiredBranch is None else branchString))
@@ -1553,6 +3151,118 @@ class CrossCompileScript:
 		return realFolderName
 	#:
 
+	def checkoutGitCommit(self, url, sha, fetchArgs):  # checks out a pinned commit, fetching it by sha only when that can work (full sha, server allowing it), else fetching the default refs
+		if not self.hasGitCommit(sha) and len(sha) == 40:
+			self.logger.info(F"Git fetching commit '{sha}' of '{url}'")
+			self.runProcess(F'git fetch{fetchArgs} origin "{sha}"', True)  # servers without uploadpack.allowReachableSHA1InWant refuse this
+		if not self.hasGitCommit(sha):
+			self.logger.info(F"Git fetching '{url}' to find commit '{sha}'")
+			self.runProcess('git fetch{0} --tags origin'.format(" --unshallow" if os.path.isfile(os.path.join(".git", "shallow")) else ""))
+		self.runProcess(F'git checkout -f --detach "{sha}"')
+
+	def hasGitCommit(self, sha):
+		return subprocess.run(["git", "cat-file", "-e", sha + "^{commit}"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+	def isGitCommitHash(self, ref):
+		return re.fullmatch(r'[0-9a-f]{7,40}', ref) is not None
+
+	def readGitHead(self, repoPath):  # resolves HEAD by reading .git directly, falls back to rev-parse for layouts it doesn't know.
+		gitDir = Path(repoPath).joinpath(".git")
+		try:
+			head = gitDir.joinpath("HEAD").read_text().strip()
+			if not head.startswith("ref: "):
+				return head
+			ref = head[len("ref: "):]
+			if gitDir.joinpath(ref).is_file():
+				return gitDir.joinpath(ref).read_text().strip()
+			if gitDir.joinpath("packed-refs").is_file():
+				for line in gitDir.joinpath("packed-refs").read_text().splitlines():
+					parts = line.split(" ")
+					if len(parts) == 2 and parts[1] == ref:
+						return parts[0]
+		except OSError:
+			pass
+		sha = self.runProcess(F'git -C "{repoPath}" rev-parse HEAD', exitOnError=False, silent=True)
+		return sha.strip() if sha else None
+
+	def gitLsRemote(self, url, ref):  # commit sha that ref points to on the remote, or None; prefers branches, then tags, peeled to their commit.
+		env = os.environ.copy()
+		env["GIT_TERMINAL_PROMPT"] = "0"
+		patterns = [ref] if ref == "HEAD" else [ref, ref + "^{}"]  # ls-remote only lists the peeled line of an annotated tag when asked for it
+		try:
+			p = subprocess.run(["git", "ls-remote", url] + patterns, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, timeout=60)
+		except (OSError, subprocess.TimeoutExpired):
+			return None
+		if p.returncode != 0:
+			return None
+		refs = {}
+		for line in p.stdout.decode("utf-8", "replace").splitlines():
+			sha, _, name = line.partition("\t")
+			refs[name] = sha
+		for name in (ref, F"refs/heads/{ref}", F"refs/tags/{ref}", F"refs/{ref}"):
+			if name in refs:
+				return refs.get(name + "^{}", refs[name])
+		return next((sha for name, sha in refs.items() if name.endswith("^{}")), next(iter(refs.values()), None))
+
+	def getGitRemoteHead(self, url, ref):
+		if (url, ref) not in self.gitRemoteHeads:
+			self.gitRemoteHeads[(url, ref)] = self.gitLsRemote(url, ref)
+		return self.gitRemoteHeads[(url, ref)]
+
+	def prefetchGitRemoteHeads(self, packageList):  # asks every git remote of [(name, data)] for its target ref at once, instead of one by one during the build.
+		from concurrent.futures import ThreadPoolExecutor
+		queries = []
+		for packageName, packageData in packageList:
+			if packageData.get("repo_type") != "git" or packageData.get("do_not_git_update") is True or packageData.get("desired_pr_id") is not None:
+				continue
+			branch = packageData.get("branch")
+			if branch is not None and self.isGitCommitHash(branch):
+				continue
+			query = (self.getPrimaryPackageUrl(packageData, packageName), "HEAD" if branch is None else branch)
+			if query not in self.gitRemoteHeads and query not in queries:
+				queries.append(query)
+		if not queries:
+			return
+		self.logger.info("Checking %d git remotes for updates" % (len(queries)))
+		with ThreadPoolExecutor(max_workers=min(16, len(queries))) as executor:
+			for query, sha in zip(queries, executor.map(lambda q: self.gitLsRemote(*q), queries)):
+				self.gitRemoteHeads[query] = sha
+
+	def getGitMirrorPath(self, url, cloneFilter=None):
+		parsedUrl = urlparse(url)
+		mirrorName = re.sub(r'[^\w.-]+', '_', (parsedUrl.netloc + parsedUrl.path).strip("/"))
+		if mirrorName.endswith(".git"):
+			mirrorName = mirrorName[:-len(".git")]
+		if cloneFilter:  # partial mirrors lack objects a plain clone would need, so they're kept apart
+			mirrorName += "." + re.sub(r'[^\w.-]+', '_', cloneFilter)
+		return self.gitMirrorDir.joinpath(mirrorName + ".git")
+
+	def updateGitMirror(self, url, cloneFilter=None):  # returns the path of the bare mirror of url, it is fetched at most once per run.
+		mirrorPath = self.getGitMirrorPath(url, cloneFilter)
+
+		if mirrorPath in self.fetchedGitMirrors:
+			return mirrorPath if mirrorPath.is_dir() else None
+		self.fetchedGitMirrors.add(mirrorPath)
+
+		if not mirrorPath.is_dir():
+			self.logger.info(F"Creating git mirror of '{url}' in '{mirrorPath}'")
+			self.gitMirrorDir.mkdir(parents=True, exist_ok=True)
+			tmpPath = mirrorPath.with_name(mirrorPath.name + ".tmp")
+			if tmpPath.exists():
+				shutil.rmtree(tmpPath)
+			filterArg = F" --filter={cloneFilter}" if cloneFilter else ""
+			if self.runProcess(F'git clone --mirror{filterArg} --progress "{url}" "{tmpPath}"', exitOnError=False) is None:
+				self.logger.warning(F"Failed to mirror '{url}', cloning without it.")
+				return None
+			self.runProcess(F'git -C "{tmpPath}" config gc.pruneExpire never')  # checkouts borrow objects from here, they must never be pruned
+			os.rename(tmpPath, mirrorPath)
+		else:
+			self.logger.info(F"Updating git mirror of '{url}'")
+			if self.runProcess(F'git -C "{mirrorPath}" remote update --prune', exitOnError=False) is None:
+				self.logger.warning(F"Failed to update the git mirror of '{url}', continuing with the old one.")
+		return mirrorPath
+	#:
+
 	def svnClone(self, url, dir, desiredBranch=None):  # "branch".. "clone"..
 		dir = self.sanitizeFilename(dir)
 		if not dir.endswith("_svn"):
@@ -1593,12 +3303,18 @@ class CrossCompileScript:
 
 		check_file = os.path.join(folderToCheck, "unpacked.successfully")
 		if not os.path.isfile(check_file):
-			dlLocation = self.getBestMirror(packageData, packageName)
+			dlLocation, cachedArchive = self.getCachedArchive(packageData)
+			if cachedArchive is None:
+				dlLocation = self.getBestMirror(packageData, packageName)
 			url = dlLocation["url"]
 			fileName = os.path.basename(urlparse(url).path)
-			self.logger.info("Downloading {0} ({1})".format(fileName, url))
 
-			self.downloadFile(url, fileName)
+			if cachedArchive is not None:
+				self.logger.info("Copying {0} from the archive cache".format(fileName))
+				shutil.copyfile(cachedArchive, fileName)
+			else:
+				self.logger.info("Downloading {0} ({1})".format(fileName, url))
+				self.downloadFile(url, fileName)
 
 			if "hashes" in dlLocation:
 				if len(dlLocation["hashes"]) >= 1:
@@ -1614,16 +3330,17 @@ class CrossCompileScript:
 
 			self.logger.info("Unpacking {0}".format(fileName))
 
-			tars = (".gz", ".bz2", ".xz", ".bz", ".tgz")  # i really need a better system for this.. but in reality, those are probably the only formats we will ever encounter.
-
-			customFolderTarArg = ""
+			tars = (".gz", ".bz2", ".xz", ".bz", ".tgz", ".zst")  # i really need a better system for this.. but in reality, those are probably the only formats we will ever encounter.
 
 			if customFolder:
-				customFolderTarArg = ' -C "' + folderName + '" --strip-components 1'
 				os.makedirs(folderName)
 
 			if fileName.endswith(tars):
-				self.runProcess('tar -xf "{0}"{1}'.format(fileName, customFolderTarArg))
+				from mingw_toolchain_script.archive_extract import ExtractError, extractTar
+				try:
+					extractTar(fileName, folderName if customFolder else ".", 1 if customFolder else 0)
+				except ExtractError as e:
+					self.errorExit(e.message)
 			else:
 				self.runProcess('unzip "{0}"'.format(fileName))
 
@@ -1638,7 +3355,16 @@ class CrossCompileScript:
 			return folderName
 	#:
 
+	def getCachedArchive(self, packageData):  # (download location, path) of an archive that is in the archive cache, or (None, None)
+		for dlLocation in packageData.get("download_locations") or []:
+			for hash in dlLocation.get("hashes") or []:
+				if hash["type"] == "sha256" and self.archiveCacheDir.joinpath(hash["sum"]).is_file():
+					return dlLocation, self.archiveCacheDir.joinpath(hash["sum"])
+		return None, None
+
 	def checkMirrors(self, dlLocations):
+		import requests
+
 		for loc in dlLocations:
 			userAgent = self.userAgent
 			if 'sourceforge.net' in loc["url"].lower():
@@ -1708,7 +3434,7 @@ class CrossCompileScript:
 			if 'do_not_git_update' in packageData:
 				if packageData['do_not_git_update'] is True:
 					doNotUpdate = True
-			workDir = self.gitClone(self.getPrimaryPackageUrl(packageData, packageName), folderName, renameFolder, branch, recursive, doNotUpdate, None, git_depth)
+			workDir = self.gitClone(self.getPrimaryPackageUrl(packageData, packageName), folderName, renameFolder, branch, recursive, doNotUpdate, None, git_depth, **self.getGitCloneOptions(packageData))
 		if packageData["repo_type"] == "svn":
 			workDir = self.svnClone(self.getPrimaryPackageUrl(packageData, packageName), packageData["folder_name"], renameFolder)
 		if packageData['repo_type'] == 'mercurial':
@@ -1757,6 +3483,8 @@ class CrossCompileScript:
 					self.packages["deps"][packageName]["_already_built"] = True
 				return
 
+		recipe = self.getRecipe(packageName, packageData, type)
+
 		if self.debugMode:
 			print("### Environment variables:  ###")
 			for tk in os.environ:
@@ -1766,292 +3494,10 @@ class CrossCompileScript:
 		self.logger.info("Building {0} '{1}'".format(type.lower(), packageName))
 		self.resetDefaultEnvVars()
 
-		if 'warnings' in packageData:
-			if len(packageData['warnings']) > 0:
-				for w in packageData['warnings']:
-					self.logger.warning(w)
-
-		workDir = None
-		renameFolder = None
-		if 'rename_folder' in packageData:
-			if packageData['rename_folder'] is not None:
-				renameFolder = packageData['rename_folder']
+		for w in recipe.warnings:
+			self.logger.warning(w)
 
-		if type == "PRODUCT":
-			self.cchdir(self.fullProductDir)  # descend into x86_64_products
-		else:
-			self.cchdir(self.bitnessPath)  # descend into x86_64
-
-		if packageData["repo_type"] == "git":
-			branch = self.getValueOrNone(packageData, 'branch')
-			recursive = self.getValueOrNone(packageData, 'recursive_git')
-			git_depth = packageData.get('depth_git', -1)
-			folderName = self.getValueOrNone(packageData, 'folder_name')
-			doNotUpdate = False
-			if 'do_not_git_update' in packageData:
-				if packageData['do_not_git_update'] is True:
-					doNotUpdate is True
-			desiredPRVal = None
-			if 'desired_pr_id' in packageData:
-				if packageData['desired_pr_id'] is not None:
-					desiredPRVal = packageData['desired_pr_id']
-			workDir = self.gitClone(self.getPrimaryPackageUrl(packageData, packageName), folderName, renameFolder, branch, recursive, doNotUpdate, desiredPRVal, git_depth)
-		elif packageData["repo_type"] == "svn":
-			workDir = self.svnClone(self.getPrimaryPackageUrl(packageData, packageName), packageData["folder_name"], renameFolder)
-		elif packageData['repo_type'] == 'mercurial':
-			branch = self.getValueOrNone(packageData, 'branch')
-			workDir = self.mercurialClone(self.getPrimaryPackageUrl(packageData, packageName), self.getValueOrNone(packageData, 'folder_name'), renameFolder, branch, forceRebuild)
-		elif packageData["repo_type"] == "archive":
-			if "folder_name" in packageData:
-				workDir = self.downloadUnpackFile(packageData, packageName, packageData["folder_name"], workDir)
-			else:
-				workDir = self.downloadUnpackFile(packageData, packageName, None, workDir)
-		elif packageData["repo_type"] == "none":
-			if "folder_name" in packageData:
-				workDir = packageData["folder_name"]
-				os.makedirs(workDir, exist_ok=True)
-			else:
-				print("Error: When using repo_type 'none' you have to set folder_name as well.")
-				exit(1)
-
-		if workDir is None:
-			print("Unexpected error when building {0}, please report this:".format(packageName), sys.exc_info()[0])
-			raise
-
-		if 'rename_folder' in packageData:  # this should be moved inside the download functions, TODO.. but lazy
-			if packageData['rename_folder'] is not None:
-				if not os.path.isdir(packageData['rename_folder']):
-					shutil.move(workDir, packageData['rename_folder'])
-				workDir = packageData['rename_folder']
-
-		if 'download_header' in packageData:
-			if packageData['download_header'] is not None:
-				for h in packageData['download_header']:
-					self.downloadHeader(h)
-
-		self.cchdir(workDir)  # descend into x86_64/[DEPENDENCY_OR_PRODUCT_FOLDER]
-		if 'debug_downloadonly' in packageData:
-			self.cchdir("..")
-			exit()
-
-		oldPath = self.getKeyOrBlankString(os.environ, "PATH")
-		currentFullDir = os.getcwd()
-
-		if not self.anyFileStartsWith('already_configured'):
-			if 'run_pre_patch' in packageData:
-				if packageData['run_pre_patch'] is not None:
-					for cmd in packageData['run_pre_patch']:
-						cmd = self.replaceVariables(cmd)
-						self.logger.debug("Running pre-patch-command: '{0}'".format(cmd))
-						self.runProcess(cmd)
-
-		if forceRebuild:
-			if os.path.isdir(".git"):
-				self.runProcess('git clean -ffdx')  # https://gist.github.com/nicktoumpelis/11214362
-				self.runProcess('git submodule foreach --recursive git clean -ffdx')
-				self.runProcess('git reset --hard')
-				self.runProcess('git submodule foreach --recursive git reset --hard')
-				self.runProcess('git submodule update --init --recursive')
-
-		if 'source_subfolder' in packageData:
-			if packageData['source_subfolder'] is not None:
-				if not os.path.isdir(packageData['source_subfolder']):
-					os.makedirs(packageData['source_subfolder'], exist_ok=True)
-				self.cchdir(packageData['source_subfolder'])
-
-		if forceRebuild:
-			self.removeAlreadyFiles()
-			self.removeConfigPatchDoneFiles()
-
-		if 'debug_confighelp_and_exit' in packageData:
-			if packageData['debug_confighelp_and_exit'] is True:
-				self.bootstrapConfigure()
-				self.runProcess("./configure --help")
-				exit()
-
-		if 'cflag_addition' in packageData:
-			if packageData['cflag_addition'] is not None:
-				os.environ["CFLAGS"] = os.environ["CFLAGS"] + " " + packageData['cflag_addition']
-				os.environ["CXXFLAGS"] = os.environ["CXXFLAGS"] + " " + packageData['cflag_addition']
-				self.logger.info(F'Added to C(XX)FLAGS, they\'re are now: "{os.environ["CXXFLAGS"]}", "{os.environ["CFLAGS"]}"')
-
-		if 'custom_cflag' in packageData:
-			if packageData['custom_cflag'] is not None:
-				os.environ["CFLAGS"] = packageData['custom_cflag']
-				os.environ["CXXFLAGS"] = packageData['custom_cflag']
-				self.logger.info(F'Set custom C(XX)FLAGS, they\'re are now: "{os.environ["CXXFLAGS"]}", "{os.environ["CFLAGS"]}"')
-
-		if 'strip_cflags' in packageData:
-			if isinstance(packageData["strip_cflags"], (list, tuple)) and len(packageData["strip_cflags"]):
-				for _pattern in packageData["strip_cflags"]:
-					os.environ["CFLAGS"] = self.reStrip(_pattern, os.environ["CFLAGS"])
-					os.environ["CXXFLAGS"] = self.reStrip(_pattern, os.environ["CXXFLAGS"])
-					self.logger.info(F'Stripped C(XX)FLAGS, they\'re are now: "{os.environ["CXXFLAGS"]}", "{os.environ["CFLAGS"]}"')
-
-		if 'custom_path' in packageData:
-			if packageData['custom_path'] is not None:
-				self.logger.debug("Setting PATH to '{0}'".format(self.replaceVariables(packageData['custom_path'])))
-				os.environ["PATH"] = self.replaceVariables(packageData['custom_path'])
-
-		if 'flipped_path' in packageData:
-			if packageData['flipped_path'] is True:
-				bef = os.environ["PATH"]
-				os.environ["PATH"] = "{0}:{1}:{2}".format(self.mingwBinpath, os.path.join(self.targetPrefix, 'bin'), self.originalPATH)  # todo properly test this..
-				self.logger.debug("Flipping path to: '{0}' from '{1}'".format(bef, os.environ["PATH"]))
-
-		if 'env_exports' in packageData:
-			if packageData['env_exports'] is not None:
-				for key, val in packageData['env_exports'].items():
-					val = self.replaceVariables(val)
-					prevEnv = ''
-					if key in os.environ:
-						prevEnv = os.environ[key]
-					self.logger.debug("Environment variable '{0}' has been set from {1} to '{2}'".format(key, prevEnv, val))
-					os.environ[key] = val
-
-		if 'copy_over' in packageData and packageData['copy_over'] is not None:
-			for f in packageData['copy_over']:
-				f_formatted = self.replaceVariables(f)
-				f_formatted = Path(f_formatted)
-				if not f_formatted.is_file():
-					self.errorExit("Copy-over file '%s' (Unformatted: '%s') does not exist." % (f_formatted, f))
-				dst = os.path.join(currentFullDir, f_formatted.name)
-				self.logger.info("Copying file over from '%s' to '%s'" % (f_formatted, dst))
-				shutil.copyfile(f_formatted, dst)
-
-		if 'patches' in packageData:
-			if packageData['patches'] is not None:
-				for p in packageData['patches']:
-					self.applyPatch(p[0], p[1], False, self.getValueByIntOrNone(p, 2))
-
-		if not self.anyFileStartsWith('already_ran_make'):
-
-
-			if 'run_post_patch' in packageData and packageData['run_post_patch']:
-					for cmd in packageData['run_post_patch']:
-						ignoreFail = False
-						if isinstance(cmd, tuple):
-							cmd = cmd[0]
-							ignoreFail = cmd[1]
-						if cmd.startswith("!SWITCHDIRBACK"):
-							self.cchdir(currentFullDir)
-						elif cmd.startswith("!SWITCHDIR"):
-							_dir = self.replaceVariables("|".join(cmd.split("|")[1:]))
-							self.cchdir(_dir)
-						else:
-							cmd = self.replaceVariables(cmd)
-							self.logger.info("Running post-patch-command: '{0}'".format(cmd))
-							# self.run_process(cmd)
-							self.runProcess(cmd, ignoreFail)
-
-			if 'regex_replace' in packageData and packageData['regex_replace']:
-				_pos = 'post_patch'
-				if isinstance(packageData['regex_replace'], dict) and _pos in packageData['regex_replace']:
-					for r in packageData['regex_replace'][_pos]:
-						try:
-							self.handleRegexReplace(r, packageName)
-						except re.error as e:
-							self.errorExit(e)
-
-
-			if 'run_post_regexreplace' in packageData and packageData['run_post_regexreplace']:
-					for cmd in packageData['run_post_regexreplace']:
-						ignoreFail = False
-						if isinstance(cmd, tuple):
-							cmd = cmd[0]
-							ignoreFail = cmd[1]
-						if cmd.startswith("!SWITCHDIRBACK"):
-							self.cchdir(currentFullDir)
-						elif cmd.startswith("!SWITCHDIR"):
-							_dir = self.replaceVariables("|".join(cmd.split("|")[1:]))
-							self.cchdir(_dir)
-						else:
-							cmd = self.replaceVariables(cmd)
-							self.logger.info("Running post-patch-command: '{0}'".format(cmd))
-							# self.run_process(cmd)
-							self.runProcess(cmd, ignoreFail)
-
-		conf_system = None
-		build_system = None
-
-		# conf_system_specifics = {
-		# 	"gnumake_based_systems" : [ "cmake", "autoconf" ],
-		# 	"ninja_based_systems" : [ "meson" ]
-		# }
-
-		if 'build_system' in packageData:  # Kinda redundant, but ill keep it for now, maybe add an alias system for this.
-			if packageData['build_system'] == "ninja":
-				build_system = "ninja"
-			if packageData['build_system'] == "waf":
-				build_system = "waf"
-			if packageData['build_system'] == "rake":
-				build_system = "rake"
-		if 'conf_system' in packageData:
-			if packageData['conf_system'] == "cmake":
-				conf_system = "cmake"
-				if not build_system:
-					build_system = "ninja"
-			elif packageData['conf_system'] == "meson":
-				conf_system = "meson"
-			elif packageData['conf_system'] == "waf":
-				conf_system = "waf"
-
-		conf_system = "autoconf" if not conf_system else conf_system
-		build_system = "make" if not build_system else build_system
-
-		needs_conf = True
-
-		if 'needs_configure' in packageData:
-			if packageData['needs_configure'] is False:
-				needs_conf = False
-
-		if needs_conf:
-			if conf_system == "cmake":
-				self.cmakeSource(packageName, packageData)
-			elif conf_system == "meson":
-				self.mesonSource(packageName, packageData)
-			else:
-				self.configureSource(packageName, packageData, conf_system)
-
-		if 'make_subdir' in packageData:
-			if packageData['make_subdir'] is not None:
-				if not os.path.isdir(packageData['make_subdir']):
-					os.makedirs(packageData['make_subdir'], exist_ok=True)
-				self.cchdir(packageData['make_subdir'])
-
-		if 'needs_make' in packageData:
-			if packageData['needs_make'] is True:
-				self.buildSource(packageName, packageData, build_system)
-		else:
-			self.buildSource(packageName, packageData, build_system)
-
-		if 'needs_make_install' in packageData:
-			if packageData['needs_make_install'] is True:
-				self.installSource(packageName, packageData, build_system)
-		else:
-			self.installSource(packageName, packageData, build_system)
-
-		if 'env_exports' in packageData:
-			if packageData['env_exports'] is not None:
-				for key, val in packageData['env_exports'].items():
-					self.logger.debug("Environment variable '{0}' has been UNSET!".format(key, val))
-					del os.environ[key]
-
-		if 'flipped_path' in packageData:
-			if packageData['flipped_path'] is True:
-				_path = os.environ["PATH"]
-				os.environ["PATH"] = "{0}:{1}".format(self.mingwBinpath, self.originalPATH)
-				self.logger.debug("Resetting flipped path to: '{0}' from '{1}'".format(_path, os.environ["PATH"]))
-
-		if 'source_subfolder' in packageData:
-			if packageData['source_subfolder'] is not None:
-				if not os.path.isdir(packageData['source_subfolder']):
-					os.makedirs(packageData['source_subfolder'], exist_ok=True)
-				self.cchdir(currentFullDir)
-
-		if 'make_subdir' in packageData:
-			if packageData['make_subdir'] is not None:
-				self.cchdir(currentFullDir)
+		timings = self.runRecipe(recipe, forceRebuild)
 
 		self.cchdir("..")  # asecond into x86_64
 		if type == "PRODUCT":
@@ -2059,76 +3505,256 @@ class CrossCompileScript:
 		else:
 			self.packages["deps"][packageName]["_already_built"] = True
 
+		self.buildTimings[packageName] = timings
 		self.logger.info("Building {0} '{1}': Done!".format(type.lower(), packageName))
-		if 'debug_exitafter' in packageData:
+		self.logger.debug("Time spent on '{0}': {1}".format(packageName, ", ".join("{0} {1:.1f}s".format(phase, t) for phase, t in timings.items())))
+		if recipe.exitAfter:
 			exit()
 
-		if 'custom_path' in packageData:
-			if packageData['custom_path'] is not None:
-				self.logger.debug("Re-setting PATH to '{0}'".format(oldPath))
-				os.environ["PATH"] = oldPath
-
 		self.resetDefaultEnvVars()
 		self.cchdir("..")  # asecond into workdir
 	#:
 
-	def handleRegexReplace(self, rp, packageName):
-		cwd = Path(os.getcwd())
-		if "in_file" not in rp:
-			self.errorExit(F'The regex_replace command in the package {packageName}:\n{rp}\nMisses the in_file parameter.')
-		if 0 not in rp:
-			self.errorExit(F'A regex_replace command in the package {packageName}\nrequires at least the "0" key to be a RegExpression, if 1 is not defined matching lines will be removed.')
-
-		in_files = rp["in_file"]
-		if isinstance(in_files, (list, tuple)):
-			in_files = (cwd.joinpath(self.replaceVariables(x)) for x in in_files)
-		else:
-			in_files = (cwd.joinpath(self.replaceVariables(in_files)), )
-
-		repls = [self.replaceVariables(rp[0]), ]
-		if 1 in rp:
-			repls.append(self.replaceVariables(rp[1]))
-
-		self.logger.info(F"Running regex replace commands on package: '{packageName}' [{os.getcwd()}]")
-
-		for _current_infile in in_files:
-			if "out_file" not in rp:
-				out_files = (_current_infile, )
-				shutil.copy(_current_infile, _current_infile.parent.joinpath(_current_infile.name + ".backup"))
+	def getRecipe(self, packageName, packageData, type):  # the compiled recipe of a package, compiled on first use
+		key = (type, packageName)
+		if key not in self.recipes:
+			self.recipes[key] = self.compileRecipe(packageName, packageData, type)
+		return self.recipes[key]
+
+	def runRecipe(self, recipe, forceRebuild=False):  # runs the steps from the work dir, ends in the package's parent folder; returns {phase: seconds}
+		state = RecipeState(forceRebuild)
+		timings = {}
+		for step in recipe.steps:
+			start = time.monotonic()
+			step.run(self, state)
+			timings[step.phase] = timings.get(step.phase, 0.0) + time.monotonic() - start
+		return timings
+
+	def getCpuCountStr(self, packageData):  # the -j of make/ninja, a cpu_count that isn't a positive int disables it
+		if 'cpu_count' in packageData:
+			if isinstance(packageData['cpu_count'], int) and packageData['cpu_count'] > 0:
+				return '-j {0}'.format(packageData['cpu_count'])
+			return ""
+		return '-j {0}'.format(self.cpuCount)
+
+	def getRegexSteps(self, phase, packageName, packageData, position):  # the regex_replace rules of one position as a step, none if there are no rules
+		rules = packageData.get('regex_replace')
+		if isinstance(rules, dict) and rules.get(position):
+			return [RegexStep(phase=phase, packageName=packageName, rules=rules[position])]
+		return []
+
+	def compileRecipe(self, packageName, packageData, type):  # turns a package into a Recipe, so building it doesn't look at packageData again; variables are still replaced when a step runs
+		repoType = packageData["repo_type"]
+		folderName = self.getValueOrNone(packageData, 'folder_name')
+		if repoType == "none" and folderName is None:
+			self.errorExit("When using repo_type 'none' you have to set folder_name as well.")
+		steps = [FetchStep(
+			phase="fetch",
+			packageName=packageName,
+			product=type == "PRODUCT",
+			repoType=repoType,
+			url=self.getPrimaryPackageUrl(packageData, packageName) if repoType in ("git", "svn", "mercurial") else None,
+			folderName=packageData["folder_name"] if repoType == "svn" else folderName,
+			renameFolder=self.getValueOrNone(packageData, 'rename_folder'),
+			branch=self.getValueOrNone(packageData, 'branch'),
+			recursive=self.getValueOrNone(packageData, 'recursive_git'),
+			doNotUpdate=packageData.get('do_not_git_update') is True,
+			desiredPR=self.getValueOrNone(packageData, 'desired_pr_id'),
+			depth=packageData.get('depth_git', -1),
+			gitOptions=tuple(self.getGitCloneOptions(packageData).items()) if repoType == "git" else (),
+			packageData=packageData,
+			headers=tuple(packageData.get('download_header') or ()),
+			downloadOnly='debug_downloadonly' in packageData,
+		)]
+
+		steps.append(UnlessMarkerStep(phase="prepare", prefix='already_configured', steps=tuple(compileCommands("prepare", packageData.get('run_pre_patch'), "pre-patch", True))))
+		steps.append(ForceRebuildStep(phase="prepare", cleanGit=True))
+		subfolder = self.getValueOrNone(packageData, 'source_subfolder')
+		if subfolder is not None:
+			steps.append(EnterDirStep(phase="prepare", path=subfolder))
+		steps.append(ForceRebuildStep(phase="prepare", cleanGit=False))
+		if packageData.get('debug_confighelp_and_exit') is True:
+			steps.append(ConfigHelpStep(phase="prepare"))
+
+		stripCflags = packageData.get('strip_cflags')
+		steps.append(FlagsStep(
+			phase="prepare",
+			addition=self.getValueOrNone(packageData, 'cflag_addition'),
+			custom=self.getValueOrNone(packageData, 'custom_cflag'),
+			strip=tuple(stripCflags) if isinstance(stripCflags, (list, tuple)) else (),
+		))
+		exports = tuple((packageData.get('env_exports') or {}).items())
+		flipped = packageData.get('flipped_path') is True
+		customPath = self.getValueOrNone(packageData, 'custom_path')
+		steps.append(EnvPushStep(phase="prepare", customPath=customPath, flipped=flipped, exports=exports))
+		if packageData.get('copy_over') is not None:
+			steps.append(CopyOverStep(phase="prepare", files=tuple(packageData['copy_over'])))
+
+		for p in packageData.get('patches') or ():
+			steps.append(PatchStep(phase="patch", url=p[0], level=p[1], postConf=False, folder=self.getValueByIntOrNone(p, 2)))
+		postPatch = compileCommands("patch", packageData.get('run_post_patch'), "post-patch")
+		postPatch += self.getRegexSteps("patch", packageName, packageData, 'post_patch')
+		postPatch += compileCommands("patch", packageData.get('run_post_regexreplace'), "post-regexreplace")
+		if postPatch:
+			steps.append(UnlessMarkerStep(phase="patch", prefix='already_ran_make', steps=tuple(postPatch)))
+
+		confSystem = packageData.get('conf_system')
+		confSystem = confSystem if confSystem in ("cmake", "meson", "waf") else "autoconf"
+		buildSystem = packageData.get('build_system')
+		if buildSystem not in ("ninja", "waf", "rake"):
+			buildSystem = "ninja" if confSystem == "cmake" else "make"
+		cpuCountStr = self.getCpuCountStr(packageData)
+		postConfigure = tuple(self.getRegexSteps("configure", packageName, packageData, 'post_configure'))
+
+		if packageData.get('needs_configure') is not False:
+			configureOptions = packageData.get('configure_options')
+			if confSystem in ("cmake", "meson"):
+				touchName = "already_ran_{0}_{1}".format(confSystem, self.md5(packageName, self.getKeyOrBlankString(packageData, "configure_options")))
+				if confSystem == "meson":  # its marker never included the options, kept that way so existing work dirs don't reconfigure
+					touchName = "already_ran_meson_{0}".format(self.md5(packageName, ""))
+				steps.append(GeneratorStep(phase="configure", packageName=packageName, system=confSystem, touchName=touchName, options=configureOptions, steps=postConfigure))
 			else:
-				if isinstance(rp["out_file"], (list, tuple)):
-					out_files = (cwd.joinpath(self.replaceVariables(x)) for x in rp["out_file"])
-				else:
-					out_files = (cwd.joinpath(self.replaceVariables(rp["out_file"])),)
+				confCmd = self.getValueOrNone(packageData, 'configure_path') or './configure'
+				if confSystem == "waf":
+					confCmd = './waf --color=yes configure'
+				cleanCmd = None
+				if packageData.get('clean_post_configure') is not False:
+					cleanCmd = './waf --color=yes clean' if confSystem == "waf" else 'make clean'
+				steps.append(ConfigureStep(
+					phase="configure",
+					packageName=packageName,
+					system=confSystem,
+					touchName="already_configured_%s" % (self.md5(packageName, self.getKeyOrBlankString(packageData, "configure_options"))),
+					options=configureOptions,
+					bootstrap=packageData.get('do_not_bootstrap') is not True,
+					command=confCmd,
+					cleanCommand=cleanCmd,
+					cpuCountStr=cpuCountStr,
+					steps=postConfigure + tuple(compileCommands("configure", packageData.get('run_post_configure'), "post-configure")),
+					patches=tuple(PatchStep(phase="configure", url=p[0], level=p[1], postConf=True, folder=None) for p in packageData.get('patches_post_configure') or ()),
+				))
+
+		makeSubdir = self.getValueOrNone(packageData, 'make_subdir')
+		if makeSubdir is not None:
+			steps.append(EnterDirStep(phase="build", path=makeSubdir))
+
+		mkCmd = {"waf": "./waf --color=yes", "rake": "rake", "ninja": "ninja"}.get(buildSystem, "make")
+		if packageData.get('needs_make', True) is True:
+			steps.append(BuildStep(
+				phase="build",
+				packageName=packageName,
+				system=buildSystem,
+				touchName="already_ran_make_%s" % (self.md5(packageName, self.getKeyOrBlankString(packageData, "build_options"))),
+				command='./waf --color=yes build' if buildSystem == "waf" else mkCmd,
+				cleanFirst=buildSystem == "make",
+				cpuCountStr=cpuCountStr,
+				options=packageData.get('build_options'),
+				onFail=tuple(compileCommands("build", packageData.get('ignore_build_fail_and_run'), "post-failed-make")),
+				steps=tuple(self.getRegexSteps("build", packageName, packageData, 'post_build') + compileCommands("build", packageData.get('run_post_build'), "post-build")),
+			))
+		if packageData.get('needs_make_install', True) is True:
+			steps.append(InstallStep(
+				phase="install",
+				packageName=packageName,
+				system=buildSystem,
+				touchName="already_ran_install_%s" % (self.md5(packageName, self.getKeyOrBlankString(packageData, "install_options"))),
+				command="./waf" if buildSystem == "waf" else mkCmd,
+				target=self.getValueOrNone(packageData, 'install_target') or "install",
+				options=self.getValueOrNone(packageData, 'install_options'),
+				cpuCountStr=cpuCountStr,
+				steps=tuple(self.getRegexSteps("install", packageName, packageData, 'post_install') + compileCommands("install", packageData.get('run_post_install'), "post-install")),
+			))
+
+		steps.append(EnvPopStep(phase="finish", exports=tuple(key for key, val in exports), flipped=flipped, restorePath=customPath is not None))
+		if subfolder is not None or makeSubdir is not None:
+			steps.append(EnterDirStep(phase="finish", path=None))
+
+		return Recipe(
+			packageName=packageName,
+			type=type,
+			warnings=tuple(packageData.get('warnings') or ()),
+			steps=tuple(steps),
+			exitAfter='debug_exitafter' in packageData,
+		)
+	#:
 
-			for _current_outfile in out_files:
+	def handleRegexReplaces(self, rules, packageName):  # applies all regex_replace rules of one phase, one streaming pass per file.
+		cwd = Path(os.getcwd())
 
-				if not _current_infile.exists():
-					self.logger.warning(F"[Regex-Command] In-File '{_current_infile}' does not exist in '{os.getcwd()}'")
+		def toPaths(value):
+			if isinstance(value, (list, tuple)):
+				return [cwd.joinpath(self.replaceVariables(x)) for x in value]
+			return [cwd.joinpath(self.replaceVariables(value))]
+
+		passes = []  # [in_file, out_file, [(compiled pattern, replacement or None), ...]]
+		lastPassOfFile = {}
+		for rp in rules:
+			if "in_file" not in rp:
+				self.errorExit(F'The regex_replace command in the package {packageName}:\n{rp}\nMisses the in_file parameter.')
+			if 0 not in rp:
+				self.errorExit(F'A regex_replace command in the package {packageName}\nrequires at least the "0" key to be a RegExpression, if 1 is not defined matching lines will be removed.')
+			try:
+				rule = (re.compile(self.replaceVariables(rp[0])), self.replaceVariables(rp[1]) if 1 in rp else None)
+			except re.error as e:
+				self.errorExit(F'Invalid regex_replace expression in the package {packageName}: {e}')
+
+			for inFile in toPaths(rp["in_file"]):
+				outFiles = toPaths(rp["out_file"]) if "out_file" in rp else [inFile]
+				for outFile in outFiles:
+					last = lastPassOfFile.get(inFile)
+					if inFile == outFile and last is not None and last[0] == inFile and last[1] == inFile:
+						last[2].append(rule)  # another in-place rule on the same file, chain it into the existing pass
+						continue
+					newPass = [inFile, outFile, [rule]]
+					passes.append(newPass)
+					lastPassOfFile[inFile] = newPass
+					lastPassOfFile[outFile] = newPass
 
-				if _current_outfile == _current_infile:
-					_backup = _current_infile.parent.joinpath(_current_infile.name + ".backup")
-					if not _backup.parent.exists():
-						self.logger.warning(F"[Regex-Command] Out-File parent '{_backup.parent}' does not exist.")
-					shutil.copy(_current_infile, _backup)
-					_tmp_file = _current_infile.parent.joinpath(_current_infile.name + ".tmp")
-					shutil.move(_current_infile, _tmp_file)
-					_current_infile = _tmp_file
-				self.logger.info(F"[{packageName}] Running regex command on '{_current_outfile}'")
+		self.logger.info(F"Running regex replace commands on package: '{packageName}' [{os.getcwd()}]")
 
-				with open(_current_infile, "r") as f, open(_current_outfile, "w") as nf:
+		for inFile, outFile, fileRules in passes:
+			if not inFile.exists():
+				self.logger.warning(F"[Regex-Command] In-File '{inFile}' does not exist in '{os.getcwd()}'")
+				continue
+			if not outFile.parent.exists():
+				self.logger.warning(F"[Regex-Command] Out-File parent '{outFile.parent}' does not exist.")
+				continue
+			self.logger.info(F"[{packageName}] Running {len(fileRules)} regex command(s) on '{outFile}'")
+
+			replaced = [0] * len(fileRules)
+			removed = [0] * len(fileRules)
+			tmpFd, tmpName = tempfile.mkstemp(prefix=outFile.name + ".", suffix=".tmp", dir=str(outFile.parent))
+			try:
+				with open(inFile, "r", encoding="utf-8", errors="surrogateescape") as f, os.fdopen(tmpFd, "w", encoding="utf-8", errors="surrogateescape") as nf:
 					for line in f:
-						if re.search(repls[0], line) and len(repls) > 1:
-							self.logger.debug(F"RegEx replacing line")
-							self.logger.debug(F"in {_current_outfile}\n{line}\nwith:")
-							line = re.sub(repls[0], repls[1], line)
-							self.logger.debug(F"\n{line}")
-							nf.write(line)
-						elif re.search(repls[0], line):
-							self.logger.debug(F"RegEx removing line\n{line}:")
-						else:
+						for i, (pattern, replacement) in enumerate(fileRules):
+							if replacement is None:
+								if pattern.search(line):
+									removed[i] += 1
+									line = None
+									break
+							else:
+								line, n = pattern.subn(replacement, line)
+								replaced[i] += n
+						if line is not None:
 							nf.write(line)
 
+				for i, (pattern, replacement) in enumerate(fileRules):
+					self.logger.debug(F"[Regex-Command] '{pattern.pattern}': {replaced[i]} replacement(s), {removed[i]} line(s) removed")
+
+				if inFile == outFile:
+					if not any(replaced) and not any(removed):
+						self.logger.debug(F"[Regex-Command] Nothing matched in '{outFile}', leaving it untouched")
+						os.remove(tmpName)
+						continue
+					shutil.copy2(inFile, inFile.parent.joinpath(inFile.name + ".backup"))
+				shutil.copymode(outFile if outFile.exists() else inFile, tmpName)
+				os.replace(tmpName, outFile)
+			except BaseException:
+				if os.path.exists(tmpName):
+					os.remove(tmpName)
+				raise
+
 	def bootstrapConfigure(self):
 		if not os.path.isfile("configure"):
 			if os.path.isfile("bootstrap.sh"):
@@ -2144,82 +3770,114 @@ class CrossCompileScript:
 			elif os.path.isfile("configure.ac"):
 				self.runProcess('autoreconf -fiv')
 
-	def configureSource(self, packageName, packageData, conf_system):
-		touchName = "already_configured_%s" % (self.md5(packageName, self.getKeyOrBlankString(packageData, "configure_options")))
-
-		if not os.path.isfile(touchName):
+	def getPatchDownloadUrl(self, url):  # remote url of a patch entry, or None if it's a local file in the patches folder
+		if urlparse(url).scheme != '':
+			return url
+		if os.path.isfile(os.path.join(self.fullPatchDir, url)):
+			return None
+		return "https://raw.githubusercontent.com/DeadSix27/python_cross_compile_script/master/patches/" + url.lstrip("/")
+
+	def fetchPatches(self, packageList):  # resolves every patch of [(name, type, data)] to a local file, downloading missing ones at once, so broken urls fail before anything is built.
+		downloads = {}
+		for packageName, type, packageData in packageList:
+			for p in (packageData.get('patches') or []) + (packageData.get('patches_post_configure') or []):
+				url = p[0]
+				downloadUrl = self.getPatchDownloadUrl(url)
+				if downloadUrl is None:
+					self.resolvedPatches[url] = Path(self.fullPatchDir, url)
+				elif self.patchCache.lookup(downloadUrl) is not None:
+					self.resolvedPatches[url] = self.patchCache.lookup(downloadUrl)
+				else:
+					if downloadUrl != url:
+						self.logger.warning("Patch '{0}' of '{1}' is not in '{2}', using '{3}' instead.".format(url, packageName, self.fullPatchDir, downloadUrl))
+					downloads[url] = downloadUrl
+		if not downloads:
+			return
 
-			cpuCountStr = '-j {0}'.format(self.cpuCount)
+		from concurrent.futures import ThreadPoolExecutor
+		import requests
 
-			if 'cpu_count' in packageData:
-				if isinstance(packageData['cpu_count'], int) and packageData['cpu_count'] > 0:
-					cpuCountStr = '-j {0}'.format(packageData['cpu_count'])
+		def fetch(downloadUrl):
+			try:
+				req = requests.get(downloadUrl, allow_redirects=True, timeout=60, headers={"User-Agent": self.userAgent})
+			except requests.exceptions.RequestException as e:
+				return (None, str(e))
+			if req.status_code != 200:
+				return (None, "HTTP " + str(req.status_code))
+			return (req.content, None)
+
+		self.logger.info("Downloading %d patches" % (len(downloads)))
+		failed = []
+		with ThreadPoolExecutor(max_workers=min(8, len(downloads))) as executor:
+			for url, (data, error) in zip(downloads, executor.map(fetch, downloads.values())):
+				if data is None:
+					failed.append("'{0}' ({1}): {2}".format(url, downloads[url], error))
 				else:
-					cpuCountStr = ""
+					self.resolvedPatches[url] = self.patchCache.store(downloads[url], data)
+		if failed:
+			self.errorExit("Failed to download patches:\n\t" + "\n\t".join(failed))
 
-			self.removeAlreadyFiles()
-			self.removeConfigPatchDoneFiles()
-
-			doBootStrap = True
-			if 'do_not_bootstrap' in packageData:
-				if packageData['do_not_bootstrap'] is True:
-					doBootStrap = False
-
-			if doBootStrap:
-				if conf_system == "waf":
-					if not os.path.isfile("waf"):
-						if os.path.isfile("bootstrap.py"):
-							self.runProcess('./bootstrap.py')
+	def getPatchTargets(self, patchFile, strip):  # relative paths of the files a patch touches, after stripping like patch -pN does
+		targets = set()
+		with open(patchFile, "r", encoding="utf-8", errors="replace") as f:
+			for line in f:
+				if line.startswith(("--- ", "+++ ")):
+					path = line[4:].split("\t")[0].strip().strip('"')
+					if path == "/dev/null":
+						continue
+					parts = path.split("/")[strip:]
+				elif line.startswith(("rename from ", "copy from ")):
+					parts = line.split(" ", 2)[2].strip().split("/")
 				else:
-					self.bootstrapConfigure()
+					continue
+				if parts and ".." not in parts:
+					targets.add(os.path.join(*parts))
+		return targets
+
+	def checkPatchSeries(self, patchDir, patches):  # applies [(patchFile, "-pN")] in order to a scratch copy of just the files they touch, returns an error or None
+		with tempfile.TemporaryDirectory(prefix="patch_check_") as scratch:
+			for patchFile, type in patches:
+				stripMatch = re.match(r'-p(\d+)', type)
+				for target in self.getPatchTargets(patchFile, int(stripMatch.group(1)) if stripMatch else 0):
+					src = os.path.join(patchDir, target)
+					dst = os.path.join(scratch, target)
+					if os.path.isfile(src) and not os.path.exists(dst):
+						os.makedirs(os.path.dirname(dst), exist_ok=True)
+						shutil.copy2(src, dst)
+				p = subprocess.run(["patch", "--batch"] + type.split() + ["-i", str(patchFile)], cwd=scratch, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+				if p.returncode != 0:
+					return "'{0}' does not apply in '{1}':\n{2}".format(patchFile, patchDir, p.stdout.decode("utf-8", "replace").strip())
+		return None
+
+	def validatePatches(self, bitness, packageList):  # fetches the sources of [(name, type, data)] and checks that their pending patches apply, before anything is built.
+		from concurrent.futures import ThreadPoolExecutor
+
+		if bitness in self.patchesValidated:
+			return
+		self.patchesValidated.add(bitness)
+
+		series = []
+		for packageName, type, packageData in packageList:
+			if not packageData.get('patches') or packageData.get('repo_type') == "none" or self.boolKey(packageData, "is_dep_inheriter"):
+				continue
+			beforePath = os.getcwd()
+			sourceDir = self.getPackagePath(packageName, packageData, "P" if type == "PRODUCT" else "D")
+			self.cchdir(beforePath)
+			sourceDir = os.path.join(sourceDir, packageData.get('source_subfolder') or "")
+			byFolder = defaultdict(list)  # patches of one folder depend on each other, so they are checked as one series
+			for p in packageData['patches']:
+				patchDir = os.path.normpath(os.path.join(sourceDir, self.getValueByIntOrNone(p, 2) or ""))
+				if not os.path.isfile(os.path.join(patchDir, "patch_%s.done" % (self.md5(p[0])))):
+					byFolder[patchDir].append((self.resolvedPatches[p[0]], p[1]))
+			series += byFolder.items()
+		if not series:
+			return
 
-			configOpts = ''
-			if 'configure_options' in packageData:
-				try:
-					configOpts = self.replaceVariables(packageData["configure_options"])
-				except KeyError as e:
-					self.errorExit(F'Failed to parse configure line: "{packageData["configure_options"]}", the variable {e} is unvalid.')
-			self.logger.info("Configuring '{0}' with: {1}".format(packageName, configOpts), extra={'type': conf_system})
-
-			confCmd = './configure'
-			if conf_system == "waf":
-				confCmd = './waf --color=yes configure'
-			elif 'configure_path' in packageData:
-				if packageData['configure_path'] is not None:
-					confCmd = packageData['configure_path']
-
-			self.runProcess(F'{confCmd} {configOpts}')
-
-			if 'regex_replace' in packageData and packageData['regex_replace']:
-				_pos = 'post_configure'
-				if isinstance(packageData['regex_replace'], dict) and _pos in packageData['regex_replace']:
-					for r in packageData['regex_replace'][_pos]:
-						self.handleRegexReplace(r, packageName)
-
-			if 'run_post_configure' in packageData:
-				if packageData['run_post_configure'] is not None:
-					for cmd in packageData['run_post_configure']:
-						cmd = self.replaceVariables(cmd)
-						self.logger.info("Running post-configure-command: '{0}'".format(cmd))
-						self.runProcess(cmd)
-
-			doClean = True
-			if 'clean_post_configure' in packageData:
-				if packageData['clean_post_configure'] is False:
-					doClean = False
-
-			if doClean:
-				mCleanCmd = 'make clean'
-				if conf_system == "waf":
-					mCleanCmd = './waf --color=yes clean'
-				self.runProcess('{0} {1}'.format(mCleanCmd, cpuCountStr), True)
-
-			if 'patches_post_configure' in packageData:
-				if packageData['patches_post_configure'] is not None:
-					for p in packageData['patches_post_configure']:
-						self.applyPatch(p[0], p[1], True)
-
-			self.touch(touchName)
+		self.logger.info("Checking %d patch series" % (len(series)))
+		with ThreadPoolExecutor(max_workers=min(cpu_count(), len(series))) as executor:
+			errors = [e for e in executor.map(lambda s: self.checkPatchSeries(*s), series) if e is not None]
+		if errors:
+			self.errorExit("Some patches do not apply:\n" + "\n".join(errors))
 
 	def applyPatch(self, url, type="-p1", postConf=False, folderToPatchIn=None):
 		originalFolder = os.getcwd()
@@ -2247,7 +3905,11 @@ class CrossCompileScript:
 			return
 
 		pUrl = urlparse(url)
-		if pUrl.scheme != '':
+		if url in self.resolvedPatches:
+			fileName = os.path.basename(pUrl.path)
+			self.logger.info("Copying patch '{0}' from '{1}'".format(url, self.resolvedPatches[url]))
+			shutil.copyfile(self.resolvedPatches[url], os.path.join(os.getcwd(), fileName))
+		elif pUrl.scheme != '':
 			fileName = os.path.basename(pUrl.path)
 			self.logger.info("Downloading patch '{0}' to: {1}".format(url, fileName))
 			self.downloadFile(url, fileName)
@@ -2260,7 +3922,7 @@ class CrossCompileScript:
 				shutil.copyfile(local_patch_path, copyPath)
 			else:
 				fileName = os.path.basename(urlparse(url).path)
-				url = "https://raw.githubusercontent.com/DeadSix27/python_cross_compile_script/master/patches" + url
+				url = self.getPatchDownloadUrl(url)
 				self.downloadFile(url, fileName)
 
 		self.logger.info("Patching source using: '{0}'".format(fileName))
@@ -2275,181 +3937,6 @@ class CrossCompileScript:
 			self.cchdir(originalFolder)
 	#:
 
-	def mesonSource(self, packageName, packageData):
-		touchName = "already_ran_meson_%s" % (self.md5(packageName, self.getKeyOrBlankString(packageData, "configure_options	")))
-
-		if not os.path.isfile(touchName):
-			self.removeAlreadyFiles()
-
-			makeOpts = ''
-			if 'configure_options' in packageData:
-				makeOpts = self.replaceVariables(packageData["configure_options"])
-			self.logger.info("Meson'ing '{0}' with: {1}".format(packageName, makeOpts))
-
-			self.runProcess('meson {0}'.format(makeOpts))
-
-			if 'regex_replace' in packageData and packageData['regex_replace']:
-				_pos = 'post_configure'
-				if isinstance(packageData['regex_replace'], dict) and _pos in packageData['regex_replace']:
-					for r in packageData['regex_replace'][_pos]:
-						self.handleRegexReplace(r, packageName)
-
-			self.touch(touchName)
-
-	def cmakeSource(self, packageName, packageData):
-		touchName = "already_ran_cmake_%s" % (self.md5(packageName, self.getKeyOrBlankString(packageData, "configure_options")))
-
-		if not os.path.isfile(touchName):
-			self.removeAlreadyFiles()
-
-			makeOpts = ''
-			if 'configure_options' in packageData:
-				makeOpts = self.replaceVariables(packageData["configure_options"])
-			self.logger.info("C-Making '{0}' with: {1}".format(packageName, makeOpts))
-
-			self.runProcess('cmake {0}'.format(makeOpts))
-
-			self.runProcess("make clean", True)
-
-			if 'regex_replace' in packageData and packageData['regex_replace']:
-				_pos = 'post_configure'
-				if isinstance(packageData['regex_replace'], dict) and _pos in packageData['regex_replace']:
-					for r in packageData['regex_replace'][_pos]:
-						self.handleRegexReplace(r, packageName)
-
-			self.touch(touchName)
-
-	def buildSource(self, packageName, packageData, buildSystem):
-		_origDir = os.getcwd()
-		touchName = "already_ran_make_%s" % (self.md5(packageName, self.getKeyOrBlankString(packageData, "build_options")))
-
-		if not os.path.isfile(touchName):
-			cpuCountStr = '-j {0}'.format(self.cpuCount)
-
-			if 'cpu_count' in packageData:
-				if isinstance(packageData['cpu_count'], int) and packageData['cpu_count'] > 0:
-					cpuCountStr = '-j {0}'.format(packageData['cpu_count'])
-				else:
-					cpuCountStr = ""
-
-			mkCmd = 'make'
-
-			if buildSystem == "waf":
-				mkCmd = './waf --color=yes'
-			if buildSystem == "rake":
-				mkCmd = 'rake'
-			if buildSystem == "ninja":
-				mkCmd = 'ninja'
-
-			if buildSystem == "make":
-				if os.path.isfile("configure"):
-					self.runProcess(F'{mkCmd} clean {cpuCountStr}', True)
-
-			makeOpts = ''
-			if 'build_options' in packageData:
-				makeOpts = self.replaceVariables(packageData["build_options"])
-
-			if self.debugMode:
-				print("### Environment variables:  ###")
-				for tk in os.environ:
-					print("\t" + tk + " : " + os.environ[tk])
-				print("##############################")
-
-			self.logger.info(F"Building '{packageName}' with: {makeOpts} in {os.getcwd()}", extra={'type': buildSystem})
-
-			if 'ignore_build_fail_and_run' in packageData:
-				if len(packageData['ignore_build_fail_and_run']) > 0:  # todo check if its a list too
-					try:
-						if buildSystem == "waf":
-							mkCmd = './waf --color=yes build'
-						self.runProcess(F'{mkCmd} {cpuCountStr} {makeOpts}')
-					except Exception:  # todo, except specific exception
-						self.logger.info("Ignoring failed make process...")
-						for cmd in packageData['ignore_build_fail_and_run']:
-							cmd = self.replaceVariables(cmd)
-							self.logger.info(F"Running post-failed-make-command: '{cmd}'")
-							self.runProcess(cmd)
-			else:
-				if buildSystem == "waf":
-					mkCmd = './waf --color=yes build'
-				self.runProcess(F'{mkCmd} {cpuCountStr} {makeOpts}')
-
-			if 'regex_replace' in packageData and packageData['regex_replace']:
-				_pos = 'post_build'
-				if isinstance(packageData['regex_replace'], dict) and _pos in packageData['regex_replace']:
-					for r in packageData['regex_replace'][_pos]:
-						self.handleRegexReplace(r, packageName)
-
-			if 'run_post_build' in packageData:
-				if packageData['run_post_build'] is not None:
-					for cmd in packageData['run_post_build']:
-						if cmd.startswith("!SWITCHDIRBACK"):
-							self.cchdir(_origDir)
-						elif cmd.startswith("!SWITCHDIR"):
-							_dir = self.replaceVariables("|".join(cmd.split("|")[1:]))
-							self.cchdir(_dir)
-						else:
-							cmd = self.replaceVariables(cmd)
-							self.logger.info("Running post-build-command: '{0}'".format(cmd))
-							self.runProcess(cmd)
-
-			self.touch(touchName)
-
-	def installSource(self, packageName, packageData, buildSystem):
-		_origDir = os.getcwd()
-		touchName = "already_ran_install_%s" % (self.md5(packageName, self.getKeyOrBlankString(packageData, "install_options")))
-		if not os.path.isfile(touchName):
-			cpuCountStr = '-j {0}'.format(self.cpuCount)
-
-			if 'cpu_count' in packageData:
-				if isinstance(packageData['cpu_count'], int) and packageData['cpu_count'] > 0:
-					cpuCountStr = '-j {0}'.format(packageData['cpu_count'])
-				else:
-					cpuCountStr = ""
-
-			makeInstallOpts = ''
-			if 'install_options' in packageData:
-				if packageData['install_options'] is not None:
-					makeInstallOpts = self.replaceVariables(packageData["install_options"])
-			installTarget = "install"
-			if 'install_target' in packageData:
-				if packageData['install_target'] is not None:
-					installTarget = packageData['install_target']
-
-			self.logger.info("Installing '{0}' with: {1}".format(packageName, makeInstallOpts), extra={'type': buildSystem})
-
-			mkCmd = "make"
-			if buildSystem == "waf":
-				mkCmd = "./waf"
-			if buildSystem == "rake":
-				mkCmd = "rake"
-			if buildSystem == "ninja":
-				mkCmd = "ninja"
-
-			self.runProcess(F'{mkCmd} {installTarget} {makeInstallOpts} {cpuCountStr}')
-
-			if 'regex_replace' in packageData and packageData['regex_replace']:
-				_pos = 'post_install'
-				if isinstance(packageData['regex_replace'], dict) and _pos in packageData['regex_replace']:
-					for r in packageData['regex_replace'][_pos]:
-						self.handleRegexReplace(r, packageName)
-
-			if 'run_post_install' in packageData:
-				if packageData['run_post_install'] is not None:
-					for cmd in packageData['run_post_install']:
-						if cmd.startswith("!SWITCHDIRBACK"):
-							self.cchdir(_origDir)
-						elif cmd.startswith("!SWITCHDIR"):
-							_dir = self.replaceVariables("|".join(cmd.split("|")[1:]))
-							self.cchdir(_dir)
-						else:
-							cmd = self.replaceVariables(cmd)
-							self.logger.info("Running post-install-command: '{0}'".format(cmd))
-							self.runProcess(cmd)
-
-			self.touch(touchName)
-	#:
-
 	def resetDefaultEnvVars(self):
 		self.logger.debug("Reset CFLAGS/CXXFLAGS to: {0}".format(self.originalCflags))
 		os.environ["CFLAGS"] = self.originalCflags
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# ####################################################
+# Copyright (C) 2018-2020 DeadSix27 (https://github.com/DeadSix27/python_cross_compile_script)
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ###################################################
+
+# Tar extraction shared by cross_compiler.py and the toolchain builder.
+# The archive is streamed into `tar`, decompressed by a multi-threaded tool when one is installed,
+# tarfile is only used when there is no tar at all.
+
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import time
+
+_CHUNK_SIZE = 1024 * 1024
+
+# In order of preference, the first installed one is used, tar appends -d itself.
+DECOMPRESSORS = [
+	((".tar.xz", ".txz"), ["xz -T0"]),
+	((".tar.bz2", ".tbz2", ".tbz"), ["lbzip2", "pbzip2", "bzip2"]),
+	((".tar.gz", ".tgz"), ["pigz", "gzip"]),
+	((".tar.zst", ".tzst"), ["zstd -T0"]),
+]
+
+
+class ExtractError(Exception):
+	def __init__(self, message):
+		self.message = message
+		super().__init__(message)
+
+
+class ThrottledProgress:  # forwards (done, total) to a callback at most once per interval, and always for the final update
+	def __init__(self, callback, total, interval=0.25):
+		self.callback = callback
+		self.total = total
+		self.interval = interval
+		self.last = 0.0
+
+	def update(self, done, force=False):
+		if self.callback is None:
+			return
+		now = time.monotonic()
+		if force or now - self.last >= self.interval:
+			self.last = now
+			self.callback(done, self.total)
+
+
+def getDecompressor(fileName):  # program for tar -I, or None when tar should figure it out on its own
+	for extensions, programs in DECOMPRESSORS:
+		if fileName.endswith(extensions):
+			for program in programs:
+				if shutil.which(program.split(" ")[0]):
+					return program
+	return None
+
+
+def extractTar(fileName, outputDir=".", stripComponents=0, onProgress=None):  # onProgress(bytesRead, archiveSize) is throttled, raises ExtractError
+	progress = ThrottledProgress(onProgress, os.path.getsize(fileName))
+	if shutil.which("tar"):
+		extractWithTar(fileName, outputDir, stripComponents, progress)
+	else:
+		extractWithTarfile(fileName, outputDir, stripComponents, progress)
+	progress.update(progress.total, True)
+
+
+def extractWithTar(fileName, outputDir, stripComponents, progress):
+	decompressor = getDecompressor(fileName)
+	command = ["tar"]
+	if decompressor is not None:
+		command += ["-I", decompressor]
+	if stripComponents:
+		command.append("--strip-components={0}".format(stripComponents))
+
+	if decompressor is None:  # tar only detects the compression of files, not of pipes
+		process = subprocess.run(command + ["-xf", fileName, "-C", outputDir], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+		if process.returncode != 0:
+			raise ExtractError("tar failed to extract '{0}': {1}".format(fileName, process.stderr.decode("utf-8", "replace").strip()))
+		return
+
+	with tempfile.TemporaryFile() as errors:  # a pipe could fill up with warnings while tar waits for stdin, a file can't
+		process = subprocess.Popen(command + ["-xf", "-", "-C", outputDir], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=errors)
+		done = 0
+		try:
+			with open(fileName, "rb") as f:
+				for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+					process.stdin.write(chunk)
+					done += len(chunk)
+					progress.update(done)
+			process.stdin.close()
+		except BrokenPipeError:
+			pass  # tar exited early, its error is reported below
+		if process.wait() != 0:
+			errors.seek(0)
+			raise ExtractError("tar failed to extract '{0}': {1}".format(fileName, errors.read().decode("utf-8", "replace").strip()))
+
+
+
+def extractWithTarfile(fileName, outputDir, stripComponents, progress):
+	class ProgressReader:  # counts what tarfile reads, instead of hooking every member read
+		def __init__(self, f):
+			self.f = f
+			self.done = 0
+
+		def read(self, size=-1):
+			data = self.f.read(size)
+			self.done += len(data)
+			progress.update(self.done)
+			return data
+
+	with open(fileName, "rb") as f:
+		with tarfile.open(fileobj=ProgressReader(f), mode="r|*", bufsize=_CHUNK_SIZE) as tar:  # stream mode reads the archive once, front to back
+			for member in tar:
+				if stripComponents:
+					parts = member.name.split("/")[stripComponents:]
+					if not parts or parts == [""]:
+						continue
+					member.name = "/".join(parts)
+					if member.islnk():
+						member.linkname = "/".join(member.linkname.split("/")[stripComponents:])
+				if hasattr(tarfile, "data_filter"):
+					tar.extract(member, outputDir, filter="data")
+				else:
+					tar.extract(member, outputDir)
@@ -16,33 +16,55 @@
 # ###################################################
 
 import hashlib
-import io
+import json
 import os
 import os.path
 import re
 import shutil
 import subprocess
 import sys
-import tarfile
+import tempfile
+import threading
 import time
 import urllib
+import urllib.parse
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import cpu_count
 
 import progressbar  # Please run: pip3 install progressbar2
 import requests  # Please run: pip3 install requests
 
+try:  # imported by cross_compiler.py
+	from mingw_toolchain_script.archive_extract import ExtractError, extractTar
+except ImportError:  # run on its own
+	from archive_extract import ExtractError, extractTar
+
 _WORKDIR = "toolchain"
 _CPU_COUNT = cpu_count()
 _NO_CONFIG_GUESS = True  # Instead of downloading config.guess we use gcc -dumpmachine, this obviously only works when gcc is installed, but we need it to be installed anyway.
 _DEBUG = False
 _VERSION = "4.4"
 
+TARGETS = OrderedDict()  # Target triples the toolchain can be built for, the values are extra format variables for BUILDS.
+
+TARGETS['x86_64-w64-mingw32'] = {
+	'arch': 'x86-64',
+	'gcc_options': '',
+	'crt_options': '',
+}
+TARGETS['i686-w64-mingw32'] = {
+	'arch': 'i686',
+	'gcc_options': ' --disable-sjlj-exceptions --with-dwarf2',
+	'crt_options': ' --enable-lib32 --disable-lib64',
+}
+
 SOURCES = OrderedDict()  # Order matters.
 
 SOURCES['mingw-w64'] = {
 	'type': 'git',
 	'git_shallow': False,
+	'git_filter': 'blob:none',  # full history, but blobs only for the checked out revision
 	'url': 'https://git.code.sf.net/p/mingw-w64/mingw-w64',  # mirror: https://github.com/mirror/mingw-w64.git but that seems suprisingly out of date sometimes.
 	'run_after_patches': [
 		('autoreconf -fiv', ),
@@ -87,10 +109,6 @@ SOURCES['binutils'] = {
   		# ( 'https://raw.githubusercontent.com/DeadSix27/python_cross_compile_script/master/mingw_toolchain_script/patches/0001-binutils-remove_provide_qualifiers_from_ctor_and_dtor_list.patch' , 'p1' ),
 	# ],
 	'url': 'https://ftp.gnu.org/gnu/binutils/binutils-{version}.tar.bz2',
-	'softlink_to_package': [
-		('isl', 'isl'),
-		('gmp', 'gmp'),
-	],
 	'update_check': {'url': 'https://ftp.gnu.org/gnu/binutils/', 'type': 'httpindex', 'regex': r'binutils-(?P<version_num>[\d.]+)\.tar\.bz2'},
 }
 SOURCES['gcc'] = {
@@ -104,12 +122,6 @@ SOURCES['gcc'] = {
 		#( 'https://raw.githubusercontent.com/DeadSix27/python_cross_compile_script/master/mingw_toolchain_script/patches/0001-gcc_7_1_0_weak_refs_x86_64.patch', 'p1' ),
 		# ( 'https://raw.githubusercontent.com/DeadSix27/python_cross_compile_script/master/mingw_toolchain_script/patches/0140-gcc-7-Enable-std-experimental-filesystem.patch', 'p1' ), #Unable to get this to work.
 	],
-	'softlink_to_package': [
-		('gmp', 'gmp'),
-		('mpfr', 'mpfr'),
-		('mpc', 'mpc'),
-		('isl', 'isl'),
-	],
 	'builds': [
 		'gcc-1',
 		'gcc-2',
@@ -120,6 +132,53 @@ SOURCES['gcc'] = {
 
 BUILDS = OrderedDict()
 
+# A build is redone when its fingerprint changes: its formatted config line, its source (the git tree of the folder it configures from,
+# or the version of an archive) and the fingerprints of the builds it 'depends' on.
+# 'rebuildCommands' run in the build folder before a build that was done before is redone, in a kept build folder (persistent builds).
+# 'host' builds are the libraries gcc needs to run, they are built once into {host_prefix} and shared by every target.
+BUILDS['gmp'] = {
+	'host': True,
+	'lineConfig':
+		'configure'
+		' --build="{host}"'
+		' --prefix="{host_prefix}"'
+		' --disable-shared'
+		' --enable-static'	,
+}
+BUILDS['mpfr'] = {
+	'host': True,
+	'depends': ['gmp'],
+	'lineConfig':
+		'configure'
+		' --build="{host}"'
+		' --prefix="{host_prefix}"'
+		' --with-gmp="{host_prefix}"'
+		' --disable-shared'
+		' --enable-static'	,
+}
+BUILDS['mpc'] = {
+	'host': True,
+	'depends': ['gmp', 'mpfr'],
+	'lineConfig':
+		'configure'
+		' --build="{host}"'
+		' --prefix="{host_prefix}"'
+		' --with-gmp="{host_prefix}"'
+		' --with-mpfr="{host_prefix}"'
+		' --disable-shared'
+		' --enable-static'	,
+}
+BUILDS['isl'] = {
+	'host': True,
+	'depends': ['gmp'],
+	'lineConfig':
+		'configure'
+		' --build="{host}"'
+		' --prefix="{host_prefix}"'
+		' --with-gmp-prefix="{host_prefix}"'
+		' --disable-shared'
+		' --enable-static'	,
+}
 BUILDS['binutils'] = {
 	'lineConfig':
 		'configure '
@@ -167,12 +226,17 @@ BUILDS['gcc-1'] = {
 		' --enable-languages=c,c++'
 		' --disable-nls'
 		' --disable-win32-registry'
-		' --with-arch=x86-64'
+		' --with-arch={arch}'
 		' --with-tune=generic'
 		' --enable-threads=posix'
 		' --without-included-gettext'
 		' --enable-lto'
 		' --enable-checking=release'
+		' --with-gmp="{host_prefix}"'
+		' --with-mpfr="{host_prefix}"'
+		' --with-mpc="{host_prefix}"'
+		' --with-isl="{host_prefix}"'
+		'{gcc_options}'
 		# ' --enable-default-pie'
       	# ' --enable-default-ssp'
 		# ' --enable-libssp'
@@ -184,6 +248,7 @@ BUILDS['gcc-1'] = {
 	'lineMake'	: 'all-gcc',
 	'lineInstall': 'install-strip-gcc',
 	'lineInstallDebug': 'install-gcc',
+	'depends': ['binutils', 'gmp', 'mpfr', 'mpc', 'isl'],
 }
 BUILDS['mingw-w64-crt'] = {
 	'lineConfig':
@@ -192,7 +257,8 @@ BUILDS['mingw-w64-crt'] = {
 		' --host="{target}"'
 		' --prefix="{prefix}"'
 		' --target="{target}"'
-		' --with-sysroot={prefix}'	,
+		' --with-sysroot={prefix}'
+		'{crt_options}'	,
 	'customCommands': [
 		('{prefix}', 'mv "./{target}/lib/"* "./lib/"', True),
 		('{prefix}', 'rm -fr "./{target}/lib"', True),
@@ -200,6 +266,7 @@ BUILDS['mingw-w64-crt'] = {
 	],
 	'lineInstall': 'install-strip',
 	'lineInstallDebug': 'install',
+	'depends': ['mingw-w64-headers', 'gcc-1'],
 }
 
 BUILDS['mingw-w64-winpthreads'] = {
@@ -213,6 +280,7 @@ BUILDS['mingw-w64-winpthreads'] = {
 	'lineInstall': 'install-strip',
 	'lineInstallDebug': 'install',
 	'cpu_count': 1,
+	'depends': ['mingw-w64-headers', 'mingw-w64-crt', 'gcc-1'],
 }
 
 BUILDS['gcc-2'] = {
@@ -220,7 +288,10 @@ BUILDS['gcc-2'] = {
 	'noConfigure': True,
 	'lineInstall': 'install-strip',
 	'lineInstallDebug': 'install',
-
+	'depends': ['gcc-1', 'mingw-w64-headers', 'mingw-w64-crt', 'mingw-w64-winpthreads'],
+	'rebuildCommands': [  # the target libraries were built against the previous crt, gcc-1's build of the compiler itself is kept
+		'rm -fr "./{target}"',
+	],
 }
 BUILDS['mingw-w64-gendef'] = {
 	'lineConfig':
@@ -246,19 +317,6 @@ BUILDS['mingw-w64-gendef'] = {
 #   'lineInstallDebug' : 'install',
 # }
 
-BUILDS['gmp'] = {
-	'dummy': True,
-}
-BUILDS['mpfr'] = {
-	'dummy': True,
-}
-BUILDS['mpc'] = {
-	'dummy': True,
-}
-BUILDS['isl'] = {
-	'dummy': True,
-}
-
 
 class Event:
 	def __init__(self):
@@ -304,13 +362,15 @@ class MinGW64ToolChainBuilder:
 		self.cwd = os.getcwd()
 		self.debugBuild = False
 		self.customCflags = None
-		self.targetHost = "x86_64-w64-mingw32"
-		self.targetPrefix = os.path.join(self.cwd, self.workDir, self.targetHost)
-		self.targetPrefixBin = os.path.join(self.targetPrefix, "bin")
+		self.persistentBuild = False  # keeps src and bld after building, so the next build only redoes what changed
+		self.targetHosts = ["x86_64-w64-mingw32"]  # see setTargets
 		self.quietMode = False
 		self.sourceDir = os.path.join(self.cwd, self.workDir, "src")
 		self.buildDir = os.path.join(self.cwd, self.workDir, "bld")
+		self.hostPrefix = os.path.join(self.buildDir, "host_prefix")  # gmp, mpfr, mpc and isl, only needed while building gcc
+		self.buildFailed = threading.Event()  # lets the other targets stop when one fails
 		self.logFile = None
+		self.gitMirrorDir = None  # if set, full clones reference a shared bare mirror in here (see cross_compiler.py's updateGitMirror)
 		self.onStatusUpdate = Event()
 
 		self.log("Running Python3 MinGW Build Script v" + _VERSION)
@@ -326,56 +386,43 @@ class MinGW64ToolChainBuilder:
 		else:
 			print(msg)
 
-	def extractFile(self, filename):
-		def on_progress(filename, position, total_size, pb):
-			pass
-
-		def get_file_progress_file_object_class(on_progress, pb):
-			class FileProgressFileObject(tarfile.ExFileObject):
-				def read(self, size, *args):
-				  on_progress(self.name, self.position, self.size, pb)
-				  return tarfile.ExFileObject.read(self, size, *args)
-			return FileProgressFileObject
-
-		class ProgressFileObject(io.FileIO):
-			def __init__(self, path, pb, *args, **kwargs):
-				self.pb = pb
-				self._total_size = os.path.getsize(path)
-				io.FileIO.__init__(self, path, *args, **kwargs)
-
-			def read(self, size):
-				self.pb.update(self.tell())
-				return io.FileIO.read(self, size)
-		#:
-		terms = shutil.get_terminal_size((100, 100))
-		# filler = 0
-		# if terms[0] > 100:
-		# 	filler = int(terms[0]/4)
-		widgets = [
-			progressbar.FormatCustomText("Extracting : {:25.25}".format(os.path.basename(filename))), " ",
-			progressbar.Percentage(), " ",
-			progressbar.Bar(fill=chr(9617), marker=chr(9608), left="[", right="]"), " ",
-			progressbar.DataSize(), "/", progressbar.DataSize(variable="max_value"),
-			# " "*filler,
-		]
+	def extractFile(self, filename, outputDir=".", showProgress=True):  # extracts into a scratch folder first, so an interrupted extraction never looks finished; returns the extracted folder's name
+		pbar = None
+		if showProgress:
+			widgets = [
+				progressbar.FormatCustomText("Extracting : {:25.25}".format(os.path.basename(filename))), " ",
+				progressbar.Percentage(), " ",
+				progressbar.Bar(fill=chr(9617), marker=chr(9608), left="[", right="]"), " ",
+				progressbar.DataSize(), "/", progressbar.DataSize(variable="max_value"),
+			]
+			pbar = progressbar.ProgressBar(widgets=widgets, maxval=os.path.getsize(filename))
+			pbar.start()
 
-		pbar = progressbar.ProgressBar(widgets=widgets, maxval=os.path.getsize(filename))
-		pbar.start()
-		tarfile.TarFile.fileobject = get_file_progress_file_object_class(on_progress, pbar)
-		tar = tarfile.open(fileobj=ProgressFileObject(filename, pbar), mode="r:*")
-		outputPath = os.path.commonprefix(tar.getnames())
-		if os.path.isfile(outputPath):
-			return outputPath
-			tar.close()
-			pbar.finish()
-		else:
-			tar.extractall()
-			tar.close()
+		tmpDir = tempfile.mkdtemp(prefix=".extract_", dir=outputDir)
+		try:
+			extractTar(filename, tmpDir, onProgress=(lambda done, total: pbar.update(done)) if pbar != None else None)
+		except ExtractError as e:
+			self.log(e.message)
+			exit(1)
+		if pbar != None:
 			pbar.finish()
-			return outputPath
+
+		entries = os.listdir(tmpDir)
+		if len(entries) == 1 and os.path.isdir(os.path.join(tmpDir, entries[0])):
+			outputName = entries[0]
+			if os.path.isdir(os.path.join(outputDir, outputName)):
+				shutil.rmtree(os.path.join(outputDir, outputName))
+			os.rename(os.path.join(tmpDir, outputName), os.path.join(outputDir, outputName))
+			os.rmdir(tmpDir)
+		else:  # no single top folder, the archive's contents become the folder
+			outputName = self.splitext(os.path.basename(filename))[0]
+			if os.path.isdir(os.path.join(outputDir, outputName)):
+				shutil.rmtree(os.path.join(outputDir, outputName))
+			os.rename(tmpDir, os.path.join(outputDir, outputName))
+		return outputName
 	#:
 
-	def download_file(self, url=None, outputFileName=None, outputPath=None, bytes=False):
+	def download_file(self, url=None, outputFileName=None, outputPath=None, bytes=False, showProgress=True):
 		def fmt_size(num, suffix="B"):
 				for unit in ["", "Ki", "Mi", "Gi", "Ti", "Pi", "Ei", "Zi"]:
 					if abs(num) < 1024.0:
@@ -450,7 +497,9 @@ class MinGW64ToolChainBuilder:
 			# " "*filler
 		]
 		pbar = None
-		if size == None:
+		if not showProgress:  # several downloads at once would draw over each other
+			pbar = progressbar.NullBar(maxval=progressbar.UnknownLength if size == None else size)
+		elif size == None:
 			pbar = progressbar.ProgressBar(widgets=widgetsNoSize, maxval=progressbar.UnknownLength)
 		else:
 			pbar = progressbar.ProgressBar(widgets=widgets, maxval=size)
@@ -496,13 +545,13 @@ class MinGW64ToolChainBuilder:
 				return fullOutputPath
 	#:
 
-	def run_process(self, command, ignoreErrors=False, exitOnError=True):
+	def run_process(self, command, ignoreErrors=False, exitOnError=True, cwd=None):
 		isSvn = False
 		if not isinstance(command, str):
 			command = " ".join(command)  # could fail I guess
 		if command.lower().startswith("svn"):
 			isSvn = True
-		process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
+		process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True, cwd=cwd)
 		while True:
 			nextline = process.stdout.readline()
 			if nextline == b'' and process.poll() is not None:
@@ -529,13 +578,13 @@ class MinGW64ToolChainBuilder:
 		else:
 			if ignoreErrors:
 				return output
-			self.log("Error [{0}] running process: '{1}' in '{2}'".format(return_code, command, os.getcwd()))
-			self.log("You can try deleting the product/dependency folder: '{0}' and re-run the script".format(os.getcwd()))
+			self.log("Error [{0}] running process: '{1}' in '{2}'".format(return_code, command, cwd or os.getcwd()))
+			self.log("You can try deleting the product/dependency folder: '{0}' and re-run the script".format(cwd or os.getcwd()))
 			if exitOnError:
 				exit(1)
 	#:
 
-	def gitClone(self, packageName, url, virtFolderName=None, renameTo=None, desiredBranch=None, recursive=False, shallow=False):
+	def gitClone(self, packageName, url, virtFolderName=None, renameTo=None, desiredBranch=None, recursive=False, shallow=False, cloneFilter=None):
 		if virtFolderName == None:
 			virtFolderName = self.sanitize_filename(os.path.basename(url))
 			if not virtFolderName.endswith(".git"):
@@ -557,11 +606,18 @@ class MinGW64ToolChainBuilder:
 			properBranchString = desiredBranch
 
 		if os.path.isdir(realFolderName):
-			self.log("Git repo '%s' already cloned, updating.." % (packageName, url))
+			self.log("Git repo '%s' (%s) already cloned, updating.." % (packageName, url))
 			self.cchdir(realFolderName)
 
 			self.run_process('git remote update')
 
+			if desiredBranch != None and re.fullmatch(r'[0-9a-f]{7,40}', desiredBranch):  # a commit can't be pulled, only checked out
+				self.run_process('git checkout -f {0}'.format(desiredBranch))
+				self.run_process('git clean -xfdf')
+				self.run_process('git submodule update --init --recursive')
+				self.cchdir("..")
+				return realFolderName
+
 			UPSTREAM = '@{u}'  # or branchName i guess
 
 			if desiredBranch != None:
@@ -590,9 +646,16 @@ class MinGW64ToolChainBuilder:
 				self.run_process('git submodule update --init --recursive')
 			self.cchdir("..")
 		else:
+			referenceArg = ""
+			if not shallow:
+				mirrorPath = self.updateGitMirror(url, cloneFilter)
+				if mirrorPath != None:
+					referenceArg = ' --reference-if-able "{0}"'.format(mirrorPath)
+				if cloneFilter != None:
+					referenceArg += " --filter={0}".format(cloneFilter)
 			self.log(F"{'C' if not shallow else 'Shallow-c'}loning Git repository '{packageName}' from '{url}'")
-			self.run_process('git clone{0}{1} --progress "{2}" "{3}"'.format(
-				" --recursive" if recursive == True else "", " --depth 1" if shallow == True else "", url, realFolderName + ".tmp")
+			self.run_process('git clone{0}{1}{2} --progress "{3}" "{4}"'.format(
+				" --recursive" if recursive == True else "", " --depth 1" if shallow == True else "", referenceArg, url, realFolderName + ".tmp")
 			)
 			if desiredBranch != None:
 				self.cchdir(realFolderName + ".tmp")
@@ -603,6 +666,29 @@ class MinGW64ToolChainBuilder:
 		return realFolderName
 	#:
 
+	def updateGitMirror(self, url, cloneFilter=None):
+		if self.gitMirrorDir == None:
+			return None
+		mirrorName = re.sub(r'[^\w.-]+', '_', (urllib.parse.urlparse(url).netloc + urllib.parse.urlparse(url).path).strip("/"))
+		if mirrorName.endswith(".git"):
+			mirrorName = mirrorName[:-len(".git")]
+		if cloneFilter != None:  # same naming as the main script's partial mirrors
+			mirrorName += "." + re.sub(r'[^\w.-]+', '_', cloneFilter)
+		mirrorPath = os.path.join(self.gitMirrorDir, mirrorName + ".git")
+		if not os.path.isdir(mirrorPath):
+			self.log("Creating git mirror of '{0}' in '{1}'".format(url, mirrorPath))
+			os.makedirs(self.gitMirrorDir, exist_ok=True)
+			if os.path.isdir(mirrorPath + ".tmp"):
+				shutil.rmtree(mirrorPath + ".tmp")
+			self.run_process('git clone --mirror{0} --progress "{1}" "{2}"'.format(" --filter={0}".format(cloneFilter) if cloneFilter != None else "", url, mirrorPath + ".tmp"))
+			self.run_process('git -C "{0}" config gc.pruneExpire never'.format(mirrorPath + ".tmp"))
+			os.rename(mirrorPath + ".tmp", mirrorPath)
+		else:
+			self.log("Updating git mirror of '{0}'".format(url))
+			self.run_process('git -C "{0}" remote update --prune'.format(mirrorPath), ignoreErrors=True)
+		return mirrorPath
+	#:
+
 	def getConfigGuess(self):
 		if _NO_CONFIG_GUESS == True:
 			return subprocess.check_output("gcc -dumpmachine", shell=True).decode("utf-8").strip()
@@ -642,41 +728,48 @@ class MinGW64ToolChainBuilder:
 				return path[:-len(ext)], path[-len(ext):]
 		return os.path.splitext(path)
 
+	def fetchSource(self, pn, p):  # clones or downloads+extracts one source, returns its folder name in sourceDir
+		if "type" not in p:
+			raise Exception("Missing type")
+		if p["type"] == "git":  # the only fetcher that changes directory, there is just one git source
+			branch = None
+			if "checkout" in p:
+				branch = p["checkout"]
+			shallowClone = False
+			if "git_shallow" in p:
+				if p["git_shallow"] == True:
+					shallowClone = True
+			self.cchdir(self.sourceDir)
+			return self.gitClone(pn, p["url"], desiredBranch=branch, shallow=shallowClone, cloneFilter=p.get("git_filter"))
+		elif p["type"] == "archive":
+			pUrl = p["url"].format(version=p["version"])
+			fileName = os.path.basename(pUrl)
+			folderName = self.splitext(fileName)[0]
+			if os.path.isdir(os.path.join(self.sourceDir, folderName)):
+				return folderName
+			self.log("Downloading sources for: %s" % pn)
+			archivePath = self.download_file(pUrl, outputPath=self.sourceDir, showProgress=False)
+			self.log("Extracting sources for: %s" % pn)
+			productPath = self.extractFile(archivePath, self.sourceDir, showProgress=False)
+			os.unlink(archivePath)
+			return productPath
+		else:
+			raise Exception("Missing type")
+	#:
+
 	def downloadSources(self):
 		origDir = os.getcwd()
 		self.cchdir(self.sourceDir)
 		baseDir = os.getcwd()
 
+		# Fetching is independent per source, so it all happens at once; patching and softlinking below need the order.
+		with ThreadPoolExecutor(max_workers=len(SOURCES)) as executor:
+			futures = OrderedDict((pn, executor.submit(self.fetchSource, pn, p)) for pn, p in SOURCES.items())
+		productPaths = OrderedDict((pn, f.result()) for pn, f in futures.items())
+		self.cchdir(baseDir)
+
 		for pn, p in SOURCES.items():
-			pUrl = ""
-			fileName = ""
-			productPath = ""
-			shallowClone = False
-			if "type" in p:
-				if p["type"] == "git":
-					pUrl = p["url"]
-					branch = None
-					if "checkout" in p:
-						branch = p["checkout"]
-					if "git_shallow" in p:
-						if p["git_shallow"] == True:
-							shallowClone = True
-					productPath = self.gitClone(pn, pUrl, desiredBranch=branch, shallow=shallowClone)
-
-				elif p["type"] == "archive":
-					pUrl = p["url"].format(version=p["version"])
-					fileName = os.path.basename(pUrl)
-					folderName = self.splitext(fileName)[0]
-					if not os.path.isfile(fileName) and not os.path.isdir(folderName):
-						self.log("Downloading sources for: %s" % pn)
-						self.download_file(pUrl)
-						self.log("Extracting sources for: %s" % pn)
-						productPath = self.extractFile(fileName)
-						os.unlink(fileName)
-					else:
-						productPath = folderName
-				else:
-					raise Exception("Missing type")
+			productPath = productPaths[pn]
 
 			if "patches" in p and len(p["patches"]) >= 1:
 
@@ -724,21 +817,17 @@ class MinGW64ToolChainBuilder:
 				for b in p["builds"]:
 					if b in BUILDS:
 						BUILDS[b]["sourceFolder"] = os.path.join(self.sourceDir, productPath)
-						BUILDS[b]["buildFolder"] = os.path.join(self.buildDir, productPath)
+						BUILDS[b]["sourceName"] = pn
+						BUILDS[b]["buildName"] = productPath  # the build folder is bld/<target or host>/<buildName>
 			else:
 				if pn in BUILDS:
 					BUILDS[pn]["sourceFolder"] = os.path.join(self.sourceDir, productPath)
-					BUILDS[pn]["buildFolder"] = os.path.join(self.buildDir, productPath)
+					BUILDS[pn]["sourceName"] = pn
+					BUILDS[pn]["buildName"] = productPath
 
 		self.cchdir(origDir)
 	#:
 
-	def getSafePath(self, b, name):
-		if "sourceFolder" in b[name]:
-			return b[name]["sourceFolder"]
-		else:
-			return None
-
 	def dictGetSafeString(self, d, k, default=""):
 		if k in d:
 			return d[k]
@@ -748,151 +837,203 @@ class MinGW64ToolChainBuilder:
 	def md5(self, str):
 		return hashlib.md5(str.encode("utf-8")).hexdigest()
 
+	def getSourceFingerprint(self, sourceName, subFolder):  # for git sources the tree of subFolder, so a new checkout only changes the builds whose folder changed
+		p = SOURCES[sourceName]
+		state = {k: p.get(k) for k in ('version', 'url', 'patches', 'run_after_patches')}
+		if p["type"] == "git":
+			treeish = "HEAD:" + subFolder if subFolder != "" else "HEAD^{tree}"
+			state['tree'] = subprocess.check_output(["git", "-C", p["sourceFolder"], "rev-parse", treeish]).decode("utf-8").strip()
+		else:
+			state['checkout'] = p.get('checkout')
+		return state
+
+	def getComponentFingerprint(self, pn, p, target, confOpts):  # sha256 of everything a build's output depends on, stored in BUILDS[pn]["fingerprints"]
+		state = {
+			'config': confOpts,
+			'source': self.getSourceFingerprint(p["sourceName"], os.path.dirname(p.get("lineConfig", "").split(" ")[0])),
+			'build': {k: v for k, v in p.items() if k.startswith('line') or k in ('customCommands', 'softLinks', 'noConfigure', 'noMake', 'noInstall')},
+			'debug_build': self.debugBuild,
+			'custom_cflags': self.customCflags,
+			'depends': {d: BUILDS[d]["fingerprints"]["host" if BUILDS[d].get("host") == True else target] for d in p.get("depends", [])},
+		}
+		return hashlib.sha256(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest()
+
 	def createAlreadyFile(self, fname, data):
 		with open(fname, 'w+') as f:
 			f.write(data)
 
+	def getTargetPrefix(self, target):
+		return os.path.join(self.cwd, self.workDir, target)
+
+	def formatVars(self, target):  # format variables for a BUILDS line, target is None for host builds
+		formatVars = {
+			'prefix': self.hostPrefix if target == None else self.getTargetPrefix(target),
+			'target': "" if target == None else target,
+			'host': self.nativeHost,
+			'host_prefix': self.hostPrefix,
+		}
+		if target != None:
+			formatVars.update(TARGETS[target])
+		return formatVars
+
+	def setBuildFlags(self):  # environment is shared by all build threads, so this is set once for every target
+		# Every target's bin folder is in PATH, the tools are prefixed with their triple so they don't collide.
+		os.environ["PATH"] = ":".join([os.path.join(self.getTargetPrefix(t), "bin") for t in self.targetHosts] + [self.pathOrig])
+		if self.customCflags != None:
+			if _DEBUG:
+				self.log("Setting custom C(XX)FLAGS to: " + self.customCflags)
+			os.environ["CFLAGS"] = self.customCflags
+			os.environ["CXXFLAGS"] = self.customCflags
+		else:
+			if self.debugBuild:
+				if _DEBUG:
+					self.log("Setting C(XX)FLAGS to: -ggdb")
+				os.environ["CFLAGS"] = "-ggdb"
+				os.environ["CXXFLAGS"] = "-ggdb"
+			else:
+				if _DEBUG:
+					self.log("Setting C(XX)FLAGS to: -O3")
+				os.environ["CFLAGS"] = "-O3"
+				os.environ["CXXFLAGS"] = "-O3"
+
 	def buildSources(self):
+		self.setBuildFlags()
+		self.buildFailed.clear()
 
-		def formatProgVars(inpFormat):
-			return inpFormat.format(
-				prefix=self.targetPrefix,
-				target=self.targetHost,
-				host=self.nativeHost,
-				mpfr_path=self.getSafePath(BUILDS, "mpfr"),
-				isl_path=self.getSafePath(BUILDS, "isl"),
-				mpc_path=self.getSafePath(BUILDS, "mpc"),
-				gmp_path=self.getSafePath(BUILDS, "gmp"),
-			)
-		os.environ["PATH"] = "{0}:{1}".format(self.targetPrefixBin, self.pathOrig)
+		for pn, p in BUILDS.items():
+			if p.get("host") == True:
+				self.buildComponent(pn, p, None, _CPU_COUNT)
+
+		# binutils, gcc and mingw-w64 of one target depend on each other, but targets don't, so each target gets its own thread.
+		# They split the make jobs between them, which keeps the machine as busy as a single target build.
+		targetBuilds = [(pn, p) for pn, p in BUILDS.items() if p.get("host") != True]
+		jobs = max(1, _CPU_COUNT // len(self.targetHosts))
+		with ThreadPoolExecutor(max_workers=len(self.targetHosts)) as executor:
+			futures = [executor.submit(self.buildTarget, target, targetBuilds, jobs) for target in self.targetHosts]
+		for f in futures:
+			f.result()  # re-raises the exit() of a failed target
+	#:
 
-		origDir = os.getcwd()
-		self.cchdir(self.sourceDir)
-		baseDir = os.getcwd()
+	def buildTarget(self, target, builds, jobs):
+		if len(self.targetHosts) > 1:
+			self.log("Building target '%s' with %d jobs" % (target, jobs))
+		try:
+			for pn, p in builds:
+				if self.buildFailed.is_set():
+					self.log("Stopping target '%s', another target failed." % target)
+					exit(1)
+				self.buildComponent(pn, p, target, jobs)
+		except BaseException:
+			self.buildFailed.set()
+			raise
+	#:
 
-		for pn, p in BUILDS.items():
-			if "dummy" in p:
-				continue
-			if "sourceFolder" not in p:
-				raise Exception("Source for %s is missing" % pn)
-				exit()
-			baseFolder = os.getcwd()
-			pSourceFolder = p["sourceFolder"]
-			pBuildFolder = p["buildFolder"]
-			if not os.path.isdir(pBuildFolder):
-				os.makedirs(pBuildFolder)
-
-			self.cchdir(pBuildFolder)
-
-			confOpts = ""
-			if self.debugBuild and "lineConfigDebug" in p:
-				confOpts = formatProgVars(p["lineConfigDebug"])
-			elif "lineConfig" in p:
-				confOpts = formatProgVars(p["lineConfig"])
-
-			confOptsHash = "already_built_" + pn + "_" + self.md5(confOpts)
-			cpuCount = _CPU_COUNT
-			if "cpu_count" in p:
-				cpuCount = p["cpu_count"]
-
-			if self.customCflags != None:
-				if _DEBUG:
-					self.log("Setting custom C(XX)FLAGS to: " + self.customCflags)
-				os.environ["CFLAGS"] = self.customCflags
-				os.environ["CXXFLAGS"] = self.customCflags
+	def buildComponent(self, pn, p, target, jobs):  # configures, makes and installs one BUILDS entry, without changing directory so targets can build at the same time
+		def formatProgVars(inpFormat):
+			return inpFormat.format(**formatVars)
+
+		formatVars = self.formatVars(target)
+		displayName = pn if len(self.targetHosts) == 1 or target == None else "%s (%s)" % (pn, target)
+
+		if "sourceFolder" not in p:
+			raise Exception("Source for %s is missing" % pn)
+		pSourceFolder = p["sourceFolder"]
+		pBuildFolder = os.path.join(self.buildDir, "host" if target == None else target, p["buildName"])
+		if not os.path.isdir(pBuildFolder):
+			os.makedirs(pBuildFolder)
+
+		confOpts = ""
+		if self.debugBuild and "lineConfigDebug" in p:
+			confOpts = formatProgVars(p["lineConfigDebug"])
+		elif "lineConfig" in p:
+			confOpts = formatProgVars(p["lineConfig"])
+
+		fingerprint = self.getComponentFingerprint(pn, p, target, confOpts)
+		p.setdefault("fingerprints", {})["host" if target == None else target] = fingerprint
+		markerPrefix = "already_built_" + pn + "_"
+		confOptsHash = os.path.join(pBuildFolder, markerPrefix + fingerprint)
+		cpuCount = jobs
+		if "cpu_count" in p:
+			cpuCount = min(p["cpu_count"], jobs)
+
+		if not os.path.isfile(confOptsHash):
+			oldMarkers = [f for f in os.listdir(pBuildFolder) if f.startswith(markerPrefix)]
+			if len(oldMarkers) > 0:  # built before with a different fingerprint, the build folder is reused
+				self.log("Rebuilding: %s (changed since the last build)" % displayName)
+				for cmd in p.get("rebuildCommands", []):
+					self.run_process(formatProgVars(cmd), cwd=pBuildFolder)
+				for f in oldMarkers:
+					os.unlink(os.path.join(pBuildFolder, f))
 			else:
-				if self.debugBuild:
-					if _DEBUG:
-						self.log("Setting C(XX)FLAGS to: -ggdb")
-					os.environ["CFLAGS"] = "-ggdb"
-					os.environ["CXXFLAGS"] = "-ggdb"
-				else:
-					if _DEBUG:
-						self.log("Setting C(XX)FLAGS to: -O3")
-					os.environ["CFLAGS"] = "-O3"
-					os.environ["CXXFLAGS"] = "-O3"
-
-			if not os.path.isfile(confOptsHash):
-				self.log("Building: %s" % pn)
-				noConfig = False
-				if "noConfigure" in p:
-					if p["noConfigure"] == True:
-						noConfig = True
-				if not noConfig:
-					self.log(F'Configuring "{pn}" with: <{pSourceFolder.rstrip("/")}/{confOpts}> in <{os.getcwd()}>')
-					self.run_process(F'{pSourceFolder.rstrip("/")}/{confOpts}')
-
-				if "debug_exit_after_config" in p:
-					if p["debug_exit_after_config"] == True:
-						exit()
-
-				noMake = False
-				if "noMake" in p:
-					if p["noMake"] == True:
-						noMake = True
-				if not noMake:
-					makeOpt = self.dictGetSafeString(p, "lineMake")
-					self.log("Making '%s' with: <%s> in <%s>" % (pn, "make %s -j%d V=1" % (makeOpt, cpuCount), os.getcwd()))
-					self.run_process("make %s -j%d V=1" % (makeOpt, cpuCount))
-
-				if "debug_exit_after_make" in p:
-					if p["debug_exit_after_make"] == True:
-						exit()
-
-				noInstall = False
-				if "noInstall" in p:
-					if p["noInstall"] == True:
-						noInstall = True
-				if not noInstall:
-					isntOpt = self.dictGetSafeString(p, "lineInstall", "install")
-					if self.debugBuild:
-						if "lineInstall" not in p:
-							self.log(F"Debug-build is enabled but package {pn} has no lineInstallDebug set, using default.")
-						else:
-							isntOpt = p["lineInstallDebug"]
-
-					self.log("Installing '%s' with: <%s> in <%s>" % (pn, "make %s -j%d V=1" % (isntOpt, cpuCount), os.getcwd()))
-					self.run_process("make %s -j%d V=1" % (isntOpt, cpuCount))
-
-				if "softLinks" in p:
-					for sl in p["softLinks"]:
-						pathBefore = os.getcwd()
-						linkContainerPath = formatProgVars(sl[0])
-						linkTarget = formatProgVars(sl[1])
-						linkName = formatProgVars(sl[2])
-						self.cchdir(linkContainerPath)
-						if not os.path.isdir(linkName):
-							os.symlink(linkTarget, linkName)
-						self.cchdir(pathBefore)
-				#:
-				if "customCommands" in p:
-					for cc in p["customCommands"]:
-						pathBefore = os.getcwd()
-						pathFormatted = formatProgVars(cc[0])
-						self.cchdir(pathFormatted)
-						cmd = formatProgVars(cc[1])
-						self.log("Running customCommands: '{0}'".format(cmd))
-						ignoreFail = False
-						if len(cc) >= 3:
-							if cc[2] == True:
-								ignoreFail = True
-						self.run_process(cmd, ignoreErrors=ignoreFail)
-						self.cchdir(pathBefore)
-				#:
+				self.log("Building: %s" % displayName)
+			noConfig = False
+			if "noConfigure" in p:
+				if p["noConfigure"] == True:
+					noConfig = True
+			if not noConfig:
+				self.log(F'Configuring "{displayName}" with: <{pSourceFolder.rstrip("/")}/{confOpts}> in <{pBuildFolder}>')
+				self.run_process(F'{pSourceFolder.rstrip("/")}/{confOpts}', cwd=pBuildFolder)
+
+			if "debug_exit_after_config" in p:
+				if p["debug_exit_after_config"] == True:
+					exit()
 
-				self.createAlreadyFile(confOptsHash, confOpts)
+			noMake = False
+			if "noMake" in p:
+				if p["noMake"] == True:
+					noMake = True
+			if not noMake:
+				makeOpt = self.dictGetSafeString(p, "lineMake")
+				self.log("Making '%s' with: <%s> in <%s>" % (displayName, "make %s -j%d V=1" % (makeOpt, cpuCount), pBuildFolder))
+				self.run_process("make %s -j%d V=1" % (makeOpt, cpuCount), cwd=pBuildFolder)
+
+			if "debug_exit_after_make" in p:
+				if p["debug_exit_after_make"] == True:
+					exit()
 
-			else:
-				self.log("ALREADY BUILT: " + pn)
+			noInstall = False
+			if "noInstall" in p:
+				if p["noInstall"] == True:
+					noInstall = True
+			if not noInstall:
+				isntOpt = self.dictGetSafeString(p, "lineInstall", "install")
+				if self.debugBuild:
+					if "lineInstall" not in p:
+						self.log(F"Debug-build is enabled but package {pn} has no lineInstallDebug set, using default.")
+					else:
+						isntOpt = p["lineInstallDebug"]
+
+				self.log("Installing '%s' with: <%s> in <%s>" % (displayName, "make %s -j%d V=1" % (isntOpt, cpuCount), pBuildFolder))
+				self.run_process("make %s -j%d V=1" % (isntOpt, cpuCount), cwd=pBuildFolder)
+
+			if "softLinks" in p:
+				for sl in p["softLinks"]:
+					linkContainerPath = formatProgVars(sl[0])
+					linkTarget = formatProgVars(sl[1])
+					linkName = os.path.join(linkContainerPath, formatProgVars(sl[2]))
+					if not os.path.isdir(linkName):
+						os.symlink(linkTarget, linkName)
 			#:
-			if "debug_exit_after_install" in p:
-				if p["debug_exit_after_install"] == True:
-					exit()
-				#:
+			if "customCommands" in p:
+				for cc in p["customCommands"]:
+					pathFormatted = formatProgVars(cc[0])
+					cmd = formatProgVars(cc[1])
+					self.log("Running customCommands: '{0}'".format(cmd))
+					ignoreFail = False
+					if len(cc) >= 3:
+						if cc[2] == True:
+							ignoreFail = True
+					self.run_process(cmd, ignoreErrors=ignoreFail, cwd=pathFormatted)
 			#:
-			self.cchdir(baseFolder)
+
+			self.createAlreadyFile(confOptsHash, confOpts)
+
+		else:
+			self.log("ALREADY BUILT: " + displayName)
 		#:
-		self.cchdir(origDir)
+		if "debug_exit_after_install" in p:
+			if p["debug_exit_after_install"] == True:
+				exit()
 	#:
 
 	def setCustomCflags(self, flags):
@@ -904,11 +1045,39 @@ class MinGW64ToolChainBuilder:
 			SOURCES['mingw-w64']['checkout'] = hash
 			self.log("Set MinGW checkout to: " + hash)
 
+	def setTargets(self, targets):  # target triples to build, e.g ["x86_64-w64-mingw32", "i686-w64-mingw32"]
+		for target in targets:
+			if target not in TARGETS:
+				raise Exception("Unsupported target '%s', supported are: %s" % (target, ", ".join(TARGETS.keys())))
+		if len(targets) == 0:
+			raise Exception("No targets specified.")
+		self.targetHosts = list(OrderedDict.fromkeys(targets))
+		self.log("MinGW targets: " + ", ".join(self.targetHosts))
+
+	def setPersistentBuild(self, switch):
+		self.persistentBuild = switch
+		self.log("MinGW persistent build: " + ("On" if self.persistentBuild == True else "Off"))
+
 	def setDebugBuild(self, switch):
 		self.debugBuild = switch
 		self.log("MinGW debug build: " + ("On" if self.debugBuild == True else "Off"))
 	#:
 
+	def getFingerprint(self):  # sha256 of everything that changes the built toolchain, lets a previous build be reused.
+		if self.nativeHost == "":
+			self.nativeHost = self.getConfigGuess()
+		state = {
+			'script_version': _VERSION,
+			'host': self.nativeHost,
+			'targets': self.targetHosts,
+			'debug_build': self.debugBuild,
+			'custom_cflags': self.customCflags,
+			'sources': {pn: {k: p.get(k) for k in ('version', 'url', 'checkout', 'patches')} for pn, p in SOURCES.items()},
+			'builds': {pn: {k: v for k, v in p.items() if k.startswith('line') or k in ('customCommands', 'softLinks')} for pn, p in BUILDS.items()},
+		}
+		return hashlib.sha256(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest()
+	#:
+
 	def build(self):
 		self.nativeHost = self.getConfigGuess()
 		self.createWorkDirs()
@@ -916,10 +1085,11 @@ class MinGW64ToolChainBuilder:
 		self.downloadSources()
 		self.buildSources()
 
-		self.log("Deleting {}/{}".format(os.getcwd(), self.sourceDir))
-		shutil.rmtree(self.sourceDir)
-		self.log("Deleting {}/{}".format(os.getcwd(), self.buildDir))
-		shutil.rmtree(self.buildDir)
+		if not self.persistentBuild:
+			self.log("Deleting {}/{}".format(os.getcwd(), self.sourceDir))
+			shutil.rmtree(self.sourceDir)
+			self.log("Deleting {}/{}".format(os.getcwd(), self.buildDir))
+			shutil.rmtree(self.buildDir)
 
 		self.logFile.close()
 		self.log("DONE!")
@@ -928,4 +1098,6 @@ class MinGW64ToolChainBuilder:
 
 if __name__ == "__main__":
    test = MinGW64ToolChainBuilder()
+   if len(sys.argv) > 1:  # e.g: ./mingw_toolchain_script.py x86_64-w64-mingw32 i686-w64-mingw32
+      test.setTargets(sys.argv[1:])
    test.build()
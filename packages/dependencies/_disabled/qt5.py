@@ -3,7 +3,7 @@
 	'warnings' : [
 		'Qt5 building CAN fail sometimes with multiple threads.. so if this failed try re-running it',
 		'For more information see: https://bugreports.qt.io/browse/QTBUG-53393',
-		'(You could add 'cpu_count' : '1', to the config of QT5 if the slower speed is acceptable for you)',
+		'(You could add 'cpu_count' : 1, to the config of QT5 if the slower speed is acceptable for you)',
 		'---------------',
 		'Build needs around 40G, install around 10-15Gb.',
 		'Make sure you have at least 60GB free when building,',
@@ -20,7 +20,7 @@
 		'CROSS_target_prefix' : '{target_sub_prefix}',
 		#'OPENSSL_LIBS' : '!CMD({cross_prefix_full}pkg-config --libs-only-l openssl)CMD!',
 	},
-	'cpu_count' : '1',
+	'cpu_count' : 1,
 	'clean_post_configure' : False,
 	'repo_type' : 'archive',
 	'download_locations' : [
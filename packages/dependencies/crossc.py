@@ -1,7 +1,7 @@
 {
 	'repo_type' : 'git',
 	'url' : 'https://github.com/rossy/crossc.git',
-	'cpu_count' : '1',
+	'cpu_count' : 1,
 	'recursive_git' : True,
 	'needs_configure' : False,
 	'build_options' : '{make_prefix_options} static',
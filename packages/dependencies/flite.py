@@ -8,7 +8,7 @@
 		('flite/flite_64.diff', '-p0'),
 	],
 	'configure_options' : '{autoconf_prefix_options}',
-	'cpu_count' : '1',
+	'cpu_count' : 1,
 	'needs_make_install' : False,
 	'run_post_patch' : [
 		'sed -i.bak "s|i386-mingw32-|{cross_prefix_bare}|" configure',
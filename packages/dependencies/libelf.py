@@ -1,6 +1,6 @@
 {
 	'repo_type' : 'archive',
-	'cpu_count' : '1',
+	'cpu_count' : 1,
 	'download_locations' : [ # the homepage: http://www.mr511.de/software/english.html seems to be dead.
 		{ 'url' : 'https://fossies.org/linux/misc/old/libelf-0.8.13.tar.gz', 'hashes' : [ { 'type' : 'sha256', 'sum' : '591a9b4ec81c1f2042a97aa60564e0cb79d041c52faa7416acb38bc95bd2c76d' }, ], },
 		{ 'url' : 'https://ftp.osuosl.org/pub/blfs/conglomeration/libelf/libelf-0.8.13.tar.gz', 'hashes' : [ { 'type' : 'sha256', 'sum' : '591a9b4ec81c1f2042a97aa60564e0cb79d041c52faa7416acb38bc95bd2c76d' }, ], },
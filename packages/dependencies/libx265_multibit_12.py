@@ -3,6 +3,7 @@
 	'url' : 'https://bitbucket.org/multicoreware/x265_git',
 	'folder_name': 'x265_multilib_12_git',
 	'depth_git': 0,
+	'sparse_checkout_git': [ 'source' ],
 	'source_subfolder' : '_build',
 	'configure_options' : 
 		'../source {cmake_prefix_options} '
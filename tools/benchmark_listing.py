@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Compares the streaming directory-listing parser with the html5lib soup one on saved index pages.
+# Run it from the tools folder, like the other scripts in here.
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+import libs.htmllistparse as htmllistparse
+
+FIXTURES_DIR = Path("listing_fixtures")
+
+
+def errorExit(msg):
+	print(msg)
+	sys.exit(1)
+
+
+def fetchFixtures(urls, folder):  # saves each index page as <host>_<path>.html
+	import requests
+	folder.mkdir(parents=True, exist_ok=True)
+	for url in urls:
+		u = urlparse(url)
+		name = (u.netloc + u.path).strip("/").replace("/", "_") + ".html"
+		r = requests.get(url, timeout=30)
+		r.raise_for_status()
+		folder.joinpath(name).write_bytes(r.content)
+		print("Saved '%s' as '%s' (%d bytes)" % (url, name, len(r.content)))
+
+
+def findFixtures(paths):
+	files = []
+	for p in paths:
+		if p.is_dir():
+			files += sorted(f for f in p.iterdir() if f.suffix in (".html", ".htm"))
+		elif p.is_file():
+			files.append(p)
+		else:
+			errorExit("'%s' does not exist" % (p))
+	return files
+
+
+def timeParser(func, content, runs):
+	times = []
+	result = None
+	for i in range(runs):
+		start = time.perf_counter()
+		result = func(content)
+		times.append((time.perf_counter() - start) * 1000)
+	return statistics.median(times), result
+
+
+def soupParse(content):
+	return htmllistparse.parse(BeautifulSoup(content, "html5lib"))
+
+
+parser = argparse.ArgumentParser(description="Benchmark of the directory-listing parsers used by check_versions.py")
+parser.add_argument("paths", nargs="*", type=Path, default=[FIXTURES_DIR], help="Saved index pages, or folders of them (default: %s)" % (FIXTURES_DIR))
+parser.add_argument("-n", "--runs", type=int, default=5, help="Runs per parser and page (default: 5)")
+parser.add_argument("--fetch", nargs="+", metavar="URL", default=None, help="Save these index pages into the first path first")
+args = parser.parse_args()
+
+if args.fetch:
+	fetchFixtures(args.fetch, args.paths[0])
+
+fixtures = findFixtures(args.paths)
+if not fixtures:
+	errorExit("No saved index pages found, save some with --fetch <url>...")
+
+failed = False
+soupTotal = fastTotal = 0.0
+
+for fixture in fixtures:
+	content = fixture.read_bytes()
+	soupMs, (soupCwd, soupListing) = timeParser(soupParse, content, args.runs)
+	fastMs, fastResult = timeParser(htmllistparse.parse_fast, content, args.runs)
+	soupTotal += soupMs
+	if fastResult is None:  # parse_listing would fall back to the soup
+		fastTotal += soupMs
+		print("%-40s soup: %8.2fms  fast: fallback" % (fixture.name, soupMs))
+		continue
+	fastTotal += fastMs
+	print("%-40s soup: %8.2fms  fast: %8.2fms  %6.1fx  %d entries" % (fixture.name, soupMs, fastMs, soupMs / max(fastMs, 0.001), len(fastResult[1])))
+	soupNames = [e.name for e in soupListing]
+	fastNames = [e.name for e in fastResult[1]]
+	if soupNames != fastNames:
+		print("\t-> names differ, only from soup: %s, only from fast: %s" % (sorted(set(soupNames) - set(fastNames)), sorted(set(fastNames) - set(soupNames))))
+		failed = True
+
+print("")
+print("Total (median per page) soup: %.2fms  fast: %.2fms  %.1fx" % (soupTotal, fastTotal, soupTotal / max(fastTotal, 0.001)))
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Measures how long cross_compiler.py takes to start for commands that don't build anything.
+# Run it from the tools folder, like the other scripts in here.
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path.cwd().parent
+SCRIPT = "cross_compiler.py"
+
+COMMANDS = [
+	["--help"],
+	["list", "-p"],
+	["info", "-d", "zlib"],
+	["info", "-r", "zlib"],
+]
+
+# These should never be imported unless a command actually downloads something or reads the config.
+HEAVY_MODULES = {
+	"--help": ["requests", "progressbar", "yaml", "urllib.request"],
+	"list": ["requests", "progressbar", "urllib.request"],
+	"info": ["requests", "progressbar", "urllib.request"],
+}
+
+
+def errorExit(msg):
+	print(msg)
+	sys.exit(1)
+
+
+def timeCommand(args, runs):
+	times = []
+	for i in range(runs):
+		start = time.perf_counter()
+		p = subprocess.run([sys.executable, SCRIPT] + args, cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+		times.append((time.perf_counter() - start) * 1000)
+		if p.returncode != 0:
+			errorExit("'%s' failed with exit code %d" % (" ".join(args), p.returncode))
+	return times
+
+
+def importTimes(args):  # parses the output of python -X importtime, returns {module: (self_us, cumulative_us)}
+	p = subprocess.run([sys.executable, "-X", "importtime", SCRIPT] + args, cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+	modules = {}
+	for line in p.stderr.decode("utf-8", "replace").splitlines():
+		if not line.startswith("import time:") or "self [us]" in line:
+			continue
+		selfUs, cumulativeUs, name = line[len("import time:"):].split("|")
+		modules[name.strip()] = (int(selfUs), int(cumulativeUs))
+	return modules
+
+
+parser = argparse.ArgumentParser(description="Startup-time benchmark for " + SCRIPT)
+parser.add_argument("-n", "--runs", type=int, default=10, help="Runs per command (default: 10)")
+parser.add_argument("-t", "--top", type=int, default=15, help="How many imports to list per command (default: 15)")
+parser.add_argument("-m", "--max-ms", type=float, default=None, help="Fail if the median startup of any command exceeds this")
+args = parser.parse_args()
+
+if not ROOT_DIR.joinpath(SCRIPT).is_file():
+	errorExit("Could not find %s in '%s', run this from the tools folder." % (SCRIPT, ROOT_DIR))
+
+failed = False
+
+for cmd in COMMANDS:
+	cmdStr = " ".join(cmd)
+	times = timeCommand(cmd, args.runs)
+	median = statistics.median(times)
+	print("%-16s median: %7.1fms  min: %7.1fms  max: %7.1fms" % (cmdStr, median, min(times), max(times)))
+	if args.max_ms is not None and median > args.max_ms:
+		print("\t-> exceeds the budget of %.1fms" % (args.max_ms))
+		failed = True
+
+	modules = importTimes(cmd)
+	for heavy in HEAVY_MODULES.get(cmd[0], []):
+		if heavy in modules:
+			print("\t-> imports '%s' (%.1fms), it should be deferred" % (heavy, modules[heavy][1] / 1000))
+			failed = True
+
+	print("\tTop imports (cumulative):")
+	for name, (selfUs, cumulativeUs) in sorted(modules.items(), key=lambda m: m[1][1], reverse=True)[:args.top]:
+		print("\t%8.1fms %8.1fms  %s" % (cumulativeUs / 1000, selfUs / 1000, name))
+	print("")
+
+sys.exit(1 if failed else 0)
@@ -2,15 +2,20 @@
 # -*- coding: utf-8 -*-
 # noqa: E121
 
-import ast
+import argparse
 import ftplib
+import hashlib
 import json
 import os
 import re
 import subprocess
 import sys
+import tempfile
+import threading
+import time
 import traceback
-from distutils.version import LooseVersion
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
 from pathlib import Path
 from urllib.parse import urlparse
 
@@ -19,6 +24,11 @@ from bs4 import BeautifulSoup
 from colorama import Fore, Style, init
 
 import libs.htmllistparse as htmllistparse  # https://github.com/gumblex/htmllisting-parser
+from libs.package_bump import BumpError, PackageFile
+from libs.versions import NO_VERSION, VersionPattern, isNewer, isVersion
+
+sys.path.append(str(Path.cwd().parent))
+from cross_compiler import PackageIndex, PackageLoadError, openPackages  # noqa: E402 shares the package index cache with the main script
 
 init()
 
@@ -37,6 +47,12 @@ HEADERS = {
 
 CWD = Path.cwd()
 
+TIMEOUT = 30  # seconds, for each http request and ftp connection
+GIT_TIMEOUT = 300  # git remote update fetches everything, which takes a while for big repos
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser().joinpath("python_cross_compile_script", "check_versions")
+ARCHIVE_CACHE_DIR = CACHE_DIR.parent.joinpath("archives")  # cross_compiler.py looks here (by sha256) before downloading an archive
+CHUNK_SIZE = 1024 * 1024
+
 SOURCEFORGE_APIKEY = None
 
 # if not os.path.isfile("sourceforge.apikey"):
@@ -47,215 +63,191 @@ SOURCEFORGE_APIKEY = None
 
 
 def loadPackages(packages_folder):
-		def bool_key(d, k):
-			if k in d:
-				if d[k]:
-					return True
-			return False
-
-		def isPathDisabled(path):
-			for part in path.parts:
-				if part.lower().startswith("_disabled"):
-					return True
-			return False
-
-		depsFolder = Path(os.path.join(packages_folder, "dependencies"))
-		prodFolder = Path(os.path.join(packages_folder, "products"))
-		varsPath = Path(os.path.join(packages_folder, "variables.py"))
-
-		if not os.path.isdir(packages_folder):
-			errorExit("Packages folder '%s' does not exist." % (packages_folder))
-		if not os.path.isdir(depsFolder):
-			errorExit("Packages folder '%s' does not exist." % (depsFolder))
-		if not os.path.isfile(varsPath):
-			errorExit("Variables file '%s' does not exist." % (varsPath))
-
-		tmpPkglist = {'deps': [], 'prods': [], 'vars': []}
-		packages = {'deps': {}, 'prods': {}, 'vars': {}}
-
-		for path, subdirs, files in os.walk(depsFolder):
-			for name in files:
-				p = Path(os.path.join(path, name))
-				if p.suffix == ".py":
-					if not isPathDisabled(p):
-						tmpPkglist["deps"].append(p)
-
-		for path, subdirs, files in os.walk(prodFolder):
-			for name in files:
-				p = Path(os.path.join(path, name))
-				if p.suffix == ".py":
-					if not isPathDisabled(p):
-						tmpPkglist["prods"].append(p)
-
-		if len(tmpPkglist["deps"]) < 1:
-			errorExit("There's no packages in the folder '%s'." % (depsFolder))
-
-		if len(tmpPkglist["prods"]) < 1:
-			errorExit("There's no packages in the folder '%s'." % (prodFolder))
-
-		with open(varsPath, "r", encoding="utf-8") as f:
-			try:
-				o = ast.literal_eval(f.read())
-				if not isinstance(o, dict):
-					errorExit("Variables file is misformatted")
-				packages["vars"] = o
-			except SyntaxError:
-				errorExit("Loading variables.py failed:\n\n" + traceback.format_exc())
-
-		for d in tmpPkglist["deps"]:
-			with open(d, "r", encoding="utf-8") as f:
-				p = Path(d)
-				package_name = p.stem.lower()
-				try:
-					o = ast.literal_eval(f.read())
-					if not isinstance(o, dict):
-						errorExit("Package file '%s' is misformatted" % (p.name))
-
-					if "_info" not in o and not bool_key(o, "is_dep_inheriter"):
-						print("Package '%s.py' is missing '_info' tag." % (package_name))
-
-					if bool_key(o, "_disabled"):
-						pass
-					else:
-						packages["deps"][package_name] = o
-
-				except SyntaxError:
-					errorExit("Loading '%s.py' failed:\n\n%s" % (package_name, traceback.format_exc()))
-
-		for d in tmpPkglist["prods"]:
-			with open(d, "r", encoding="utf-8") as f:
-				p = Path(d)
-				package_name = p.stem.lower()
-				try:
-					o = ast.literal_eval(f.read())
-					if not isinstance(o, dict):
-						errorExit("Package file '%s' is misformatted" % (p.name))
-
-					if "_info" not in o and not bool_key(o, "is_dep_inheriter"):
-						print("Package '%s.py' is missing '_info' tag." % (package_name))
-
-					if bool_key(o, "_disabled"):
-						pass
-					else:
-						packages["prods"][package_name] = o
-
-				except SyntaxError:
-					errorExit("Loading '%s.py' failed:\n\n%s" % (package_name, traceback.format_exc()))
-
-		print("Loaded %d packages" % (len(packages["prods"]) + len(packages["deps"])))
-		return packages
+	try:
+		index = openPackages(packages_folder)
+		loaded = index.load()
+	except PackageLoadError as e:
+		errorExit(e.message)
+
+	packages = {'deps': {}, 'prods': {}, 'vars': loaded["vars"], 'paths': {}}
+
+	for pType in ("deps", "prods"):
+		for package_name, o in loaded[pType].items():
+			if "_info" not in o and not o.get("is_dep_inheriter"):
+				info("Package '%s.py' is missing '_info' tag." % (package_name))
+
+			if not o.get("_disabled"):
+				packages[pType][package_name] = o
+				if isinstance(index, PackageIndex):  # bundled packages have no file --apply could edit
+					packages["paths"][package_name] = index.files[pType][package_name][0]
+
+	info("Loaded %d packages" % (len(packages["prods"]) + len(packages["deps"])))
+	return packages
+
+
+class CheckError(Exception):  # a check that failed, reported for its package instead of ending the run
+	def __init__(self, message):
+		self.message = message
+		super().__init__(message)
+
+
+class HostLimiter:  # hands out one semaphore per host, so checking everything at once doesn't open dozens of connections to the same server
+	def __init__(self, limit):
+		self.limit = limit
+		self.lock = threading.Lock()
+		self.semaphores = {}
+
+	def __call__(self, url):
+		host = urlparse(url).netloc or url
+		with self.lock:
+			if host not in self.semaphores:
+				self.semaphores[host] = threading.BoundedSemaphore(self.limit)
+			return self.semaphores[host]
+
+
+class HttpCache:  # http responses on disk with their validators; older than ttl they are revalidated with a conditional request
+	def __init__(self, cacheDir, ttl, poolSize):
+		self.cacheDir = Path(cacheDir) if cacheDir is not None else None  # None disables the cache, the sessions are still shared
+		self.ttl = ttl
+		self.poolSize = poolSize
+		self.lock = threading.Lock()
+		self.sessions = {}  # host: requests.Session, so checks against the same host reuse connections
+
+	def session(self, url):
+		host = urlparse(url).netloc
+		with self.lock:
+			if host not in self.sessions:
+				session = requests.Session()
+				adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.poolSize)
+				session.mount("http://", adapter)
+				session.mount("https://", adapter)
+				self.sessions[host] = session
+			return self.sessions[host]
+
+	def paths(self, url):
+		digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+		return self.cacheDir.joinpath(digest + ".json"), self.cacheDir.joinpath(digest + ".body")
+
+	def load(self, url):  # (meta, body), or (None, None) if url isn't cached
+		if self.cacheDir is None:
+			return None, None
+		metaFile, bodyFile = self.paths(url)
+		try:
+			with open(metaFile, "r", encoding="utf-8") as f:
+				meta = json.load(f)
+			return meta, bodyFile.read_bytes()
+		except (OSError, ValueError):
+			return None, None
+
+	def writeAtomic(self, path, data):
+		fd, tmpPath = tempfile.mkstemp(prefix=path.name + ".", dir=self.cacheDir)
+		with os.fdopen(fd, "wb") as f:
+			f.write(data)
+		os.replace(tmpPath, path)
+
+	def store(self, url, meta, body=None):  # without a body only the metadata is updated
+		if self.cacheDir is None:
+			return
+		self.cacheDir.mkdir(parents=True, exist_ok=True)
+		metaFile, bodyFile = self.paths(url)
+		if body is not None:
+			self.writeAtomic(bodyFile, body)
+		self.writeAtomic(metaFile, json.dumps(meta).encode("utf-8"))
+
+	def get(self, url, headers=None):  # the body of url, from the cache if it is younger than ttl or the server says it is unchanged
+		meta, body = self.load(url)
+		if meta is not None and time.time() - meta["fetched"] < self.ttl:
+			return body
+
+		requestHeaders = dict(HEADERS if headers is None else headers)
+		if meta is not None:
+			if meta.get("etag"):
+				requestHeaders["If-None-Match"] = meta["etag"]
+			if meta.get("last_modified"):
+				requestHeaders["If-Modified-Since"] = meta["last_modified"]
+		try:
+			r = self.session(url).get(url, headers=requestHeaders, timeout=TIMEOUT)
+		except requests.RequestException:
+			if meta is not None:  # offline, the last response is better than nothing
+				return body
+			raise
+
+		if r.status_code == 304 and meta is not None:
+			meta["fetched"] = time.time()
+			self.store(url, meta)
+			return body
+		if r.status_code >= 400:
+			raise CheckError("HTTP %d for %s" % (r.status_code, url))
+		self.store(url, {'url': url, 'etag': r.headers.get("ETag"), 'last_modified': r.headers.get("Last-Modified"), 'fetched': time.time()}, r.content)
+		return r.content
+
+
+class SourceforgeRows(HTMLParser):  # titles of the folder/file rows of a sourceforge files page, in one pass without building a soup
+	def __init__(self):
+		super().__init__(convert_charrefs=True)
+		self.rows = []
+
+	def handle_starttag(self, tag, attrs):
+		if tag != "tr":
+			return
+		attrs = dict(attrs)
+		classes = (attrs.get("class") or "").split()
+		if attrs.get("title") is not None and any(c.startswith(("folder", "file")) for c in classes):
+			self.rows.append(attrs["title"])
+
+	@staticmethod
+	def titles(content):
+		parser = SourceforgeRows()
+		parser.feed(content.decode("utf-8", "replace"))
+		parser.close()
+		return parser.rows
 
 
 class Parsers:
-	def __init__(self, url, verex):
+	def __init__(self, url, pattern):
 		self.url = url
-		self.verex = verex
+		self.pattern = pattern
 		# self.api_key = SOURCEFORGE_APIKEY
 
 	def sourceforge(self):
-		soup = BeautifulSoup(requests.get(self.url, headers=HEADERS).content, features="html5lib")
-
-		allFolderTrs = soup.find_all("tr", attrs={"class": re.compile(r"folder.*"), "title": re.compile(r".*")})
-
-		allFileTrs = soup.find_all("tr", attrs={"class": re.compile(r"file.*"), "title": re.compile(r".*")})
-
-		newest = "0.0.0"
-
-		for tr in allFolderTrs + allFileTrs:
-			v = tr["title"]
+		content = HTTP.get(self.url)
+		titles = SourceforgeRows.titles(content)
+		if not titles:  # not the layout SourceforgeRows knows, let the soup have a look
+			soup = BeautifulSoup(content, features="html5lib")
+			allFolderTrs = soup.find_all("tr", attrs={"class": re.compile(r"folder.*"), "title": re.compile(r".*")})
+			allFileTrs = soup.find_all("tr", attrs={"class": re.compile(r"file.*"), "title": re.compile(r".*")})
+			titles = [tr["title"] for tr in allFolderTrs + allFileTrs]
 
-			if self.verex is not None:
-				m = re.search(self.verex, v)
-				if m is not None:
-					g = m.groupdict()
-					if "version_num" not in g:
-						errorExit("You have to name a regex group version_num")
-					v = g["version_num"]
-					if "rc_num" in g:
-						v = v + "." + g["rc_num"]
-				else:
-					v = ""
-
-			if v != "":
-				if re.match(r"^(?P<version_num>(?:[\dx]{1,3}\.){0,3}[\dx]{1,3})$", v):
-					if LooseVersion(v) > LooseVersion(newest):
-						newest = v
-		return newest
+		return self.pattern.newest(titles)
 
 	def httpindex(self):
-		cwd, listing = htmllistparse.fetch_listing(self.url, timeout=30)
-		newest = "0.0.0"
-		for entry in listing:
-			v = entry.name
-			if self.verex is not None:
-				m = re.search(self.verex, v)
-				if m is not None:
-					g = m.groupdict()
-					if "version_num" not in g:
-						errorExit("You have to name a regex group version_num")
-					v = g["version_num"]
-					if "rc_num" in g:
-						v = v + "." + g["rc_num"]
-				else:
-					v = ""
-
-			if v != "":
-				if re.match(r"^(?P<version_num>(?:[\dx]{1,3}\.){0,3}[\dx]{1,3})$", v):
-					if LooseVersion(v) > LooseVersion(newest):
-						newest = v
-		return newest
+		cwd, listing = htmllistparse.parse_listing(HTTP.get(self.url))  # streams plain index pages, only odd ones get a html5lib soup
+		return self.pattern.newest(entry.name for entry in listing)
 
 	def githubreleases(self, githubType="name"):
 		m = re.search(r'http?s:\/\/github.com\/(.+\/.+\/releases)', self.url)
 		if m is None:
-			errorExit("Improper github release URL: '%s' (Example: https://github.com/exampleGroup/exampleProject/releases)" % (self.url))
+			raise CheckError("Improper github release URL: '%s' (Example: https://github.com/exampleGroup/exampleProject/releases)" % (self.url))
 
 		releaseApiUrl = 'https://api.github.com/repos/%s' % (m.groups()[0])
 
-		jString = requests.get(releaseApiUrl, headers=HEADERS).content  # .decode("utf-8")
+		headers = dict(HEADERS)
+		if "GITHUB_TOKEN" in os.environ:  # unauthenticated requests are limited to 60 an hour, revalidations answered with 304 don't count
+			headers["Authorization"] = "token " + os.environ["GITHUB_TOKEN"]
+		jString = HTTP.get(releaseApiUrl, headers)
 
 		releases = json.loads(jString)
 
-		newest = "0.0.0"
-
-		for r in releases:
-			v = r[githubType]
-			if self.verex is not None:
-				m = re.search(self.verex, v)
-				if m is not None:
-					g = m.groupdict()
-					if "version_num" not in g:
-						errorExit("You have to name a regex group version_num")
-					v = g["version_num"]
-					if "rc_num" in g:
-						v = v + "." + g["rc_num"]
-				else:
-					v = ""
-
-			if v != "":
-				if re.match(r"^(?P<version_num>(?:[\dx]{1,3}\.){0,3}[\dx]{1,3})$", v):
-					if LooseVersion(v) > LooseVersion(newest):
-						newest = v
-		return newest
+		return self.pattern.newest(r[githubType] for r in releases)
 
 	def httpregex(self):
-		r = requests.get(self.url, headers=HEADERS)
-
-		html = r.content.decode("utf-8")
-
-		m = re.findall(self.verex, html)
+		html = HTTP.get(self.url).decode("utf-8")
 
-		newest = "0.0.0"
-		for v in m:
-			if v != "":
-				if re.match(r"^(?P<version_num>(?:[\dx]{1,3}\.){0,3}[\dx]{1,3})$", v):
-					if LooseVersion(v) > LooseVersion(newest):
-						newest = v
-		return newest
+		return self.pattern.newestIn(html)
 
 	def ftp(self):
 		pUrl = urlparse(self.url)
-		ftp = ftplib.FTP(pUrl.netloc)
+		ftp = ftplib.FTP(pUrl.netloc, timeout=TIMEOUT)
 		ftp.login()
 		ftp.cwd(pUrl.path)
 		files = []
@@ -264,30 +256,13 @@ class Parsers:
 			files = ftp.nlst()
 		except ftplib.error_perm as resp:
 			if str(resp) == "550 No files found":
-				errorExit("FTP 550: No files in this directory")
+				raise CheckError("FTP 550: No files in this directory")
 			else:
-				errorExit("Failed to parse version of " + pUrl + "\n\n" + traceback.format_exc())
-
-		newest = "0.0.0"
-
-		for v in files:
-			if self.verex is not None:
-				m = re.search(self.verex, v)
-				if m is not None:
-					g = m.groupdict()
-					if "version_num" not in g:
-						errorExit("You have to name a regex group version_num")
-					v = g["version_num"]
-					if "rc_num" in g:
-						v = v + "." + g["rc_num"]
-				else:
-					v = ""
-
-			if v != "":
-				if re.match(r"^(?P<version_num>(?:[\dx]{1,3}\.){0,3}[\dx]{1,3})$", v):
-					if LooseVersion(v) > LooseVersion(newest):
-						newest = v
-		return newest
+				raise CheckError("Failed to list '%s': %s" % (self.url, resp))
+		finally:
+			ftp.close()
+
+		return self.pattern.newest(files)
 
 
 def errorExit(msg):
@@ -295,6 +270,10 @@ def errorExit(msg):
 	sys.exit(1)
 
 
+def info(msg):  # messages that aren't results, kept out of stdout when it carries json
+	print(msg, file=sys.stderr if args.json or args.jsonl else sys.stdout)
+
+
 def getGitClonePathFromPkg(pkg):
 	clonePath = None
 	if "folder_name" in pkg:
@@ -319,175 +298,474 @@ def getGitClonePathFromPkg(pkg):
 	return None
 
 
-def run(cmd):
-	return subprocess.check_output(cmd, shell=True).decode("utf-8", "replace")
+def run(cmd, cwd=None, timeout=None):
+	try:
+		return subprocess.check_output(cmd, shell=True, cwd=cwd, timeout=timeout, stderr=subprocess.STDOUT).decode("utf-8", "replace")
+	except subprocess.CalledProcessError as e:
+		raise CheckError("'%s' failed in '%s': %s" % (cmd, cwd, e.output.decode("utf-8", "replace").strip()))
+	except subprocess.TimeoutExpired:
+		raise CheckError("'%s' timed out after %ds in '%s'" % (cmd, timeout, cwd))
+
+
+def getCommitsBehindUpstream(clonePath):  # commits the clone's branch is behind its upstream, according to git status
+	cmtsBehind = re.search(r"## .* \[behind ([0-9]+)\]", run("git status -sb", cwd=clonePath).split("\n")[0])
+	return int(cmtsBehind.groups()[0]) if cmtsBehind else 0
 
 
 def getCommitsDiff(pkg):
 	curCommit = None if "branch" not in pkg else pkg["branch"]
-	# repoUrl = pkg["url"]
-	# latestCommit = None
-
-	origDir = os.getcwd()
 	clonePath = getGitClonePathFromPkg(pkg)
 
 	if clonePath is None:
 		return None
 
-	os.chdir(clonePath)
-	run("git remote update")
+	with HOSTS(pkg["url"]):
+		run("git remote update", cwd=clonePath, timeout=GIT_TIMEOUT)
 
 	if curCommit is not None:
-		cmts = [c.split(";;") for c in run("git log --pretty=format:\"%H;;%an;;%s\" {0}..master".format(curCommit)).split("\n") if c != ""]
-	else:
-		cmtsBehind = 0
-		try:
-			cmtsBehind = re.search(r"## .* \[behind ([0-9]+)\]", run("git status -sb").split("\n")[0]).groups()[0]
-		except Exception:
-			pass
-			# print(run("git status -sb").split("\n")[0])
-		cmts = int(cmtsBehind)
-
-	os.chdir(origDir)
-
-	return cmts
+		return [c.split(";;") for c in run("git log --pretty=format:\"%H;;%an;;%s\" {0}..master".format(curCommit), cwd=clonePath).split("\n") if c != ""]
+	return getCommitsBehindUpstream(clonePath)
 
 
 def geLatestVersion(versionEl):
 	url = versionEl["url"]
-	verex = None
 	ghtype = None
-	if "regex" in versionEl:
-		verex = versionEl["regex"]
 	if "name_or_tag" in versionEl:
 		ghtype = versionEl["name_or_tag"]
 	pUrl = urlparse(url)
 	if pUrl.scheme == '':
-		errorExit("Update check URL '%s' is invalid." % (url))
+		raise CheckError("Update check URL '%s' is invalid." % (url))
 
+	pType = versionEl["type"]
 	try:
-		pType = versionEl["type"]
-		parser = Parsers(url, verex)
-		if pType == "sourceforge":
-			return parser.sourceforge()
-		elif pType == "httpindex":
-			return parser.httpindex()
-		elif pType == "ftpindex":
-			return parser.ftp()
-		elif pType == "httpregex":
-			return parser.httpregex()
-		elif pType == "githubreleases":
-			return parser.githubreleases(ghtype)
-		else:
-			errorExit("Unknown parser: %s " % (pType))
+		pattern = VersionPattern(versionEl.get("regex"))
+	except (ValueError, re.error) as e:
+		raise CheckError("Invalid regex %r: %s" % (versionEl.get("regex"), e))
+	if pType == "httpregex" and pattern.regex is None:
+		raise CheckError("The httpregex parser needs a regex")
+	parser = Parsers(url, pattern)
+	parsers = {
+		"sourceforge": parser.sourceforge,
+		"httpindex": parser.httpindex,
+		"ftpindex": parser.ftp,
+		"httpregex": parser.httpregex,
+		"githubreleases": lambda: parser.githubreleases(ghtype),
+	}
+	if pType not in parsers:
+		raise CheckError("Unknown parser: %s " % (pType))
+	try:
+		with HOSTS(url):
+			return parsers[pType]()
+	except CheckError:
+		raise
+	except (requests.RequestException, OSError, ftplib.Error) as e:  # network trouble, no traceback needed
+		raise CheckError("Failed to fetch %s: %s" % (url, e))
 	except Exception:
-		errorExit("Failed to parse version of " + url + "\n\n" + traceback.format_exc())
+		raise CheckError("Failed to parse version of " + url + "\n\n" + traceback.format_exc())
 
-#######################
 
+def newResult(section, name, checkType, local=None):  # what a check found out, printed once all checks before it are printed
+	return {'section': section, 'name': name, 'type': checkType, 'local': local, 'remote': None, 'behind': None, 'stale': None, 'clone': None, 'regex': None, 'error': None, 'seconds': None}
 
-specificPkgs = None
 
-if len(sys.argv) > 1:
-	if sys.argv[1].lower().startswith("-h") or sys.argv[1].lower().startswith("--h"):
-		print("Syntax:\ncheck_versions.py (<package*>,<package*>,....) (E.g: check_versions.py libxml)\nRun it without any arguments to check every supported package.")
-		sys.exit(0)
-	specificPkgs = sys.argv[1:]
+def runCheck(result, check, *args):  # fills in result, a failing check only fails its own result
+	start = time.monotonic()
+	try:
+		check(result, *args)
+	except CheckError as e:
+		result["error"] = e.message
+	except Exception:
+		result["error"] = traceback.format_exc()
+	result["seconds"] = round(time.monotonic() - start, 3)
+	return result
 
-pkgs = loadPackages(PACKAGES_DIR)
 
-ignorePkgsUpdate = []
+def checkGitPackage(result, pkg):
+	di = getCommitsDiff(pkg)
+	if di is not None:
+		result["behind"] = di if isinstance(di, int) else len(di)
+		result["stale"] = result["behind"] > 0
 
-pkgsWithoutUpdateCheck = []
 
-print("Checking package versions:")
+def checkArchivePackage(result, versionEl):
+	result["regex"] = versionEl.get("regex")
+	result["remote"] = geLatestVersion(versionEl)
 
-for name, pkg in {**pkgs["deps"], **pkgs["prods"]}.items():
-	if specificPkgs is not None:
-		if not any(word in name for word in specificPkgs):
-			continue
 
-	if "repo_type" in pkg and (pkg["repo_type"] == "archive" or (pkg["repo_type"] == "git" and "branch" in pkg)):  # check for packages without update check.
-		if "update_check" not in pkg:
-			if name not in ignorePkgsUpdate:
-				pkgsWithoutUpdateCheck.append(name)
+def checkGitClone(result, pkg):  # git packages without update_check, only looked at when they are cloned
+	clonePath = getGitClonePathFromPkg(pkg)
+	if clonePath is None:
+		return
+	result["clone"] = clonePath.name
+	with HOSTS(pkg["url"]):
+		run("git remote update", cwd=clonePath, timeout=GIT_TIMEOUT)
+	result["behind"] = getCommitsBehindUpstream(clonePath)
+	result["stale"] = result["behind"] > 0
 
-	if "update_check" in pkg:
 
-		versionEl = pkg["update_check"]
-		vType = versionEl["type"]
+def isCommitHash(ref):
+	return re.fullmatch(r"[0-9a-f]{7,40}", ref) is not None
 
-		if vType == "git":  # packages that are git clones
-			di = getCommitsDiff(pkg)
-			if di is not None:
 
-				numCmts = 0
+def gitLsRemote(url, *refs):  # {ref name: sha} for refs on the remote, one round trip and nothing downloaded
+	env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+	try:
+		with HOSTS(url):
+			p = subprocess.run(["git", "ls-remote", url] + list(refs), stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, timeout=TIMEOUT * 2)
+	except subprocess.TimeoutExpired:
+		raise CheckError("git ls-remote '%s' timed out" % (url))
+	if p.returncode != 0:
+		raise CheckError("git ls-remote '%s' failed: %s" % (url, p.stderr.decode("utf-8", "replace").strip()))
+	remoteRefs = {}
+	for line in p.stdout.decode("utf-8", "replace").splitlines():
+		sha, _, name = line.partition("\t")
+		remoteRefs[name] = sha
+	return remoteRefs
+
+
+def resolveRemoteRef(remoteRefs, ref):  # (name to fetch, commit sha) of ref; prefers branches, then tags, whose peeled commit is used, like the main script's gitLsRemote
+	for name in (ref, "refs/heads/" + ref, "refs/tags/" + ref, "refs/" + ref):
+		if name in remoteRefs:
+			return name, remoteRefs.get(name + "^{}", remoteRefs[name])
+	return None, None
+
+
+OBJECT_CACHE_LOCKS = {}  # url: lock, packages sharing a repo share its object cache
+OBJECT_CACHE_LOCK = threading.Lock()
+
+
+def countCommitsBehind(url, remoteRef, local, remote):  # fetches only the commits (no trees or blobs) of remoteRef into a per-repo object cache kept between runs
+	cachePath = Path(args.cache_dir).joinpath("git", re.sub(r"[^\w.-]+", "_", url.split("://")[-1]).strip("_") + ".git")
+	with OBJECT_CACHE_LOCK:
+		lock = OBJECT_CACHE_LOCKS.setdefault(url, threading.Lock())
+	with lock:
+		if not cachePath.is_dir():
+			cachePath.mkdir(parents=True)
+			run("git init --bare --quiet", cwd=cachePath)
+			run("git config gc.auto 0", cwd=cachePath)
+		if subprocess.run(["git", "cat-file", "-e", remote + "^{commit}"], cwd=cachePath, stderr=subprocess.DEVNULL).returncode != 0:
+			with HOSTS(url):
+				run('git fetch --quiet --no-tags --filter=tree:0 "%s" "+%s:refs/check/head"' % (url, remoteRef), cwd=cachePath, timeout=GIT_TIMEOUT)
+		if subprocess.run(["git", "cat-file", "-e", local + "^{commit}"], cwd=cachePath, stderr=subprocess.DEVNULL).returncode != 0:
+			return None  # not in the remote's history, e.g a commit of another branch
+		return int(run("git rev-list --count %s..%s" % (local, remote), cwd=cachePath).strip())
+
+
+def checkGitRemote(result, pkg, countCommits):  # compares the clone's HEAD (or the pinned commit) to the remote with ls-remote, without fetching
+	clonePath = getGitClonePathFromPkg(pkg)
+	pin = pkg.get("branch")
+	local = None
+	ref = "HEAD"
+	if clonePath is not None:
+		result["clone"] = clonePath.name
+		local = run("git rev-parse HEAD", cwd=clonePath).strip()
+	elif pin is not None and isCommitHash(pin):
+		local = pin
+	if local is None:
+		return  # nothing to compare, like the fetch mode skips packages that aren't cloned
+
+	if pin is not None and not isCommitHash(pin):
+		ref = pin
+	elif clonePath is not None:
+		upstream = subprocess.run(["git", "rev-parse", "--abbrev-ref", "--symbolic-full-name", "@{u}"], cwd=clonePath, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+		if upstream.returncode == 0 and "/" in upstream.stdout.decode("utf-8"):
+			ref = upstream.stdout.decode("utf-8").strip().split("/", 1)[1]
+
+	patterns = [ref] if ref == "HEAD" else [ref, ref + "^{}"]  # an annotated tag's commit is only listed when asked for
+	remoteRef, remote = resolveRemoteRef(gitLsRemote(pkg["url"], *patterns), ref)
+	if remote is None:
+		raise CheckError("'%s' doesn't exist on %s" % (ref, pkg["url"]))
+	result["local"] = local[:12]
+	result["remote"] = remote[:12]
+	result["stale"] = not remote.startswith(local) and not local.startswith(remote)
+	if result["stale"] and countCommits:
+		result["behind"] = countCommitsBehind(pkg["url"], remoteRef, local, remote)
+	elif not result["stale"]:
+		result["behind"] = 0
+
+
+def printResult(r):
+	name = r["name"].rjust(30)
+	if r["error"] is not None:
+		print(Fore.RED + "%s failed: %s" % (name, r["error"]) + Style.RESET_ALL)
+	elif r["section"] == "git":
+		if r["stale"] and r["behind"] is None:
+			print(F"{r['clone']} is behind [Local: {r['local']} Remote: {r['remote']}]")
+		elif r["stale"]:
+			print(F"{r['clone'] or r['name']} is {r['behind']} commits behind")
+	elif r["type"] == "git":
+		if r["stale"] is None:
+			return
+		if r["stale"] and r["behind"] is None:
+			print(Style.DIM + Fore.YELLOW + "%s is behind! [Local: %s Remote: %s]" % (name, r["local"], r["remote"]) + Style.RESET_ALL)
+		elif r["stale"]:
+			print(Style.DIM + Fore.YELLOW + "%s is %d commits behind!" % (name, r["behind"]) + Style.RESET_ALL)
+		else:
+			print(Style.BRIGHT + "%s is up to date." % (name) + Style.RESET_ALL)
+	elif r["section"] == "toolchain":
+		if isVersion(r["local"]) and isVersion(r["remote"]):
+			if isNewer(r["remote"], r["local"]):
+				print(Fore.GREEN + "%s has an update! [Local: %s Remote: %s]" % (name, r["local"].center(10), r["remote"].center(10)) + Style.RESET_ALL)
+			else:
+				print(Style.BRIGHT + "%s is up to date. [Local: %s Remote: %s]" % (name, r["local"].center(10), r["remote"].center(10)) + Style.RESET_ALL)
+	elif r["remote"] == NO_VERSION:
+		print(Fore.YELLOW + "%s has an update! [Local: %s Remote: %s] (Error parsing remote version)" % (name, r["local"].center(10), r["remote"].center(10)) + Style.RESET_ALL)
+		print("Regex pattern:")
+		print("\t" + str(r["regex"]))
+	elif isNewer(r["remote"], r["local"]):
+		print(Fore.GREEN + "%s has an update! [Local: %s Remote: %s]" % (name, r["local"].center(10), r["remote"].center(10)) + Style.RESET_ALL)
+	else:
+		print(Style.BRIGHT + "%s is up to date. [Local: %s Remote: %s]" % (name, r["local"].center(10), r["remote"].center(10)) + Style.RESET_ALL)
 
-				if isinstance(di, int):
-					numCmts = di
-				else:
-					numCmts = len(di)
 
-				if numCmts > 0:
-					print(Style.DIM + Fore.YELLOW + "%s is %d commits behind!" % (name.rjust(30), numCmts) + Style.RESET_ALL)
-				else:
-					print(Style.BRIGHT + "%s is up to date." % (name.rjust(30)) + Style.RESET_ALL)
+COMPARED_FIELDS = ("local", "remote", "behind", "stale", "update", "error")  # what --since looks at, timings always differ
 
-		else:  # packages that are archive downloads
-			ourVer = pkg["_info"]["version"]
-			latestVer = geLatestVersion(versionEl)
-
-			if latestVer == "0.0.0":
-				print(Fore.YELLOW + "%s has an update! [Local: %s Remote: %s] (Error parsing remote version)" % (name.rjust(30), ourVer.center(10), latestVer.center(10)) + Style.RESET_ALL)
-				print("Regex pattern:")
-				print("\t" + versionEl["regex"])
-			elif LooseVersion(ourVer) < LooseVersion(latestVer):
-				print(Fore.GREEN + "%s has an update! [Local: %s Remote: %s]" % (name.rjust(30), ourVer.center(10), latestVer.center(10)) + Style.RESET_ALL)
-			else:
-				print(Style.BRIGHT + "%s is up to date. [Local: %s Remote: %s]" % (name.rjust(30), ourVer.center(10), latestVer.center(10)) + Style.RESET_ALL)
 
+def hasUpdate(r):  # None when it is unknown, e.g the check failed
+	if r["error"] is not None:
+		return None
+	if r["type"] == "git":
+		return r["stale"]
+	if r["remote"] is None or r["remote"] == NO_VERSION or r["local"] is None:
+		return None
+	if r["section"] == "toolchain" and not (isVersion(r["local"]) and isVersion(r["remote"])):
+		return None
+	return isNewer(r["remote"], r["local"])
 
-print("\nGit packages without update_check:")
 
-for name, pkg in {**pkgs["deps"], **pkgs["prods"]}.items():
-	if specificPkgs is not None:
-		if not any(word in name for word in specificPkgs):
-			continue
+def toRecord(r):  # one line of the --json/--jsonl report
+	record = {k: v for k, v in r.items() if k != "regex"}
+	record["update"] = hasUpdate(r)
+	return record
+
 
-	if "repo_type" in pkg and pkg["repo_type"] == "git" and "update_check" not in pkg:
-		clonePath = getGitClonePathFromPkg(pkg)
-		if clonePath is None:
+def loadReport(path):  # {(section, name): record} of a previous --json or --jsonl report
+	with open(path, "r", encoding="utf-8") as f:
+		text = f.read()
+	try:
+		records = json.loads(text)
+		if not isinstance(records, list):
+			records = [records]
+	except ValueError:  # jsonl
+		records = [json.loads(line) for line in text.splitlines() if line.strip() != ""]
+	return {(r["section"], r["name"]): r for r in records if not r.get("removed")}
+
+
+def changedSince(record):
+	if PREVIOUS is None:
+		return True
+	previous = PREVIOUS.get((record["section"], record["name"]))
+	return previous is None or any(previous.get(f) != record.get(f) for f in COMPARED_FIELDS)
+
+
+def streamUrl(url):  # the body of url in chunks
+	if url.lower().startswith("ftp://"):
+		import urllib.request
+		with urllib.request.urlopen(url, timeout=TIMEOUT) as r:
+			yield from iter(lambda: r.read(CHUNK_SIZE), b"")
+		return
+	userAgent = 'wget/1.20.3' if 'sourceforge.net' in url.lower() else HEADERS['User-Agent']  # sourceforge only hands out the file itself to wget, like in cross_compiler.py
+	with requests.get(url, stream=True, timeout=TIMEOUT, headers={'User-Agent': userAgent}) as r:
+		r.raise_for_status()
+		yield from r.iter_content(CHUNK_SIZE)
+
+
+def downloadArchive(urls, hashTypes):  # the first of urls that works, hashed while it streams into the archive cache; (url, {hash type: sum})
+	cacheDir = Path(args.archive_cache)
+	cacheDir.mkdir(parents=True, exist_ok=True)
+	errors = []
+	for url in urls:
+		hashes = {t: hashlib.new(t) for t in set(hashTypes) | {"sha256"}}
+		fd, tmpName = tempfile.mkstemp(prefix="download.", dir=str(cacheDir))
+		try:
+			with os.fdopen(fd, "wb") as f, HOSTS(url):
+				for chunk in streamUrl(url):
+					f.write(chunk)
+					for h in hashes.values():
+						h.update(chunk)
+		except (requests.RequestException, OSError) as e:
+			os.remove(tmpName)
+			errors.append("%s: %s" % (url, e))
+			continue
+		sums = {t: h.hexdigest() for t, h in hashes.items()}
+		os.replace(tmpName, cacheDir.joinpath(sums["sha256"]))
+		return url, sums
+	raise CheckError("Failed to download %s" % ("; ".join(errors)))
+
+
+def planUpdate(r, path):  # the package file with its version, urls and folder names edited (not saved yet), and the new urls
+	local, remote = r["local"], r["remote"]
+	pkgFile = PackageFile(path)
+	version = pkgFile.version()
+	if version.value != local:
+		raise BumpError("its version changed to %s since it was checked" % (version.value))
+	pkgFile.replace(version, local, remote)
+	urls = []
+	for url, hashes in pkgFile.downloadLocations():
+		if local not in url.value:
+			raise BumpError("the url %s does not contain the version %s" % (url.value, local))
+		pkgFile.replace(url, local, remote)
+		urls.append(url.value.replace(local, remote))
+	for key in ("folder_name", "rename_folder"):  # these name what the archive unpacks to
+		node = pkgFile.optional(key)
+		if node is not None and local in node.value:
+			pkgFile.replace(node, local, remote)
+	return pkgFile, urls
+
+
+def applyUpdates(results):  # rewrites the package files of archive packages that have an update, each new archive is downloaded once
+	groups = {}  # primary url: [(result, package file)], products and dependencies may share one archive
+	for r in results:
+		if r["section"] != "packages" or r["type"] == "git" or not hasUpdate(r):
+			continue
+		try:
+			if r["name"] not in pkgs["paths"]:
+				raise BumpError("it was loaded from a package bundle")
+			pkgFile, urls = planUpdate(r, pkgs["paths"][r["name"]])
+		except BumpError as e:
+			info("Not updating %s: %s" % (r["name"], e.message))
 			continue
-		repoUrl = pkg["url"]
-		origDir = os.getcwd()
-		os.chdir(clonePath)
-		run("git remote update")
-		cmtsBehind = re.search(r"## .* \[behind ([0-9]+)\]", run("git status -sb").split("\n")[0])
-		if cmtsBehind:
-			print(F"{clonePath.name} is {cmtsBehind.groups()[0]} commits behind")
+		groups.setdefault(tuple(urls), []).append((r, pkgFile))
+
+	with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+		futures = {}
+		for urls, group in groups.items():
+			hashTypes = set(hType for r, pkgFile in group for url, hashes in pkgFile.downloadLocations() for hType, node in hashes)
+			futures[executor.submit(downloadArchive, urls, hashTypes)] = group
+		for future in as_completed(futures):
+			try:
+				url, sums = future.result()
+			except CheckError as e:
+				for r, pkgFile in futures[future]:
+					info("Not updating %s: %s" % (r["name"], e.message))
+				continue
+			for r, pkgFile in futures[future]:
+				try:
+					for location, hashes in pkgFile.downloadLocations():  # mirrors serve the same file
+						for hType, node in hashes:
+							if hType not in sums:
+								raise BumpError("unsupported hash type %s" % (hType))
+							pkgFile.setString(node, sums[hType])
+					pkgFile.save()
+				except BumpError as e:
+					info("Not updating %s: %s" % (r["name"], e.message))
+					continue
+				info("Updated %s from %s to %s (sha256: %s)" % (r["name"], r["local"], r["remote"], sums["sha256"]))
+
+#######################
+
+
+parser = argparse.ArgumentParser(description="Checks the packages, their git clones and the toolchain sources for updates.")
+parser.add_argument("packages", nargs="*", help="Only check packages whose name contains one of these (E.g: check_versions.py libxml)")
+parser.add_argument("--packages-dir", default=PACKAGES_DIR, help="The packages folder, or a bundle made by merge.py (default: %(default)s)")
+parser.add_argument("-j", "--jobs", type=int, default=16, help="Checks running at once (default: 16)")
+parser.add_argument("--per-host", type=int, default=4, help="Checks running at once against the same host (default: 4)")
+parser.add_argument("--ttl", type=int, default=0, help="Use cached http responses younger than this many seconds without asking the server (default: 0, always revalidate)")
+parser.add_argument("--cache-dir", default=str(CACHE_DIR), help="Where http responses are cached (default: %(default)s)")
+parser.add_argument("--no-cache", action="store_true", help="Don't read or write the http cache")
+parser.add_argument("--ls-remote", action="store_true", help="Compare git clones to their remote with git ls-remote instead of fetching them")
+parser.add_argument("--count-commits", action="store_true", help="With --ls-remote: count the commits of outdated repos, fetching only their commits into the cache dir")
+outputGroup = parser.add_mutually_exclusive_group()
+outputGroup.add_argument("--json", action="store_true", help="Print the results as one json array once every check is done")
+outputGroup.add_argument("--jsonl", action="store_true", help="Print one json record per line, as soon as each check is done")
+parser.add_argument("--since", metavar="REPORT", default=None, help="Only report what changed compared to a previous --json or --jsonl report")
+parser.add_argument("--apply", action="store_true", help="Rewrite the version, download urls and hashes of archive packages that have an update")
+parser.add_argument("--archive-cache", default=str(ARCHIVE_CACHE_DIR), help="Where --apply stores the new archives for the next build (default: %(default)s)")
+args = parser.parse_args()
+
+specificPkgs = args.packages if len(args.packages) > 0 else None
+
+HOSTS = HostLimiter(args.per_host)
+HTTP = HttpCache(None if args.no_cache else args.cache_dir, args.ttl, args.per_host)
+PREVIOUS = loadReport(args.since) if args.since is not None else None
 
 
-if len(pkgsWithoutUpdateCheck) > 0:
-	print("\nPackages without update check:\n%s" % (",".join(pkgsWithoutUpdateCheck)))
+def wanted(name):
+	return specificPkgs is None or any(word in name for word in specificPkgs)
 
 
+pkgs = loadPackages(args.packages_dir)
+
+ignorePkgsUpdate = []
+
+pkgsWithoutUpdateCheck = []
+
+checks = []  # (result, check, args) in the order they are printed
+
+for name, pkg in {**pkgs["deps"], **pkgs["prods"]}.items():
+	if not wanted(name):
+		continue
+
+	if "repo_type" in pkg and (pkg["repo_type"] == "archive" or (pkg["repo_type"] == "git" and "branch" in pkg)):  # check for packages without update check.
+		if "update_check" not in pkg:
+			if name not in ignorePkgsUpdate:
+				pkgsWithoutUpdateCheck.append(name)
+
+	if "update_check" in pkg:
+		versionEl = pkg["update_check"]
+		if versionEl["type"] == "git" and args.ls_remote:
+			checks.append((newResult("packages", name, "git"), checkGitRemote, (pkg, args.count_commits)))
+		elif versionEl["type"] == "git":  # packages that are git clones
+			checks.append((newResult("packages", name, "git"), checkGitPackage, (pkg,)))
+		else:  # packages that are archive downloads
+			checks.append((newResult("packages", name, versionEl["type"], pkg["_info"]["version"]), checkArchivePackage, (versionEl,)))
+
+for name, pkg in {**pkgs["deps"], **pkgs["prods"]}.items():
+	if wanted(name) and "repo_type" in pkg and pkg["repo_type"] == "git" and "update_check" not in pkg:
+		if args.ls_remote:
+			if getGitClonePathFromPkg(pkg) is not None:  # only the cloned ones, like without --ls-remote
+				checks.append((newResult("git", name, "git"), checkGitRemote, (pkg, args.count_commits)))
+		else:
+			checks.append((newResult("git", name, "git"), checkGitClone, (pkg,)))
+
 if CWD.parent.joinpath("mingw_toolchain_script", "mingw_toolchain_script.py").exists():
-	print("\nChecking toolchain versions:")
 	sys.path.append(str(CWD.parent.joinpath("mingw_toolchain_script")))
 	SOURCES = None
 	from mingw_toolchain_script import SOURCES
 
 	for name, pkg in SOURCES.items():
-		if specificPkgs is not None:
-			if not any(word in name for word in specificPkgs):
+		if wanted(name) and "update_check" in pkg and "version" in pkg:
+			checks.append((newResult("toolchain", name, pkg["update_check"]["type"], pkg["version"]), checkArchivePackage, (pkg["update_check"],)))
+
+headers = {
+	"packages": "Checking package versions:",
+	"git": "\nGit packages without update_check:",
+	"toolchain": "\nChecking toolchain versions:",
+}
+
+# Every check runs at once (bounded by --jobs and --per-host), results are printed in the order above as soon as all earlier ones are done.
+# --jsonl prints them in the order they finish instead.
+with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+	futures = [(result["section"], executor.submit(runCheck, result, check, *checkArgs)) for result, check, checkArgs in checks]
+	if args.json or args.jsonl:
+		records = []
+		for future in (as_completed([f for s, f in futures]) if args.jsonl else [f for s, f in futures]):
+			record = toRecord(future.result())
+			if not changedSince(record):
+				continue
+			if args.jsonl:
+				print(json.dumps(record), flush=True)
+			records.append(record)
+		if PREVIOUS is not None:  # checked before, but not anymore
+			current = set((result["section"], result["name"]) for result, check, checkArgs in checks)
+			for section, name in PREVIOUS.keys() - current:
+				record = {'section': section, 'name': name, 'removed': True}
+				if args.jsonl:
+					print(json.dumps(record), flush=True)
+				records.append(record)
+		if args.json:
+			print(json.dumps(records, indent=4))
+	else:
+		for section in headers.keys():
+			if section == "toolchain" and len(pkgsWithoutUpdateCheck) > 0:
+				print("\nPackages without update check:\n%s" % (",".join(pkgsWithoutUpdateCheck)))
+			if section == "toolchain" and not any(s == "toolchain" for s, f in futures):
 				continue
-		if "update_check" in pkg and "version" in pkg:
-			versionEl = pkg["update_check"]
-			vType = versionEl["type"]
-			ourVer = pkg["version"]
-			latestVer = geLatestVersion(versionEl)
-			if re.match(r"^(?P<version_num>(?:[\dx]{1,3}\.){0,3}[\dx]{1,3})$", ourVer) and re.match(r"^(?P<version_num>(?:[\dx]{1,3}\.){0,3}[\dx]{1,3})$", latestVer):
-				if LooseVersion(ourVer) < LooseVersion(latestVer):
-					print(Fore.GREEN + "%s has an update! [Local: %s Remote: %s]" % (name.rjust(30), ourVer.center(10), latestVer.center(10)) + Style.RESET_ALL)
-				else:
-					print(Style.BRIGHT + "%s is up to date. [Local: %s Remote: %s]" % (name.rjust(30), ourVer.center(10), latestVer.center(10)) + Style.RESET_ALL)
+			print(headers[section])
+			for s, future in futures:
+				if s == section and changedSince(toRecord(future.result())):
+					printResult(future.result())
+
+if args.apply:
+	info("\nApplying updates:")
+	applyUpdates([future.result() for s, future in futures])
@@ -5,6 +5,7 @@ import os
 import re
 import time
 import collections
+import html.parser
 import urllib.parse
 
 import bs4
@@ -240,12 +241,101 @@ def parse(soup):
                 listing.append(FileEntry(file_name, None, None, None))
     return cwd, listing
 
+class _ListingParser(html.parser.HTMLParser):
+    """
+    Collects the title/h1 and the links inside <pre>, <table> and <ul> in one pass,
+    without building a tree.
+    """
+    CONTAINERS = ('pre', 'table', 'ul')
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.h1 = None
+        self.anchors = []
+        self._containers = 0
+        self._capture = None
+        self._text = []
+        self._href = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.CONTAINERS:
+            self._containers += 1
+        elif tag == 'a' and self._containers:
+            self._href = dict(attrs).get('href')
+            self._text = []
+        elif (tag == 'title' and self.title is None) or (tag == 'h1' and self.h1 is None):
+            self._capture = tag
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag in self.CONTAINERS:
+            self._containers = max(0, self._containers - 1)
+        elif tag == 'a' and self._href is not None:
+            self.anchors.append((self._href, ''.join(self._text).strip()))
+            self._href = None
+        elif tag == self._capture:
+            setattr(self, tag, ''.join(self._text).strip())
+            self._capture = None
+
+    def handle_data(self, data):
+        if self._href is not None or self._capture is not None:
+            self._text.append(data)
+
+def parse_fast(content):
+    '''
+    Streaming parser for plain apache/nginx-style "Index of" pages.
+
+    Only the names are extracted, modified/size/description are None.
+    Returns None when the page doesn't look like such a listing,
+    use `parse` on a soup for those.
+
+    Returns: Current directory, Directory listing
+    '''
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', 'replace')
+    parser = _ListingParser()
+    parser.feed(content)
+    parser.close()
+    cwd = None
+    for title in (parser.title, parser.h1):
+        if title and title.startswith('Index of '):
+            cwd = title[9:]
+            break
+    if cwd is None:
+        return None
+    listing = []
+    for a_href, a_str in parser.anchors:
+        if not a_href or not a_str:
+            continue
+        if (a_str in ('Parent Directory', '.', './', '..', '../') or
+            a_href in ('.', './', '..', '../') or
+            a_href[0] in '?#' or RE_ABSPATH.match(a_href)):
+            continue
+        parts = urllib.parse.urlsplit(a_href)
+        if parts.scheme or parts.netloc:
+            continue
+        listing.append(FileEntry(aherf2filename(a_href), None, None, None))
+    if not listing:
+        return None
+    return cwd, listing
+
+def parse_listing(content, features='html5lib'):
+    '''
+    `parse_fast`, falling back to `parse` on a `features` soup.
+
+    Returns: Current directory, Directory listing
+    '''
+    result = parse_fast(content)
+    if result is None:
+        result = parse(bs4.BeautifulSoup(content, features))
+    return result
+
 def fetch_listing(url, timeout=30):
     import requests
     req = requests.get(url, timeout=timeout)
     req.raise_for_status()
-    soup = bs4.BeautifulSoup(req.content, 'html5lib')
-    return parse(soup)
+    return parse_listing(req.content)
 
 if __name__ == '__main__':
     import sys
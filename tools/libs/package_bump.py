@@ -0,0 +1,110 @@
+# Edits the version, download urls and hashes of an archive package file in place.
+# Only the string literals that change are rewritten, comments and formatting stay as they are.
+
+import ast
+import os
+import tempfile
+
+
+class BumpError(Exception):
+	def __init__(self, message):
+		self.message = message
+		super().__init__(message)
+
+
+def dictValue(node, key):  # the value node of key in a dict literal, or None
+	if not isinstance(node, ast.Dict):
+		return None
+	for k, v in zip(node.keys, node.values):
+		if isinstance(k, ast.Constant) and k.value == key:
+			return v
+	return None
+
+
+def isString(node):
+	return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+
+class PackageFile:
+	def __init__(self, path):
+		self.path = path
+		with open(path, "rb") as f:
+			self.source = f.read()
+		try:
+			self.tree = ast.parse(self.source, filename=str(path), mode="eval").body
+		except SyntaxError as e:
+			raise BumpError("'%s' does not parse: %s" % (path, e))
+		if not isinstance(self.tree, ast.Dict):
+			raise BumpError("'%s' is not a package dict" % (path))
+		self.lineStarts = [0]  # ast positions are (line, utf-8 byte column)
+		for line in self.source.splitlines(keepends=True):
+			self.lineStarts.append(self.lineStarts[-1] + len(line))
+		self.edits = {}  # (start, end): new bytes
+
+	def span(self, node):
+		return self.lineStarts[node.lineno - 1] + node.col_offset, self.lineStarts[node.end_lineno - 1] + node.end_col_offset
+
+	def replace(self, node, old, new):  # replaces old with new inside the literal node, as it is written in the file
+		start, end = self.span(node)
+		literal = self.source[start:end].decode("utf-8")
+		if old == "" or old not in literal:
+			raise BumpError("'%s' is not written literally in %s" % (old, literal))
+		self.edits[(start, end)] = literal.replace(old, new).encode("utf-8")
+
+	def setString(self, node, value):  # rewrites a plain one-line string literal, keeping its quotes and prefix
+		start, end = self.span(node)
+		literal = self.source[start:end].decode("utf-8")
+		quote = literal[-1]
+		opening = literal.index(quote)
+		if literal[opening:opening + 3] == quote * 3 or "\\" in literal or quote in value:
+			raise BumpError("%s is not a plain string literal" % (literal))
+		self.edits[(start, end)] = (literal[:opening + 1] + value + quote).encode("utf-8")
+
+	def version(self):  # the _info version node
+		node = dictValue(dictValue(self.tree, "_info"), "version")
+		if not isString(node):
+			raise BumpError("'%s' has no _info version" % (self.path))
+		return node
+
+	def downloadLocations(self):  # [(url node, [(hash type, sum node)])]
+		node = dictValue(self.tree, "download_locations")
+		if not isinstance(node, ast.List) or not node.elts:
+			raise BumpError("'%s' has no download_locations" % (self.path))
+		locations = []
+		for location in node.elts:
+			url = dictValue(location, "url")
+			if not isString(url):
+				raise BumpError("A download location of '%s' has no url" % (self.path))
+			hashes = []
+			hashesNode = dictValue(location, "hashes")
+			for h in (hashesNode.elts if isinstance(hashesNode, ast.List) else []):
+				hType, hSum = dictValue(h, "type"), dictValue(h, "sum")
+				if isString(hType) and isString(hSum):
+					hashes.append((hType.value, hSum))
+			locations.append((url, hashes))
+		return locations
+
+	def optional(self, key):  # a top level string node, or None
+		node = dictValue(self.tree, key)
+		return node if isString(node) else None
+
+	def render(self):
+		out = self.source
+		for (start, end), new in sorted(self.edits.items(), reverse=True):
+			out = out[:start] + new + out[end:]
+		return out
+
+	def save(self):  # writes the edits, after checking that the result still is the same kind of literal
+		out = self.render()
+		try:
+			if not isinstance(ast.literal_eval(out.decode("utf-8")), dict):
+				raise ValueError("not a dict")
+		except (SyntaxError, ValueError) as e:
+			raise BumpError("Editing '%s' would break it: %s" % (self.path, e))
+		fd, tmpName = tempfile.mkstemp(prefix=os.path.basename(str(self.path)) + ".", dir=os.path.dirname(str(self.path)))
+		with os.fdopen(fd, "wb") as f:
+			f.write(out)
+		os.chmod(tmpName, os.stat(self.path).st_mode & 0o7777)
+		os.replace(tmpName, self.path)
+		self.source = out
+		self.edits = {}
@@ -0,0 +1,54 @@
+# Version strings of the update checks, compared with tuple keys instead of distutils' deprecated LooseVersion.
+
+import re
+
+VERSION_REGEX = re.compile(r"^(?P<version_num>(?:[\dx]{1,3}\.){0,3}[\dx]{1,3})$")  # what counts as a version once it was extracted
+COMPONENT_REGEX = re.compile(r"\d+|[a-z]+")
+NO_VERSION = "0.0.0"  # what a check reports when it found nothing
+
+
+def isVersion(version):
+	return version is not None and VERSION_REGEX.match(version) is not None
+
+
+def versionKey(version):  # sorts like LooseVersion, but numbers and letters never get compared with each other (numbers sort higher)
+	return tuple((1, int(c)) if c.isdigit() else (0, c) for c in COMPONENT_REGEX.findall(version.lower()))
+
+
+def isNewer(version, than):
+	return versionKey(version) > versionKey(than)
+
+
+class VersionPattern:  # a package's update check regex, compiled once, turns listing entries into versions
+	def __init__(self, regex=None):
+		self.regex = None
+		if regex is not None:
+			self.regex = re.compile(regex)
+			if "version_num" not in self.regex.groupindex:
+				raise ValueError("You have to name a regex group version_num")
+
+	def fromMatch(self, m):
+		v = m.group("version_num")
+		rc = m.group("rc_num") if "rc_num" in self.regex.groupindex else None
+		if v is not None and rc is not None:  # only when the rc group took part in the match
+			v = v + "." + rc
+		return v
+
+	def extract(self, name):  # the version in name, or None
+		if self.regex is None:
+			v = name
+		else:
+			m = self.regex.search(name)
+			v = self.fromMatch(m) if m is not None else None
+		return v if isVersion(v) else None
+
+	def extractAll(self, text):  # every version in text, for pages that aren't listings
+		if self.regex is None:
+			raise ValueError("Searching a whole page needs a regex")
+		return [v for v in (self.fromMatch(m) for m in self.regex.finditer(text)) if isVersion(v)]
+
+	def newest(self, names):  # the highest version among names, NO_VERSION if there is none
+		return max((v for v in map(self.extract, names) if v is not None), key=versionKey, default=NO_VERSION)
+
+	def newestIn(self, text):
+		return max(self.extractAll(text), key=versionKey, default=NO_VERSION)
@@ -1,43 +1,29 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os,re,sys,pprint,shutil
+# Packs every package file into one indexed bundle, which cross_compiler.py (packages_folder) and check_versions.py accept instead of the packages folder.
+# Run it from the tools folder, like the other scripts in here.
+
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path.cwd().parent))
+from cross_compiler import PackageBundle, PackageLoadError  # noqa: E402
+
 PACKAGES_DIR = "../packages"
-		
+BUNDLE_FILE = "packages.bundle"
+
+
 def errorExit(msg):
 	print(msg)
 	sys.exit(1)
 
-def isPathDisabled(path):
-	for part in path.parts:
-		if part.lower().startswith("_disabled"):
-			return True
-	return False
-
-depsFolder = Path(os.path.join(PACKAGES_DIR,"dependencies"))
-prodFolder = Path(os.path.join(PACKAGES_DIR,"products"))
-
-if not os.path.isdir(PACKAGES_DIR):
-	errorExit("Packages folder '%s' does not exist." % (packages_folder))
-if not os.path.isdir(depsFolder):
-	errorExit("Packages folder '%s' does not exist." % (depsFolder))
-if not os.path.isdir(prodFolder):
-	errorExit("Packages folder '%s' does not exist." % (depsFolder))
-	
-things = { "merged_deps.py" : depsFolder, "merged_prods.py" : prodFolder, }
-
-for mergefile_name in things:
-	mergedFileTmp = ""
-	print("Merging packages of " + str(things[mergefile_name]) + " to " + mergefile_name )
-	for path, subdirs, files in os.walk(things[mergefile_name]):
-		for name in files:
-			p = Path(os.path.join(path, name))
-			if p.suffix == ".py" :
-				if not isPathDisabled(p):
-					with p.open("r",encoding="utf-8") as f:
-						mergedFileTmp += "########START:[" + name + "]\n" + f.read() + "\n########END:[" + name + "]\n"
-
-	with open(mergefile_name, "w", encoding="utf-8") as f:
-		f.write(mergedFileTmp)
-print("Done")
\ No newline at end of file
+
+packagesDir = sys.argv[1] if len(sys.argv) > 1 else PACKAGES_DIR
+bundleFile = sys.argv[2] if len(sys.argv) > 2 else BUNDLE_FILE
+
+print("Merging packages of %s to %s" % (packagesDir, bundleFile))
+try:
+	count = PackageBundle.write(packagesDir, bundleFile)
+except PackageLoadError as e:
+	errorExit(e.message)
+print("Done, %d packages" % (count))
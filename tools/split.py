@@ -1,72 +1,40 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os,re,sys,pprint,shutil
+# Unpacks a bundle made by merge.py back into a packages folder.
+# Run it from the tools folder, like the other scripts in here.
+
+import shutil
+import sys
 from pathlib import Path
 
-PACKAGES_DIR = "../packages"
-		
+sys.path.append(str(Path.cwd().parent))
+from cross_compiler import PackageBundle, PackageLoadError  # noqa: E402
+
+BUNDLE_FILE = "packages.bundle"
+SPLIT_DIR = "_split"
+
+
 def errorExit(msg):
 	print(msg)
 	sys.exit(1)
 
-def isPathDisabled(path):
-	for part in path.parts:
-		if part.lower().startswith("_disabled"):
-			return True
-	return False
 
-depsFolder = Path("_deps_split")
-prodFolder = Path("_prods_split")
+bundleFile = sys.argv[1] if len(sys.argv) > 1 else BUNDLE_FILE
+splitDir = Path(sys.argv[2] if len(sys.argv) > 2 else SPLIT_DIR)
 
-merged_deps  = Path("merged_deps.py" )
-merged_prods = Path("merged_prods.py")
+try:
+	bundle = PackageBundle(bundleFile).scan()
+except PackageLoadError as e:
+	errorExit(e.message)
 
-if not os.path.isfile(merged_deps):
-	errorExit("Merged depends file does not exist")
-if not os.path.isfile(merged_prods):
-	errorExit("Merged products file does not exist")
-	
-if not os.path.isdir(depsFolder):
-	os.makedirs(depsFolder)
-else:
-	print("Clearing old split folder:" + str(depsFolder))
-	shutil.rmtree(depsFolder)
-	os.makedirs(depsFolder)
-	
-if not os.path.isdir(prodFolder):
-	os.makedirs(prodFolder)
-else:
-	print("Clearing old split folder:" + str(prodFolder))
-	shutil.rmtree(prodFolder)
-	os.makedirs(prodFolder)
-	
-things = { "merged_deps.py" : depsFolder, "merged_prods.py" : prodFolder, }
+if splitDir.is_dir():
+	print("Clearing old split folder: " + str(splitDir))
+	shutil.rmtree(splitDir)
 
-for mergefile_name in things:
-	mergedFile = None
-	enableWrite = False
-	curFile = None
-	
-	print("Splitting " +mergefile_name+ " into seperate files in " + str(things[mergefile_name]))
-		
-	with open(mergefile_name, "r", encoding="utf-8") as f:
-		mergedFile = f.read().split("\n")
-	
-	fileBuffer = ""
-	
-	for line in mergedFile:
-		startR = re.search("^########START:\[(.+)\]$",line)
-		endR = re.search("^########END:\[(.+)\]$",line)
-		if endR != None:
-			enableWrite = False
-			curFile.write(fileBuffer.rstrip("\n"))
-			curFile.close()
-			
-		if enableWrite:
-			fileBuffer+=line+"\n"
-			
-		if startR != None:
-			enableWrite = True
-			fileBuffer = ""
-			curFile = open(os.path.join(things[mergefile_name],startR.groups()[0]) ,"w",encoding="utf-8")
-print("Done")
\ No newline at end of file
+print("Splitting %s into separate files in %s" % (bundleFile, splitDir))
+for entry in [bundle.varsFile] + list(bundle.files["deps"].values()) + list(bundle.files["prods"].values()):
+	path = splitDir.joinpath(entry[0])
+	path.parent.mkdir(parents=True, exist_ok=True)
+	with open(path, "w", encoding="utf-8", newline="") as f:
+		f.write(bundle.read(entry))
+print("Done")